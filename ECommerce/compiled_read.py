@@ -0,0 +1,42 @@
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+
+class CompiledReadMixin:
+    """
+    ViewSet mixin serving list/retrieve through a compiled reader instead of the serializer.
+
+    `get_reader()` returns an object exposing `values(queryset)` (the rows to fetch) and
+    `render(rows)` (the response dicts), or None to use the serializer. Writes always go
+    through the serializer and its validation.
+
+    Place it right before the generic viewset in the bases, so the caching, conditional
+    and query budget mixins still wrap the compiled path.
+    Object permissions receive the row dict instead of a model instance.
+    """
+    compiled_reads = True
+
+    def get_reader(self):
+        return None
+
+    def list(self, request, *args, **kwargs):
+        reader = self.get_reader() if self.compiled_reads else None
+        if reader is None:
+            return super().list(request, *args, **kwargs)
+
+        rows = reader.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(reader.render(page))
+        return Response(reader.render(rows))
+
+    def retrieve(self, request, *args, **kwargs):
+        reader = self.get_reader() if self.compiled_reads else None
+        if reader is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = reader.values(self.filter_queryset(self.get_queryset()))
+        row = get_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(request, row)
+        return Response(reader.render([row])[0])
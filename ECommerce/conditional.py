@@ -0,0 +1,85 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+
+from ECommerce.response_cache import normalize_query
+
+
+class ConditionalGetMixin:
+    """
+    ViewSet mixin adding strong ETag and Last-Modified validators to list/retrieve.
+
+    Validators come from a cheap aggregate over the filtered queryset
+    (max of `last_modified_field` plus row count) instead of the serialized body,
+    so a revalidation answered with 304 costs one indexed query and no serialization.
+    """
+    conditional_actions = ('list', 'retrieve')
+    last_modified_field = 'updated_at'
+
+    def get_list_validators(self):
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        stats = queryset.aggregate(last_modified=Max(self.last_modified_field), count=Count('pk'))
+        return stats['last_modified'], stats['count']
+
+    def get_detail_validators(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        lookup = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        try:
+            last_modified = (
+                self.get_queryset().order_by().filter(**lookup)
+                .values_list(self.last_modified_field, flat=True).first()
+            )
+        except (ValueError, TypeError, ValidationError):
+            # malformed lookup (e.g. /products/abc/): the handler answers 404
+            return None, 0
+        return last_modified, 1 if last_modified else 0
+
+    def get_validators(self, request):
+        """Return (etag, last_modified) or (None, None) when nothing can be validated."""
+        if self.action == 'list':
+            last_modified, count = self.get_list_validators()
+        else:
+            last_modified, count = self.get_detail_validators()
+            if last_modified is None:
+                return None, None
+
+        raw = '|'.join([
+            request.path,
+            normalize_query(request.query_params),
+            request.accepted_renderer.format,
+            last_modified.isoformat() if last_modified else '',
+            str(count),
+        ])
+        etag = '"%s"' % hashlib.md5(raw.encode()).hexdigest()
+        return etag, int(last_modified.timestamp()) if last_modified else None
+
+    def should_validate_response(self, request):
+        return request.method in ('GET', 'HEAD') and self.action in self.conditional_actions
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        if not self.should_validate_response(request):
+            return handler(request, *args, **kwargs)
+
+        etag, last_modified = self.get_validators(request)
+        if etag is None:
+            return handler(request, *args, **kwargs)
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response.headers['ETag'] = etag
+        if last_modified is not None:
+            response.headers['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
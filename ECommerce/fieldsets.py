@@ -0,0 +1,134 @@
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_list_param(request, name):
+    """Return the comma separated values of `?name=` as a set, or None when absent or empty."""
+    if request is None:
+        return None
+    values = {value.strip() for raw in request.query_params.getlist(name) for value in raw.split(',')}
+    values.discard('')
+    return values or None
+
+
+def reads_fieldsets(request):
+    # Fieldsets only shape read responses: writes always validate and return every field
+    return request is not None and request.method in SAFE_METHODS
+
+
+class FieldsetSerializerMixin:
+    """
+    Serializer mixin supporting sparse fieldsets and expansions on read requests.
+
+    - `?fields=id,name,price` renders only the listed fields.
+    - `?expand=category,rating` replaces (or adds) the fields declared in
+      `Meta.expandable_fields` with their nested representation:
+
+        expandable_fields = {'category': (CategorySerializer, {}), ...}
+
+      The serializer may be given as a dotted path to avoid circular imports.
+
+    Only the top-level serializer (or the child of a top-level list) is shaped.
+    """
+
+    def is_root_serializer(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if not reads_fieldsets(request) or not self.is_root_serializer():
+            return fields
+
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        expand = (parse_list_param(request, EXPAND_PARAM) or set()) & expandable.keys()
+        for name in expand:
+            serializer_class, kwargs = expandable[name]
+            if isinstance(serializer_class, str):
+                serializer_class = import_string(serializer_class)
+            fields[name] = serializer_class(read_only=True, **kwargs)
+
+        requested = parse_list_param(request, FIELDS_PARAM)
+        if requested is not None:
+            fields = {name: field for name, field in fields.items() if name in requested or name in expand}
+        return fields
+
+
+class FieldsetViewMixin:
+    """
+    ViewSet mixin adapting the queryset to the fields the serializer will render.
+
+    Relations are only loaded when the response needs them: `fieldset_select_related`
+    maps an expandable field to the relation joined when it is expanded (a plain pk
+    needs no join), `fieldset_prefetch_related` maps a field to the lookup prefetched
+    when it is rendered and `fieldset_annotations` to a callable returning annotations.
+    Model columns backing fields left out by `?fields=` are deferred, except the
+    ones listed in `fieldset_always_load` (e.g. pagination ordering keys).
+    """
+    fieldset_select_related = {}
+    fieldset_prefetch_related = {}
+    fieldset_annotations = {}
+    fieldset_always_load = ()
+
+    def get_expanded_fields(self):
+        """Names of the fields expanded for this request."""
+        request = getattr(self, 'request', None)
+        if not reads_fieldsets(request):
+            return set()
+        expandable = getattr(self.get_serializer_class().Meta, 'expandable_fields', {})
+        return (parse_list_param(request, EXPAND_PARAM) or set()) & expandable.keys()
+
+    def get_rendered_fields(self):
+        """Names of the fields the serializer renders for this request."""
+        default = set(self.get_serializer_class().Meta.fields)
+        request = getattr(self, 'request', None)
+        requested = parse_list_param(request, FIELDS_PARAM) if reads_fieldsets(request) else None
+        rendered = default if requested is None else default & requested
+        return rendered | self.get_expanded_fields()
+
+    def get_deferred_fields(self, rendered):
+        """Concrete model columns backing serializer fields that are not rendered."""
+        model = self.get_serializer_class().Meta.model
+        concrete = {
+            field.name for field in model._meta.concrete_fields
+            if not field.primary_key and (not field.is_relation or field.many_to_one)
+        }
+        default = set(self.get_serializer_class().Meta.fields)
+        return ((default & concrete) - rendered) - set(self.fieldset_always_load)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        rendered = self.get_rendered_fields()
+        expanded = self.get_expanded_fields()
+
+        select = [lookup for name, lookup in self.fieldset_select_related.items() if name in expanded]
+        if select:
+            queryset = queryset.select_related(*select)
+        prefetch = [lookup for name, lookup in self.fieldset_prefetch_related.items() if name in rendered]
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        for name, annotations in self.fieldset_annotations.items():
+            if name in rendered:
+                queryset = queryset.annotate(**annotations())
+
+        deferred = self.get_deferred_fields(rendered)
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        return queryset
+
+    def get_query_budget(self):
+        """Prefetches for expanded relations cost one query each on top of the declared budget."""
+        budget = super().get_query_budget()
+        if budget is None:
+            return None
+        default = set(self.get_serializer_class().Meta.fields)
+        rendered = self.get_rendered_fields()
+        extra = sum(1 for name in self.fieldset_prefetch_related if name in rendered and name not in default)
+        return budget + extra
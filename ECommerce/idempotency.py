@@ -0,0 +1,146 @@
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from idempotency.models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def get_key_ttl():
+    return datetime.timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+
+def request_fingerprint(request):
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    raw = '|'.join([request.method, request.get_full_path(), payload])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def error(status_code, detail):
+    return Response({'detail': detail}, status=status_code)
+
+
+class KeyInUse(Exception):
+    """The key row is locked by the transaction of a request still running."""
+
+
+class IdempotencyMixin:
+    """
+    ViewSet mixin making writes safe to retry with an `Idempotency-Key` header.
+
+    The first request with a key claims it by inserting a row (the unique index on
+    (user, key) arbitrates concurrent retries), runs, and stores its status and body, all
+    in one transaction: the key commits with the write it guards, or not at all.
+    Retries of the same request get that response back from one indexed lookup, with an
+    `Idempotent-Replayed` header, without running the write again. Reusing a key for
+    another request is a 422, retrying while the first request still runs a 409. Errors
+    release the key. Requests without the header, or anonymous ones, are unchanged.
+
+    create/update/partial_update/destroy are wrapped; custom actions listed in
+    `idempotent_actions` call `idempotent_response()` themselves.
+    """
+    idempotent_actions = ('create', 'update', 'partial_update', 'destroy')
+    # lookup, locked lookup, stale key delete, claim (savepoint, insert, release), stored
+    # outcome, and the savepoint pair of the transaction when nested
+    idempotency_queries = 9
+
+    def get_idempotency_key(self, request):
+        if self.action not in self.idempotent_actions or not request.user.is_authenticated:
+            return None
+        return request.headers.get(HEADER) or None
+
+    def get_query_budget(self):
+        budget = super().get_query_budget()
+        if budget is not None and self.get_idempotency_key(self.request) is not None:
+            budget += self.idempotency_queries
+        return budget
+
+    def replay(self, record, fingerprint):
+        if record.fingerprint != fingerprint:
+            return error(
+                status.HTTP_422_UNPROCESSABLE_ENTITY,
+                f"This {HEADER} was already used for a different request.",
+            )
+        if record.status_code is None:
+            return error(status.HTTP_409_CONFLICT, f"A request with this {HEADER} is still being processed.")
+        response = Response(record.response, status=record.status_code)
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+    def claim_key(self, request, key, fingerprint):
+        """
+        Claim the key for this request inside the caller's transaction. Return the stored
+        record when the key is taken, or None once it is claimed; raise KeyInUse while the
+        request holding it still runs.
+        """
+        now = timezone.now()
+        try:
+            # NOWAIT: a row locked by a live transaction belongs to a request still running
+            record = IdempotencyKey.objects.select_for_update(nowait=True).filter(user=request.user, key=key).first()
+        except OperationalError:
+            raise KeyInUse
+        if record is not None:
+            if record.status_code is not None and record.expires_at > now:
+                return record
+            # expired, or left pending by a request whose transaction is gone (we hold its lock)
+            record.delete()
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(
+                    user=request.user, key=key, fingerprint=fingerprint, expires_at=now + get_key_ttl()
+                )
+        except IntegrityError:
+            # a concurrent request claimed it first, and has committed since
+            return IdempotencyKey.objects.get(user=request.user, key=key)
+        return None
+
+    def idempotent_response(self, handler, request, *args, **kwargs):
+        key = self.get_idempotency_key(request)
+        if key is None:
+            return handler(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return error(status.HTTP_400_BAD_REQUEST, f"{HEADER} must be at most {MAX_KEY_LENGTH} characters.")
+
+        fingerprint = request_fingerprint(request)
+        # retries of a finished request are answered without opening a transaction
+        record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+        if record is not None and record.status_code is not None and record.expires_at > timezone.now():
+            return self.replay(record, fingerprint)
+
+        try:
+            with transaction.atomic():
+                record = self.claim_key(request, key, fingerprint)
+                if record is not None:
+                    return self.replay(record, fingerprint)
+                claimed = IdempotencyKey.objects.filter(user=request.user, key=key)
+                # an exception rolls back the write and the claim together: the key may be retried
+                response = handler(request, *args, **kwargs)
+                if response.status_code >= 500:
+                    claimed.delete()
+                    return response
+                data = json.loads(json.dumps(response.data, cls=DjangoJSONEncoder))
+                claimed.update(status_code=response.status_code, response=data)
+                return response
+        except KeyInUse:
+            return error(status.HTTP_409_CONFLICT, f"A request with this {HEADER} is still being processed.")
+
+    def create(self, request, *args, **kwargs):
+        return self.idempotent_response(super().create, request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        return self.idempotent_response(super().update, request, *args, **kwargs)
+
+    def partial_update(self, request, *args, **kwargs):
+        return self.idempotent_response(super().partial_update, request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        return self.idempotent_response(super().destroy, request, *args, **kwargs)
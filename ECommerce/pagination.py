@@ -0,0 +1,267 @@
+import base64
+import binascii
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    """Make a model value JSON friendly without losing precision (microseconds, decimals)."""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+class CustomPagination(PageNumberPagination):
+    """
+    Shared pagination used by every API listing.
+
+    Three modes are available:
+    - page number (default): ?page=3&page_size=20, with a total `count`
+    - page number without total: ?page=3&count=false skips the COUNT(*) query
+    - keyset (cursor): ?cursor= starts a cursor walk (the default with `keyset_by_default`);
+      `next`/`previous` carry opaque cursors.
+      Each page is a single indexed range scan, so deep pages cost the same as the first one.
+      The ordering can be chosen with ?ordering=<field> among `keyset_orderings`.
+    """
+    # Set the default number of items per page
+    page_size = 10
+
+    # Allow the client to set the page size with a query parameter
+    page_size_query_param = 'page_size'
+
+    # Set the maximum number of items per page to avoid overload
+    max_page_size = 100
+
+    # Specify the query parameter for navigating to a specific page
+    page_query_param = 'page'
+
+    # Query parameter switching to keyset mode and carrying the opaque cursor
+    cursor_query_param = 'cursor'
+
+    # Query parameter used to skip the total count (?count=false)
+    count_query_param = 'count'
+
+    # Query parameter selecting the keyset ordering (?ordering=-created_date)
+    ordering_query_param = 'ordering'
+
+    # Default keyset ordering; the last field must be unique to break ties
+    keyset_ordering = ('created_date', 'id')
+
+    # Extra fields clients may order by in keyset mode; keep them indexed and non-null
+    keyset_orderings = ()
+
+    # Walk in keyset mode unless a ?page= is given (listings that are only ever scrolled)
+    keyset_by_default = False
+
+    mode = 'page'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        keyset = self.keyset_by_default and self.page_query_param not in request.query_params
+        if keyset or self.cursor_query_param in request.query_params:
+            self.mode = 'cursor'
+            return self.paginate_keyset(queryset, request)
+        if not self.include_count(request):
+            self.mode = 'nocount'
+            return self.paginate_without_count(queryset, request)
+        self.mode = 'page'
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.mode == 'page':
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if self.mode == 'page':
+            return super().get_next_link()
+        return self.next_link
+
+    def get_previous_link(self):
+        if self.mode == 'page':
+            return super().get_previous_link()
+        return self.previous_link
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['required'] = ['results']
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters += [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque pagination cursor. Pass an empty value to start a keyset walk.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Set to false to skip computing the total count.',
+                'schema': {'type': 'boolean'},
+            },
+        ]
+        return parameters
+
+    # Page number without total count
+
+    def include_count(self, request):
+        value = request.query_params.get(self.count_query_param, '')
+        return value.lower() not in ('false', '0', 'no')
+
+    def paginate_without_count(self, queryset, request):
+        page_size = self.get_page_size(request)
+        try:
+            page_number = int(request.query_params.get(self.page_query_param, 1))
+        except (TypeError, ValueError):
+            page_number = 0
+        if page_number < 1:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message='Invalid page.'))
+
+        offset = (page_number - 1) * page_size
+        # Fetch one extra row to know whether a next page exists
+        rows = list(queryset[offset:offset + page_size + 1])
+        if not rows and page_number > 1:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message='That page contains no results'))
+
+        url = request.build_absolute_uri()
+        self.next_link = None
+        if len(rows) > page_size:
+            self.next_link = replace_query_param(url, self.page_query_param, page_number + 1)
+        self.previous_link = None
+        if page_number > 1:
+            self.previous_link = (
+                remove_query_param(url, self.page_query_param) if page_number == 2
+                else replace_query_param(url, self.page_query_param, page_number - 1)
+            )
+        return rows[:page_size]
+
+    # Keyset (cursor) mode
+
+    def get_keyset_ordering(self, request):
+        """
+        Return the ordering requested by the client, always ending with a unique tie-breaker.
+        """
+        requested = request.query_params.get(self.ordering_query_param)
+        if not requested:
+            return tuple(self.keyset_ordering)
+        field = requested.lstrip('-')
+        if field not in self.keyset_orderings and field not in self.keyset_ordering:
+            raise NotFound(f"Ordering on '{field}' is not supported.")
+        tie_breaker = self.keyset_ordering[-1].lstrip('-')
+        if field == tie_breaker:
+            return (requested,)
+        direction = '-' if requested.startswith('-') else ''
+        return (requested, direction + tie_breaker)
+
+    def encode_cursor(self, ordering, position, reverse):
+        payload = {'o': list(ordering), 'v': [_encode_value(v) for v in position], 'r': reverse}
+        raw = json.dumps(payload, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, encoded):
+        """Return (ordering, position, reverse) from a cursor; anything but a cursor we issued is a 404."""
+        allowed = set(self.keyset_orderings) | {f.lstrip('-') for f in self.keyset_ordering}
+        try:
+            raw = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+            payload = json.loads(raw)
+            ordering, position, reverse = payload['o'], payload['v'], payload['r']
+            if not (isinstance(ordering, list) and isinstance(position, list) and isinstance(reverse, bool)):
+                raise TypeError('malformed cursor')
+            if not ordering or len(ordering) != len(position):
+                raise ValueError('malformed cursor')
+            if any(not isinstance(f, str) or f.lstrip('-') not in allowed for f in ordering):
+                raise ValueError('malformed cursor')
+            if any(isinstance(v, (list, dict)) for v in position):
+                raise TypeError('malformed cursor')
+        except (binascii.Error, ValueError, KeyError, TypeError):
+            raise NotFound('Invalid cursor.')
+        return tuple(ordering), position, reverse
+
+    def clean_position(self, model, ordering, position):
+        """Convert the cursor values to their fields' types, so a forged value is a 404 rather than a database error."""
+        try:
+            values = []
+            for field_name, value in zip(ordering, position):
+                field = model._meta.get_field(field_name.lstrip('-'))
+                if value is None and not field.null:
+                    raise ValueError('malformed cursor')
+                values.append(field.to_python(value))
+        except (ValidationError, ValueError, TypeError):
+            raise NotFound('Invalid cursor.')
+        return values
+
+    def get_position(self, instance, ordering):
+        fields = [f.lstrip('-') for f in ordering]
+        if isinstance(instance, dict):
+            return [instance[f] for f in fields]
+        return [getattr(instance, f) for f in fields]
+
+    def keyset_filter(self, ordering, position, reverse):
+        """
+        Build the row-value comparison (a, b) > (x, y) as
+        a > x OR (a = x AND b > y), honouring each field's direction.
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            descending = field.startswith('-')
+            name = field.lstrip('-')
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_keyset(self, queryset, request):
+        page_size = self.get_page_size(request)
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            ordering, position, reverse = self.decode_cursor(encoded)
+            position = self.clean_position(queryset.model, ordering, position)
+        else:
+            ordering, position, reverse = self.get_keyset_ordering(request), None, False
+
+        order_by = ordering
+        if reverse:
+            order_by = [f[1:] if f.startswith('-') else '-' + f for f in ordering]
+        queryset = queryset.order_by(*order_by)
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(ordering, position, reverse))
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        has_next = True if reverse else has_more
+        has_previous = has_more if reverse else position is not None
+
+        url = request.build_absolute_uri()
+        self.next_link = None
+        self.previous_link = None
+        if rows and has_next:
+            cursor = self.encode_cursor(ordering, self.get_position(rows[-1], ordering), False)
+            self.next_link = replace_query_param(url, self.cursor_query_param, cursor)
+        if rows and has_previous:
+            cursor = self.encode_cursor(ordering, self.get_position(rows[0], ordering), True)
+            self.previous_link = replace_query_param(url, self.cursor_query_param, cursor)
+        return rows
@@ -0,0 +1,74 @@
+import functools
+import logging
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a view runs more SQL queries than it declared (QUERY_BUDGET_RAISE=True)."""
+
+
+class QueryCounter:
+    """Database execute wrapper counting the queries run while it is installed."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def check_query_budget(name, budget, count):
+    """
+    Log (or raise, when QUERY_BUDGET_RAISE is enabled) if `count` exceeds `budget`.
+    """
+    if budget is None or count <= budget:
+        return
+    message = f"{name} ran {count} SQL queries, over its budget of {budget}."
+    if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def query_budget(budget):
+    """
+    Decorator declaring the maximum number of SQL queries a function-based view may run.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                response = view(request, *args, **kwargs)
+            check_query_budget(view.__qualname__, budget, counter.count)
+            return response
+        return wrapper
+    return decorator
+
+
+class QueryBudgetMixin:
+    """
+    ViewSet mixin enforcing a per-action SQL query budget.
+
+    `query_budget` is either an int applied to every action or a dict such as
+    {'list': 4, 'retrieve': 3}; actions without an entry are not checked.
+    The count includes authentication and permission queries.
+    """
+    query_budget = None
+
+    def get_query_budget(self):
+        if isinstance(self.query_budget, dict):
+            return self.query_budget.get(getattr(self, 'action', None))
+        return self.query_budget
+
+    def dispatch(self, request, *args, **kwargs):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = super().dispatch(request, *args, **kwargs)
+        name = f"{type(self).__name__}.{getattr(self, 'action', None) or request.method.lower()}"
+        check_query_budget(name, self.get_query_budget(), counter.count)
+        return response
@@ -0,0 +1,109 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def get_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def generation_key(model):
+    return f"generation:{model._meta.label_lower}"
+
+
+def _new_generation():
+    # Seeded from the clock so a counter lost to eviction never restarts below its old value
+    return time.time_ns() // 1000
+
+
+def get_generations(models):
+    """Return the current generation counter of each model, creating missing counters."""
+    cache = get_cache()
+    keys = [generation_key(model) for model in models]
+    values = cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        for key in missing:
+            cache.add(key, _new_generation(), timeout=None)
+        values.update(cache.get_many(missing))
+    return [values.get(key, 0) for key in keys]
+
+
+def bump_generation(*models):
+    """
+    Invalidate every cached response built from `models` in O(1):
+    bumping the counter changes the cache keys, old entries simply expire.
+    """
+    cache = get_cache()
+    for model in models:
+        key = generation_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _new_generation(), timeout=None)
+
+
+def normalize_query(query_params):
+    """Sort query parameters (and repeated values) so equivalent URLs share a cache entry."""
+    items = sorted((key, value) for key in query_params for value in query_params.getlist(key))
+    return urlencode(items)
+
+
+class CachedResponseMixin:
+    """
+    ViewSet mixin caching anonymous GET responses.
+    Actions listed in `shared_cached_actions` do not depend on the user and are cached for everyone.
+
+    The cache key combines the URL, the normalized query string and the generation
+    counters of `cache_models`. Signal handlers bump those counters on every save or
+    delete, so an entry can never outlive the data it was built from.
+    """
+    cache_models = ()
+    cached_actions = ('list', 'retrieve')
+    shared_cached_actions = ()
+    cache_timeout = None
+
+    def should_cache_response(self, request):
+        if request.method != 'GET' or self.action not in self.cached_actions:
+            return False
+        return self.action in self.shared_cached_actions or not request.user.is_authenticated
+
+    def get_response_cache_key(self, request):
+        generations = get_generations(self.cache_models)
+        raw = '|'.join([
+            request.build_absolute_uri(request.path),
+            normalize_query(request.query_params),
+            ','.join(str(generation) for generation in generations),
+        ])
+        return f"response:{type(self).__name__}:{hashlib.md5(raw.encode()).hexdigest()}"
+
+    def get_cache_timeout(self):
+        if self.cache_timeout is not None:
+            return self.cache_timeout
+        return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not self.should_cache_response(request):
+            return handler(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = self.get_response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, self.get_cache_timeout())
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
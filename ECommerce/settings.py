@@ -45,6 +45,9 @@ DEBUG = os.environ.get('DEBUG', False)
 ALLOWED_HOSTS = ["127.0.0.1", "localhost"] 
 ALLOWED_HOSTS += os.environ.get('ALLOWED_HOSTS', '').split(',') 
 
+# MySQL ignores the partial index of Product (Meta.indexes); the other indexes still apply
+SILENCED_SYSTEM_CHECKS = ['models.W037']
+
 
 #AUTH_USER_MODEL = 'Users.user' # Application definition
 
@@ -64,6 +67,7 @@ INSTALLED_APPS = [
     'users',
     'orders',
     'categories',
+    'idempotency',
     'django_extensions',
     'django_filters',
     
@@ -152,6 +156,78 @@ REST_FRAMEWORK = {
 }
 
 
+# Cache used for anonymous catalog responses and their generation counters.
+# Use a shared backend (memcached, redis, database) when running several processes,
+# otherwise each process keeps its own counters.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ecommerce-default',
+    }
+}
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Raise instead of logging when a view exceeds its declared SQL query budget
+QUERY_BUDGET_RAISE = False
+
+# Bulk product upsert (POST /api/products/bulk/)
+PRODUCT_BULK_MAX_ROWS = 10000
+PRODUCT_BULK_CHUNK_SIZE = 500
+
+# Price buckets of the product facets (GET /api/products/facets/): 0-25, 25-50, ..., 1000+
+PRODUCT_FACET_PRICE_BOUNDS = [25, 50, 100, 250, 500, 1000]
+
+# Streaming catalog export (GET /api/products/export/)
+PRODUCT_EXPORT_CHUNK_SIZE = 500
+
+# Product image uploads (POST /api/products/<id>/upload_images/): files are streamed to
+# temporary files, so a request never buffers more than one chunk in memory
+PRODUCT_UPLOAD_CHUNK_SIZE = 64 * 1024
+PRODUCT_UPLOAD_MAX_FILES = 50
+PRODUCT_UPLOAD_MAX_FILE_SIZE = 10 * 1024 * 1024
+PRODUCT_UPLOAD_MAX_REQUEST_SIZE = 200 * 1024 * 1024
+PRODUCT_UPLOAD_MAX_PIXELS = 40_000_000
+PRODUCT_UPLOAD_FORMATS = ['JPEG', 'PNG', 'WEBP', 'GIF']
+
+# Resized product image variants (longest side in px), generated in the background (see products/images.py)
+PRODUCT_IMAGE_VARIANTS = {'thumbnail': 150, 'card': 480, 'zoom': 1600}
+PRODUCT_IMAGE_FORMATS = ['webp', 'jpeg']
+PRODUCT_IMAGE_PIPELINE = 'thread'  # 'thread', 'process' or 'sync'
+PRODUCT_IMAGE_WORKERS = 2
+
+# Runs the image pipeline synchronously under tests (see ECommerce/test_runner.py)
+TEST_RUNNER = 'ECommerce.test_runner.TestRunner'
+
+# Files of deleted images are queued and removed in batches by products/cleanup.py
+PRODUCT_FILE_CLEANUP_BATCH_SIZE = 500
+PRODUCT_FILE_CLEANUP_MAX_ATTEMPTS = 5
+
+# Server-rendered storefront (products.views.product_list): products per page, and lifetime
+# of the cached product cards (keyed by product version, so they never go stale)
+STOREFRONT_PAGE_SIZE = 24
+STOREFRONT_CARD_CACHE_TIMEOUT = 3600
+
+# Changes feed (GET /api/products/changes/): rows younger than this are held back, so a
+# transaction committing late with an older updated_at is never skipped by a client watermark.
+# Must exceed the longest transaction writing products: an import chunk is the longest one
+# (import_products warns when a chunk takes longer; lower its --chunk-size or raise this)
+PRODUCT_CHANGES_SETTLE_SECONDS = 5
+
+# "Frequently bought together" (GET /api/products/<id>/related/), rebuilt by build_recommendations:
+# orders of one user within a fixed window form a basket; top K neighbours kept per product.
+# Incremental runs only add new orders: schedule `build_recommendations --full` (e.g. nightly)
+# so deleted and changed orders leave the matrix
+PRODUCT_RECOMMENDATION_WINDOW_DAYS = 30
+PRODUCT_RECOMMENDATION_TOP_K = 10
+
+# Writes sent with an Idempotency-Key header (see ECommerce/idempotency.py): outcomes are replayed
+# to retries for this long, then removed by purge_idempotency_keys
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+
+# Product search engine (see products/search.py)
+PRODUCT_SEARCH_BACKEND = 'products.search.InvertedIndexBackend'
+
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=600),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=120),
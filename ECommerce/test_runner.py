@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Test runner doing the background work (image variants, file cleanup) in the calling
+    thread: worker threads would open their own connections to the test database, outside
+    the test's transaction.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._image_pipeline = settings.PRODUCT_IMAGE_PIPELINE
+        settings.PRODUCT_IMAGE_PIPELINE = 'sync'
+
+    def teardown_test_environment(self, **kwargs):
+        settings.PRODUCT_IMAGE_PIPELINE = self._image_pipeline
+        super().teardown_test_environment(**kwargs)
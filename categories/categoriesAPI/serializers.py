@@ -1,9 +1,26 @@
 from rest_framework import serializers
 from django.core.validators import MinValueValidator
-from categories.models import Category
+from categories.models import Category, CategoryStats
+
+class CategoryStatsSerializer(serializers.ModelSerializer):
+    """Product count, in-stock count and price range of a category."""
+    class Meta:
+        model = CategoryStats
+        fields = ['product_count', 'in_stock_count', 'min_price', 'max_price']
+
 
 class ProductCategorySerializer(serializers.ModelSerializer):
-    """Serializer for Category resource."""
+    """Serializer for Category resource. `stats` is free when the queryset selects it (select_related('stats'))."""
+    stats = CategoryStatsSerializer(read_only=True)
+
     class Meta:
         model = Category
-        fields = ['id', 'name']
+        fields = ['id', 'name', 'parent', 'depth', 'stats']
+        read_only_fields = ['depth']
+
+    def validate_parent(self, value):
+        """A category cannot be moved under itself or one of its descendants."""
+        if value is not None and self.instance is not None:
+            if value.pk == self.instance.pk or value.is_descendant_of(self.instance):
+                raise serializers.ValidationError("A category cannot be its own ancestor.")
+        return value
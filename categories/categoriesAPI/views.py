@@ -1,8 +1,14 @@
+from django.db.models.functions import Coalesce, Greatest
 from rest_framework import viewsets
-from categories.models import Category
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from categories.models import Category, CategoryStats
+from categories.tree import build_tree
 from categories.categoriesAPI.serializers import ProductCategorySerializer
 from rest_framework import permissions
 from rest_framework.permissions import IsAuthenticated
+from ECommerce.response_cache import CachedResponseMixin
+from ECommerce.conditional import ConditionalGetMixin
 
 class ModelPermissions(permissions.DjangoModelPermissions):
     """
@@ -29,14 +35,37 @@ class ModelPermissions(permissions.DjangoModelPermissions):
                         return user.has_perm('categories.delete_category')
         return False
     
-class ProductCategoryViewSet(viewsets.ModelViewSet):
+class ProductCategoryViewSet(ConditionalGetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing Product resources.
     Provides CRUD operations, filtering, searching, and pagination functionality.
     """
-    queryset = Category.objects.all()
+    # the stats are joined, so listing them costs no extra query
+    queryset = Category.objects.select_related('stats')
     serializer_class = ProductCategorySerializer
     permission_classes = [ModelPermissions]
+    # anonymous GET responses are cached until a category or its stats change
+    cache_models = (Category, CategoryStats)
+    # the stats change with the products, so they take part in the ETag/Last-Modified validators
+    last_modified_field = Greatest('updated_at', Coalesce('stats__updated_at', 'updated_at'))
+    cached_actions = ('list', 'retrieve', 'tree')
+    # the tree is the same for every user
+    shared_cached_actions = ('tree',)
+
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """
+        The whole category hierarchy as nested nodes, read with one query and cached until a category changes.
+        exemple : GET /api/ProductCategory/tree/
+        """
+        return self.cached_response(self.get_tree, request)
+
+    def get_tree(self, request):
+        rows = (
+            Category.objects.order_by('depth', 'name', 'pk')
+            .values('id', 'name', 'parent_id', product_count=Coalesce('stats__product_count', 0))
+        )
+        return Response(build_tree(rows))
 
 
    
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.2 on 2026-10-18 19:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q
+
+
+def fill_stats(apps, schema_editor):
+    Category = apps.get_model('categories', 'Category')
+    CategoryStats = apps.get_model('categories', 'CategoryStats')
+    Product = apps.get_model('products', 'Product')
+    rows = {
+        row['category']: row
+        for row in Product.objects.values('category').annotate(
+            product_count=Count('pk'), in_stock_count=Count('pk', filter=Q(stock_quantity__gt=0)),
+            min_price=Min('price'), max_price=Max('price'),
+        ).order_by()
+    }
+    CategoryStats.objects.bulk_create([
+        CategoryStats(category_id=pk, **{key: value for key, value in rows.get(pk, {}).items() if key != 'category'})
+        for pk in Category.objects.values_list('pk', flat=True)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0003_category_tree'),
+        ('products', '0015_product_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='categories.category')),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('in_stock_count', models.PositiveIntegerField(default=0)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=11, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=11, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
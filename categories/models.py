@@ -1,7 +1,69 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    # Materialized path of primary keys, e.g. "1/5/12/": a subtree is every path starting with its root's
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remembered so a save only re-indexes the products after a rename
+        if 'name' in field_names:
+            instance._loaded_name = instance.name
+        return instance
+
+    def build_path(self):
+        parent_path = self.parent.path if self.parent_id else ''
+        self.path = f"{parent_path}{self.pk}/"
+        self.depth = self.path.count('/') - 1
+
+    def save(self, *args, **kwargs):
+        # the row and its path (or its subtree's) are written together or not at all
+        with transaction.atomic():
+            if self.pk is None:
+                # the path is made of primary keys, so a new category is completed right after its insert
+                super().save(*args, **kwargs)
+                self.build_path()
+                Category.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+                return
+
+            old_path, old_depth = self.path, self.depth
+            self.build_path()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'path', 'depth'}
+            super().save(*args, **kwargs)
+            if old_path and old_path != self.path:
+                # moved: rewrite the prefix of the whole subtree in one statement
+                Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(self.path), Substr('path', len(old_path) + 1)),
+                    depth=F('depth') + (self.depth - old_depth),
+                )
+
+    def is_descendant_of(self, other):
+        return self.path.startswith(other.path) and self.pk != other.pk
+
+
+class CategoryStats(models.Model):
+    """
+    Denormalized product figures of a category (its own products, not its subcategories').
+    Maintained incrementally by products.category_stats and rebuilt by `reconcile_category_stats`.
+    """
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    product_count = models.PositiveIntegerField(default=0)
+    in_stock_count = models.PositiveIntegerField(default=0)
+    min_price = models.DecimalField(max_digits=11, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=11, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return f"{self.category_id}: {self.product_count} products"
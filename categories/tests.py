@@ -5,10 +5,12 @@ from rest_framework.test import APIClient
 from rest_framework import status
 from categories.models import Category
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 
 class ProductCategoryViewSetTests(TestCase):
     def setUp(self):
         """Set up test data and users with different permission levels"""
+        cache.clear()
         self.client = APIClient()
         
         # Create test users
@@ -143,4 +145,91 @@ class ProductCategoryViewSetTests(TestCase):
         
         # Test delete
         delete_response = self.client.delete(self.detail_url)
-        self.assertEqual(delete_response.status_code, status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        self.assertEqual(delete_response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_list_categories_cache_invalidated_on_rename(self):
+        """Test that cached anonymous category lists are refreshed when a category changes"""
+        cache.clear()
+        self.client.get(self.list_url)
+        # only the conditional GET validators are computed
+        with self.assertNumQueries(1):
+            self.client.get(self.list_url)
+        self.category.name = 'Renamed Category'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.save()
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.data[0]['name'], 'Renamed Category')
+
+
+    def test_retrieve_category_conditional_get(self):
+        """Test that an unchanged category is answered with 304 Not Modified"""
+        response = self.client.get(self.detail_url)
+        etag = response.headers['ETag']
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_retrieve_malformed_pk_is_not_found(self):
+        """Test that a non-numeric id is a 404, not a server error"""
+        response = self.client.get('/api/ProductCategory/abc/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.home = Category.objects.create(name='Home')
+        self.kitchen = Category.objects.create(name='Kitchen', parent=self.home)
+        self.knives = Category.objects.create(name='Knives', parent=self.kitchen)
+        self.garden = Category.objects.create(name='Garden')
+
+    def test_paths_follow_the_hierarchy(self):
+        self.knives.refresh_from_db()
+        self.assertEqual(self.knives.path, f"{self.home.pk}/{self.kitchen.pk}/{self.knives.pk}/")
+        self.assertEqual(self.knives.depth, 2)
+
+    def test_moving_a_category_moves_its_subtree(self):
+        self.kitchen.parent = self.garden
+        self.kitchen.save()
+        self.knives.refresh_from_db()
+        self.assertEqual(self.knives.path, f"{self.garden.pk}/{self.kitchen.pk}/{self.knives.pk}/")
+        self.assertEqual(self.knives.depth, 2)
+
+        self.kitchen.parent = None
+        self.kitchen.save()
+        self.knives.refresh_from_db()
+        self.assertEqual((self.knives.path, self.knives.depth), (f"{self.kitchen.pk}/{self.knives.pk}/", 1))
+
+    def test_failed_move_leaves_the_subtree_in_place(self):
+        self.kitchen.parent = self.garden
+        with self.assertRaises(ValueError):
+            self.kitchen.save(update_fields=['title'])
+        self.knives.refresh_from_db()
+        self.assertEqual(self.knives.path, f"{self.home.pk}/{self.kitchen.pk}/{self.knives.pk}/")
+        self.assertEqual(self.knives.depth, 2)
+
+    def test_cannot_move_under_a_descendant(self):
+        superuser = User.objects.create_superuser(username='root', email='root@test.com', password='rootpass123')
+        self.client.force_authenticate(user=superuser)
+        url = reverse('category-detail', args=[self.home.pk])
+        response = self.client.patch(url, {'parent': self.knives.pk})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tree_is_read_with_one_query_and_cached(self):
+        url = reverse('category-tree')
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.data, [
+            {'id': self.garden.pk, 'name': 'Garden', 'product_count': 0, 'children': []},
+            {'id': self.home.pk, 'name': 'Home', 'product_count': 0, 'children': [
+                {'id': self.kitchen.pk, 'name': 'Kitchen', 'product_count': 0, 'children': [
+                    {'id': self.knives.pk, 'name': 'Knives', 'product_count': 0, 'children': []},
+                ]},
+            ]},
+        ])
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Cups', parent=self.kitchen)
+        response = self.client.get(url)
+        self.assertEqual(len(response.data[1]['children'][0]['children']), 2)
@@ -0,0 +1,13 @@
+def build_tree(rows):
+    """
+    Nest category rows ({'id', 'name', 'parent_id', 'product_count'}) into a list of root nodes with their `children`.
+    Rows must list parents before their children (e.g. ordered by depth).
+    """
+    nodes = {}
+    roots = []
+    for row in rows:
+        node = {'id': row['id'], 'name': row['name'], 'product_count': row['product_count'], 'children': []}
+        nodes[row['id']] = node
+        parent = nodes.get(row['parent_id'])
+        (parent['children'] if parent is not None else roots).append(node)
+    return roots
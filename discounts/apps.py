@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class DiscountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'discounts'
+
+    def ready(self):
+        # Register signal handlers (response cache invalidation)
+        from discounts import signals  # noqa: F401
@@ -1,18 +1,9 @@
-from rest_framework.pagination import PageNumberPagination
+from ECommerce.pagination import CustomPagination as BasePagination
 
-class CustomPagination(PageNumberPagination):
+class CustomPagination(BasePagination):
     """
-    Custom pagination class that allows control over page size and limits.
-    Provides default, maximum, and client-configurable page sizes.
+    Pagination for discount listings.
+    Discounts have no creation date, so keyset mode walks (start_date, id).
     """
-    # Set the default number of items per page
-    page_size = 10
-    
-    # Allow the client to set the page size with a query parameter
-    page_size_query_param = 'page_size'
-    
-    # Set the maximum number of items per page to avoid overload
-    max_page_size = 100
-    
-    # Specify the query parameter for navigating to a specific page
-    page_query_param = 'page'
\ No newline at end of file
+    keyset_ordering = ('start_date', 'id')
+    keyset_orderings = ('start_date', 'end_date')
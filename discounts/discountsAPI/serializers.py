@@ -8,13 +8,19 @@ class ProductSerializer(serializers.ModelSerializer):
         Model = Product
         fields = ['id','name','description','price','stock_quantity']
 
+class DiscountSummarySerializer(serializers.ModelSerializer):
+    """Discount representation nested in expanded products."""
+    class Meta:
+        model = Discount
+        fields = ['id','name','amount','start_date','end_date']
+
 class DiscountSerializer(serializers.ModelSerializer):
     """
     Serializer for ProductDiscount resource.
     """
     #products = productSerializer(many=True, read_only=True)
 
-    Products = serializers.PrimaryKeyRelatedField(many=True,read_only=True)
+    Products = serializers.PrimaryKeyRelatedField(source='products', many=True,read_only=True)
 
     class Meta: 
         model = Discount
@@ -1,5 +1,5 @@
 from rest_framework import viewsets, permissions
-from discounts.models import Discount
+from discounts.models import Discount, ProductDiscount
 from discounts.discountsAPI.serializers import DiscountSerializer
 from rest_framework import filters
 from django_filters.rest_framework import DjangoFilterBackend
@@ -7,6 +7,8 @@ from .pagination import CustomPagination
 from django_filters.rest_framework import FilterSet
 import django_filters
 from django.db.models import Q
+from ECommerce.query_budget import QueryBudgetMixin
+from ECommerce.response_cache import CachedResponseMixin
 
 
 class ModelPermissions(permissions.DjangoModelPermissions):
@@ -36,12 +38,17 @@ class ProductFilter(FilterSet):
         model = Discount
         fields = ['included_date']    
 
-class DiscountViewSet(viewsets.ModelViewSet):
-    queryset = Discount.objects.all()
+class DiscountViewSet(CachedResponseMixin, QueryBudgetMixin, viewsets.ModelViewSet):
+    # the keyset ordering of CustomPagination, so page numbers walk the same stable order
+    queryset = Discount.objects.prefetch_related('products').order_by('start_date', 'id')
     serializer_class = DiscountSerializer
     permission_classes = [ModelPermissions]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_class = ProductFilter
     pagination_class = CustomPagination
+    # auth + count + page + products prefetch
+    query_budget = {'list': 4, 'retrieve': 3}
+    # anonymous GET responses are cached until one of these models changes
+    cache_models = (Discount, ProductDiscount)
 
     # exemple of query :http://127.0.0.1:8000/api/discounts/?included_date=2024-11-01
@@ -0,0 +1,21 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from discounts.models import Discount, ProductDiscount
+from ECommerce.response_cache import bump_generation
+
+
+@receiver(post_save, sender=Discount)
+@receiver(post_delete, sender=Discount)
+@receiver(post_save, sender=ProductDiscount)
+@receiver(post_delete, sender=ProductDiscount)
+def invalidate_discount_cache(sender, **kwargs):
+    """Bump the model's generation once committed, so cached discount responses are never served stale."""
+    transaction.on_commit(lambda: bump_generation(sender))
+
+
+@receiver(m2m_changed, sender=Discount.products.through)
+def invalidate_discount_products_cache(sender, action, **kwargs):
+    """Adding or removing products through the M2M manager bypasses post_save."""
+    if action.startswith('post_'):
+        transaction.on_commit(lambda: bump_generation(ProductDiscount))
@@ -1,15 +1,21 @@
+import warnings
+from django.core.cache import cache
+from django.core.paginator import UnorderedObjectListWarning
 from django.test import TestCase
 from django.urls import reverse
 from django.contrib.auth.models import User, Permission
 from django.utils import timezone
+from django.test import override_settings
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from datetime import date, timedelta
 from discounts.models import Discount
 from products.models import Product
+from categories.models import Category
 
 class DiscountViewSetTests(APITestCase):
     def setUp(self):
+        cache.clear()
         # Create test users with different permission levels
         self.admin_user = User.objects.create_user(
             username='admin', 
@@ -133,7 +139,47 @@ class DiscountViewSetTests(APITestCase):
         response = self.client.get(f"{self.url}?page=2")
         self.assertEqual(len(response.data['results']), 7)  # 17 total items, page 2 should have 7 items
 
+    def test_pagination_is_ordered(self):
+        """Test that page numbers walk discounts in the keyset order without an unordered warning"""
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', UnorderedObjectListWarning)
+            response = self.client.get(self.url)
+        self.assertEqual([row['name'] for row in response.data['results']], ['Test Discount 1', 'Test Discount 2'])
+
     def test_max_page_size_limit(self):
         """Test that page size cannot exceed max_page_size"""
         response = self.client.get(f"{self.url}?page_size=200")  # Max is 100
-        self.assertEqual(len(response.data['results']), min(Discount.objects.count(), 100))
\ No newline at end of file
+        self.assertEqual(len(response.data['results']), min(Discount.objects.count(), 100))
+
+    def test_cursor_pagination(self):
+        """Test keyset pagination walks discounts by start date without a total count"""
+        response = self.client.get(f"{self.url}?cursor=&page_size=1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        self.assertEqual(response.data['results'][0]['name'], 'Test Discount 1')
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['results'][0]['name'], 'Test Discount 2')
+        self.assertIsNone(response.data['next'])
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_list_discounts_query_budget(self):
+        """Test that discounted products are prefetched within the query budget"""
+        category = Category.objects.create(name='Toys')
+        product = Product.objects.create(name='Kite', price=12.00, stock_quantity=4, category=category)
+        self.discount1.products.add(product)
+        self.discount2.products.add(product)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['Products'], [product.id])
+
+    def test_cached_list_invalidated_on_update(self):
+        """Test that cached anonymous discount lists reflect updates immediately"""
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+        self.discount1.amount = 50.00
+        with self.captureOnCommitCallbacks(execute=True):
+            self.discount1.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][0]['amount'], '50.00')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from idempotency.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete the expired idempotency keys, in batches (run periodically, e.g. hourly from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Keys deleted per statement.")
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        now = timezone.now()
+        deleted = 0
+        while True:
+            # walks the expires_at index; small batches keep each delete's locks short
+            batch = list(
+                IdempotencyKey.objects.filter(expires_at__lte=now).order_by('expires_at')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            deleted += IdempotencyKey.objects.filter(pk__in=batch).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"{deleted} expired idempotency keys deleted."))
@@ -0,0 +1,107 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from products.category_stats import adjust_in_stock
+from products.models import Product
+from ECommerce.response_cache import bump_generation
+
+
+class OutOfStock(Exception):
+    """Some products do not have the requested quantity left."""
+
+    def __init__(self, quantities):
+        # {product id: requested quantity} of the products that are short
+        self.quantities = quantities
+        products = ", ".join(str(pk) for pk in sorted(quantities))
+        super().__init__(f"Not enough stock available for product(s) {products}.")
+
+
+def quantity_expression(quantities):
+    """The quantity of each row as one SQL expression: a CASE over the product ids, or a constant for one product."""
+    if len(quantities) == 1:
+        return Value(next(iter(quantities.values())))
+    return Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in sorted(quantities.items())],
+        output_field=IntegerField(),
+    )
+
+
+def record_stock_change(quantities, sign):
+    """
+    Read the stock left by a change of `sign` (-1 taken, +1 given back) under our own row
+    locks, then after commit invalidate cached products and count the products that sold
+    out or came back in their category stats.
+    """
+    flipped = Counter()
+    rows = Product.objects.filter(pk__in=list(quantities)).values_list('pk', 'stock_quantity', 'category_id')
+    for pk, stock, category_id in rows:
+        before = stock - sign * quantities[pk]
+        if (before > 0) != (stock > 0):
+            flipped[category_id] += 1 if stock > 0 else -1
+
+    def notify():
+        bump_generation(Product)
+        for category_id, delta in flipped.items():
+            adjust_in_stock(category_id, delta)
+    transaction.on_commit(notify)
+
+
+def reserve_many(quantities):
+    """
+    Take stock for {product id: quantity} with one conditional UPDATE:
+    SET stock_quantity = stock_quantity - CASE id ... END WHERE stock_quantity >= CASE id ... END.
+
+    Must run inside transaction.atomic, as the first write of a short transaction: the
+    row locks are only taken by this statement (in primary key order, so concurrent carts
+    cannot deadlock) and released at commit, so buyers of a hot product queue on the
+    UPDATE itself and can never oversell. All or nothing: raises OutOfStock listing the
+    products that are short.
+    """
+    amount = quantity_expression(quantities)
+    try:
+        with transaction.atomic():
+            taken = Product.objects.filter(pk__in=list(quantities), stock_quantity__gte=amount).update(
+                stock_quantity=F('stock_quantity') - amount, updated_at=timezone.now()
+            )
+            if taken != len(quantities):
+                raise OutOfStock({})
+    except OutOfStock:
+        # the savepoint is rolled back: report the products that could not be served
+        stock = dict(Product.objects.filter(pk__in=list(quantities)).values_list('pk', 'stock_quantity'))
+        raise OutOfStock({pk: quantity for pk, quantity in quantities.items() if stock.get(pk, 0) < quantity})
+    record_stock_change(quantities, -1)
+
+
+def release_many(quantities):
+    """Give {product id: quantity} back to the products (cancelled or reduced orders), in one UPDATE."""
+    amount = quantity_expression(quantities)
+    Product.objects.filter(pk__in=list(quantities)).update(
+        stock_quantity=F('stock_quantity') + amount, updated_at=timezone.now()
+    )
+    record_stock_change(quantities, 1)
+
+
+def reserve(product_id, quantity):
+    reserve_many({product_id: quantity})
+
+
+def release(product_id, quantity):
+    release_many({product_id: quantity})
+
+
+def exchange(old_product_id, old_quantity, new_product_id, new_quantity):
+    """Move an order's reservation from (old product, quantity) to (new product, quantity). Raises OutOfStock."""
+    if old_product_id == new_product_id:
+        delta = new_quantity - old_quantity
+        if delta > 0:
+            reserve(new_product_id, delta)
+        elif delta < 0:
+            release(old_product_id, -delta)
+        return
+    # rows are locked in primary key order, so two crossing exchanges cannot deadlock
+    steps = sorted([(new_product_id, reserve, new_quantity), (old_product_id, release, old_quantity)])
+    for product_id, apply, quantity in steps:
+        apply(product_id, quantity)
@@ -1,25 +1,33 @@
 from django.db import models
 from products.models import Product
 from django.conf import settings
-from django.core.exceptions import ValidationError
+
+
+class Checkout(models.Model):
+    """Header of a cart placed in one transaction; its lines are the Order rows pointing at it."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='checkouts')
+    total = models.DecimalField(max_digits=13, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Checkout {self.pk} by {self.user}"
+
 
 class Order(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
     order_date = models.DateTimeField(auto_now_add=True)
+    # Price of one unit when the order was placed (unknown for orders placed before it was recorded)
+    unit_price = models.DecimalField(max_digits=11, decimal_places=2, null=True, blank=True)
+    # Set when the order is one line of a multi-product checkout
+    checkout = models.ForeignKey(Checkout, on_delete=models.CASCADE, null=True, blank=True, related_name='lines')
 
-    def save(self, *args, **kwargs):
-        # Check if there is enough stock before saving the order
-        if self.product.stock_quantity < self.quantity:
-            raise ValidationError("Not enough stock available for this product.")
-
-        # Reduce the stock quantity
-        self.product.stock_quantity -= self.quantity
-        self.product.save()  # Save the product with updated stock
-
-        # Save the order
-        super().save(*args, **kwargs)
+    class Meta:
+        indexes = [
+            # "My orders": WHERE user = ? ORDER BY order_date DESC, id DESC, walked by keyset
+            models.Index(fields=['user', '-order_date', '-id'], name='order_user_date_idx'),
+        ]
 
     def __str__(self):
         return f"Order by {self.user} for {self.product.name}"
@@ -0,0 +1,11 @@
+from ECommerce.pagination import CustomPagination as BasePagination
+
+class OrderPagination(BasePagination):
+    """
+    Pagination for order history: newest first, walked by keyset over the
+    (user, order_date, id) index so every page is one index range scan.
+    ?page= still selects the page number mode.
+    """
+    keyset_ordering = ('-order_date', '-id')
+    keyset_orderings = ('order_date',)
+    keyset_by_default = True
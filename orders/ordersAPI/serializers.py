@@ -1,14 +1,24 @@
+from collections import Counter
+
+from django.db import connection, transaction
 from rest_framework import serializers
-from orders.models import Order
+from orders.models import Checkout, Order
+from orders.inventory import OutOfStock, exchange, reserve, reserve_many
+from products.models import Product
+from ECommerce.fieldsets import FieldsetSerializerMixin
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the Order model.
+    Supports `?fields=` and `?expand=product` on reads.
     """
     class Meta:
         model = Order
-        fields = ['id', 'user', 'product', 'quantity', 'order_date']
-        read_only_fields = ['order_date', 'user']
+        fields = ['id', 'user', 'product', 'quantity', 'order_date', 'unit_price', 'checkout']
+        expandable_fields = {
+            'product': ('products.productAPI.serializers.ProductSummarySerializer', {}),
+        }
+        read_only_fields = ['order_date', 'user', 'unit_price', 'checkout']
 
     def validate_quantity(self, value):
         """
@@ -21,33 +31,122 @@ class OrderSerializer(serializers.ModelSerializer):
     def validate(self, data):
         """
         Object-level validation to ensure business rules are met.
-        Example: Check if ordered quantity does not exceed stock.
+        Stock is not checked here: it is taken atomically when the order is saved.
         """
-        product = data.get('product')
-        quantity = data.get('quantity')
+        product = data.get('product', getattr(self.instance, 'product', None))
+        quantity = data.get('quantity', getattr(self.instance, 'quantity', None))
 
         # Ensure product and quantity are provided
         if not product or not quantity:
             raise serializers.ValidationError("Product and quantity must be specified.")
 
-        # Validate stock availability
-        if quantity > product.stock_quantity:  # Assuming `stock_quantity` is a field in Product
-            raise serializers.ValidationError(
-                f"Ordered quantity ({quantity}) exceeds available stock ({product.stock_quantity})."
-            )
-
         return data
 
+    def out_of_stock(self):
+        return serializers.ValidationError(
+            {'quantity': ["Not enough stock available for this product."]}, code='out_of_stock'
+        )
+
     def create(self, validated_data):
         """
-        Custom create method to reduce stock when an order is placed.
+        Reserve the stock and create the order in one short transaction.
+        """
+        try:
+            with transaction.atomic():
+                reserve(validated_data['product'].pk, validated_data['quantity'])
+                validated_data['unit_price'] = validated_data['product'].price
+                return super().create(validated_data)
+        except OutOfStock:
+            raise self.out_of_stock()
+
+    def update(self, instance, validated_data):
+        """
+        Move the reservation when the product or the quantity changes; a new product is
+        charged at its current price.
         """
-        product = validated_data['product']
-        quantity = validated_data['quantity']
+        old_product_id, old_quantity = instance.product_id, instance.quantity
+        product = validated_data.get('product', instance.product)
+        quantity = validated_data.get('quantity', instance.quantity)
+        if product.pk != old_product_id:
+            validated_data['unit_price'] = product.price
+        try:
+            with transaction.atomic():
+                exchange(old_product_id, old_quantity, product.pk, quantity)
+                return super().update(instance, validated_data)
+        except OutOfStock:
+            raise self.out_of_stock()
+
+
+class CheckoutLineSerializer(serializers.Serializer):
+    """One cart line: a product id and a quantity."""
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class CheckoutLineOutputSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Order
+        fields = ['id', 'product', 'quantity', 'unit_price']
 
-        # Reduce the stock
-        product.stock_quantity -= quantity
-        product.save()
 
-        # Create the order
-        return super().create(validated_data)
+class CheckoutSerializer(serializers.ModelSerializer):
+    """
+    Places a whole cart at once: POST {"lines": [{"product": <id>, "quantity": <n>}, ...]}.
+    The lines are created as orders of the checkout (see Order.checkout).
+    """
+    lines = CheckoutLineSerializer(many=True, write_only=True)
+
+    class Meta:
+        model = Checkout
+        fields = ['id', 'user', 'total', 'created_at', 'lines']
+        read_only_fields = ['user', 'total', 'created_at']
+
+    def validate_lines(self, lines):
+        if not lines:
+            raise serializers.ValidationError("A checkout needs at least one line.")
+        # the same product twice is one line
+        quantities = Counter()
+        for line in lines:
+            quantities[line['product']] += line['quantity']
+        products = Product.objects.only('price').in_bulk(list(quantities))
+        missing = sorted(set(quantities) - set(products))
+        if missing:
+            raise serializers.ValidationError(f"Unknown product(s): {', '.join(map(str, missing))}.")
+        self.products = products
+        return dict(quantities)
+
+    def create(self, validated_data):
+        """
+        Reserve the stock of every line with one statement, then insert the header and
+        bulk insert the lines, all in one transaction.
+        """
+        quantities, products = validated_data['lines'], self.products
+        user = validated_data['user']
+        try:
+            with transaction.atomic():
+                reserve_many(quantities)
+                checkout = Checkout.objects.create(
+                    user=user, total=sum(products[pk].price * quantity for pk, quantity in quantities.items())
+                )
+                lines = Order.objects.bulk_create([
+                    Order(user=user, product_id=pk, quantity=quantity, unit_price=products[pk].price, checkout=checkout)
+                    for pk, quantity in sorted(quantities.items())
+                ])
+        except OutOfStock as error:
+            raise serializers.ValidationError(
+                {'lines': [f"Not enough stock available for product {pk}." for pk in sorted(error.quantities)]},
+                code='out_of_stock',
+            )
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # MySQL does not return ids from bulk inserts
+            lines = list(checkout.lines.order_by('pk'))
+        checkout.created_lines = lines
+        return checkout
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        lines = getattr(instance, 'created_lines', None)
+        if lines is None:
+            lines = instance.lines.order_by('pk')
+        data['lines'] = CheckoutLineOutputSerializer(lines, many=True).data
+        return data
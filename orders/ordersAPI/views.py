@@ -1,9 +1,18 @@
 
-from rest_framework import viewsets
+from django.db import transaction
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from rest_framework import permissions
+from django_filters.rest_framework import DateFromToRangeFilter, DjangoFilterBackend, FilterSet
 from orders.models import Order
-from orders.ordersAPI.serializers import OrderSerializer
+from orders.ordersAPI.pagination import OrderPagination
+from orders.inventory import release
+from orders.ordersAPI.serializers import CheckoutSerializer, OrderSerializer
 from rest_framework.permissions import IsAuthenticated
+from ECommerce.query_budget import QueryBudgetMixin
+from ECommerce.fieldsets import FieldsetViewMixin
+from ECommerce.idempotency import IdempotencyMixin
 
 class ModelPermissions(permissions.BasePermission):
     """
@@ -31,36 +40,85 @@ class ModelPermissions(permissions.BasePermission):
         """
         # Allow staff and superusers to read any object
         if request.method in permissions.SAFE_METHODS:
-            return request.user.is_staff or request.user.is_superuser or obj.user.id == request.user.id
+            return request.user.is_staff or request.user.is_superuser or obj.user_id == request.user.id
         # Only the owner can modify or delete their object
-        return obj.user.id == request.user.id
+        return obj.user_id == request.user.id
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderFilter(FilterSet):
+    """
+    ?order_date_after=2024-01-01&order_date_before=2024-03-31 (days included, either bound optional).
+    """
+    order_date = DateFromToRangeFilter()
+
+    class Meta:
+        model = Order
+        fields = ['order_date']
+
+
+class OrderViewSet(IdempotencyMixin, FieldsetViewMixin, QueryBudgetMixin, viewsets.ModelViewSet):
     """
     View for managing orders.    
+    Reads accept `?fields=` and `?expand=product`.
+    Lists are paginated newest first by keyset (`next`/`previous` cursors) and filtered with
+    ?order_date_after=&order_date_before=.
+    exemple : GET /api/orders/?expand=product&order_date_after=2024-01-01
     """
-    queryset = Order.objects.all()
+    queryset = Order.objects.order_by('-order_date', '-id')
     serializer_class = OrderSerializer
     permission_classes = [ModelPermissions]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = OrderFilter
+    pagination_class = OrderPagination
+    # auth + one page of orders (product summaries joined);
+    # checkout: auth + products + stock savepoint, update and read + header + lines
+    query_budget = {'list': 2, 'retrieve': 2, 'checkout': 9}
+    # retried writes with an Idempotency-Key header are replayed instead of ordering twice
+    idempotent_actions = ('create', 'update', 'partial_update', 'destroy', 'checkout')
+    fieldset_select_related = {'product': 'product'}
+    # read by the object permission check, and by the keyset pagination
+    fieldset_always_load = ('user', 'order_date')
 
     def get_queryset(self):
           
         """
         Override the get_queryset method to filter orders based on the user.
         """
+        queryset = super().get_queryset()
         # If the user is a staff or superuser, return all Objects
         if self.request.user.is_staff or self.request.user.is_superuser:
-            return self.queryset
+            return queryset
         # Check if the request is a GET and the view action is 'list'
         if self.request.method == 'GET' and self.action == 'list':
-            return self.queryset.filter(user=self.request.user)
+            return queryset.filter(user=self.request.user)
 
         # Default behavior for other cases
-        return self.queryset
+        return queryset
 
 
     def perform_create(self, serializer):
         """
         Override the perform_create method to automatically associate the order with the current user.
         """
-        serializer.save(user=self.request.user)
\ No newline at end of file
+        serializer.save(user=self.request.user)
+
+    @action(detail=False, methods=['post'], serializer_class=CheckoutSerializer)
+    def checkout(self, request):
+        """
+        Place a whole cart in one transaction, stock of every line taken by one statement.
+        exemple : POST /api/orders/checkout/  {"lines": [{"product": 1, "quantity": 2}, {"product": 7, "quantity": 1}]}
+        """
+        return self.idempotent_response(self.place_checkout, request)
+
+    def place_checkout(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def perform_destroy(self, instance):
+        """
+        Deleting an order gives its stock back.
+        """
+        with transaction.atomic():
+            instance.delete()
+            release(instance.product_id, instance.quantity)
@@ -1,13 +1,24 @@
 from django.test import TestCase
 from rest_framework.test import APIClient
 from rest_framework import status
-from orders.models import Order
+from idempotency.models import IdempotencyKey
+from orders.models import Checkout, Order
 from products.models import Product
-from categories.models import Category
+from categories.models import Category, CategoryStats
+from orders.inventory import OutOfStock, reserve
+from django.db import OperationalError, connection, transaction
+from django.db.models.query import QuerySet
+from django.test.utils import CaptureQueriesContext
 
 from django.contrib.auth.models import User
+from django.test import override_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 from datetime import datetime, timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.utils import timezone
+from unittest.mock import patch
+from orders.ordersAPI.views import OrderViewSet
 
 
 class OrderViewSetTest(TestCase):
@@ -58,15 +69,15 @@ class OrderViewSetTest(TestCase):
         self.authenticate(self.user_token)
         response = self.client.get('/api/orders/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)  # User has only 1 order
-        self.assertEqual(response.data[0]['id'], self.order1.id)
+        self.assertEqual(len(response.data['results']), 1)  # User has only 1 order
+        self.assertEqual(response.data['results'][0]['id'], self.order1.id)
 
     def test_get_orders_superuser(self):
         """Test that superusers can access all orders"""
         self.authenticate(self.superuser_token)
         response = self.client.get('/api/orders/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)  # Superuser can access all orders
+        self.assertEqual(len(response.data['results']), 2)  # Superuser can access all orders
 
     def test_post_order_authenticated_user(self):
         """Test that authenticated users can create orders"""
@@ -134,9 +145,315 @@ class OrderViewSetTest(TestCase):
         response = self.client.get('/api/orders/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         print ("response : ",response)
-        self.assertEqual(len(response.data), 2)  # Staff can access all orders
+        self.assertEqual(len(response.data['results']), 2)  # Staff can access all orders
 
     def test_get_orders_unauthenticated(self):
         """Test that unauthenticated users cannot view orders"""
         response = self.client.get('/api/orders/')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_list_orders_query_budget(self):
+        """Test that listing orders stays within the declared query budget"""
+        for _ in range(10):
+            Order.objects.create(user=self.user, product=self.product, quantity=1)
+        self.authenticate(self.user_token)
+        response = self.client.get('/api/orders/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 10)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_sparse_fields_and_product_expansion(self):
+        """Test that ?fields= trims orders and ?expand=product nests a product summary"""
+        self.authenticate(self.user_token)
+        response = self.client.get('/api/orders/', {'fields': 'id,quantity', 'expand': 'product'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [{
+            'id': self.order1.id,
+            'quantity': 10,
+            'product': {'id': self.product.id, 'name': "Sample Product", 'price': "100.00"},
+        }])
+
+
+class OrderHistoryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='history', password='history123')
+        other = User.objects.create_user(username='neighbour', password='neighbour123')
+        category = Category.objects.create(name="History")
+        self.product = Product.objects.create(name="Mug", price=8.00, stock_quantity=100, category=category)
+        start = timezone.now() - timedelta(days=30)
+        self.orders = [Order.objects.create(user=self.user, product=self.product, quantity=1) for _ in range(25)]
+        Order.objects.create(user=other, product=self.product, quantity=1)
+        # one order per day, the last two on the same instant (the id breaks the tie)
+        for day, order in enumerate(self.orders):
+            Order.objects.filter(pk=order.pk).update(order_date=start + timedelta(days=min(day, 23)))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_history_is_walked_newest_first_one_query_per_page(self):
+        seen = []
+        url = '/api/orders/'
+        params = {'expand': 'product', 'page_size': 10}
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, params)
+            self.assertEqual(len(queries), 1)
+            self.assertNotIn('COUNT', queries[0]['sql'])
+            self.assertNotIn('OFFSET', queries[0]['sql'])
+            seen += response.data['results']
+            url, params = response.data['next'], None
+        self.assertEqual([order['id'] for order in seen], [order.id for order in reversed(self.orders)])
+        self.assertEqual(seen[0]['product'], {'id': self.product.id, 'name': "Mug", 'price': "8.00"})
+
+    def test_page_numbers_are_still_available(self):
+        response = self.client.get('/api/orders/', {'page': 2, 'page_size': 10})
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(response.data['results'][0]['id'], self.orders[14].id)
+
+    def test_date_range_filter(self):
+        first = Order.objects.get(pk=self.orders[0].pk).order_date.date()
+        response = self.client.get('/api/orders/', {
+            'order_date_after': (first + timedelta(days=2)).isoformat(),
+            'order_date_before': (first + timedelta(days=4)).isoformat(),
+        })
+        self.assertEqual(
+            [order['id'] for order in response.data['results']],
+            [self.orders[4].id, self.orders[3].id, self.orders[2].id],
+        )
+
+
+class OrderStockTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='buyer123')
+        self.category = Category.objects.create(name="Stock")
+        self.product = Product.objects.create(name="Lamp", price=30.00, stock_quantity=5, category=self.category)
+        self.other = Product.objects.create(name="Bulb", price=3.00, stock_quantity=50, category=self.category)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def stock(self, product):
+        product.refresh_from_db()
+        return product.stock_quantity
+
+    def order(self, quantity, product=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/orders/', {"product": (product or self.product).id, "quantity": quantity})
+
+    def test_order_takes_stock_once(self):
+        response = self.order(3)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.stock(self.product), 2)
+
+    def test_out_of_stock_is_refused_without_side_effects(self):
+        self.order(3)
+        response = self.order(3)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['quantity'][0].code, 'out_of_stock')
+        self.assertEqual(self.stock(self.product), 2)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_reservation_is_one_conditional_update(self):
+        with CaptureQueriesContext(connection) as queries, transaction.atomic():
+            reserve(self.product.id, 5)
+        update = next(q['sql'] for q in queries if q['sql'].startswith('UPDATE'))
+        self.assertIn('"stock_quantity" >= 5', update)
+        with self.assertRaises(OutOfStock), transaction.atomic():
+            reserve(self.product.id, 1)
+        self.assertEqual(self.stock(self.product), 0)
+
+    def test_update_and_delete_move_the_reservation(self):
+        order_id = self.order(2).data['id']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/orders/{order_id}/', {"quantity": 4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.stock(self.product), 1)
+
+        response = self.client.patch(f'/api/orders/{order_id}/', {"quantity": 6})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.stock(self.product), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/orders/{order_id}/', {"product": self.other.id})
+        self.assertEqual((self.stock(self.product), self.stock(self.other)), (5, 46))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/orders/{order_id}/')
+        self.assertEqual(self.stock(self.other), 50)
+
+    def test_changing_product_charges_its_price(self):
+        order_id = self.order(1).data['id']
+        self.product.price = 35.00
+        self.product.save()
+        response = self.client.patch(f'/api/orders/{order_id}/', {"quantity": 2})
+        self.assertEqual(response.data['unit_price'], "30.00")
+
+        response = self.client.patch(f'/api/orders/{order_id}/', {"product": self.other.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['unit_price'], "3.00")
+        self.assertEqual(str(Order.objects.get(pk=order_id).unit_price), "3.00")
+
+    def test_selling_out_updates_category_stats(self):
+        self.order(5)
+        self.assertEqual(CategoryStats.objects.get(category=self.category).in_stock_count, 1)
+        order_id = Order.objects.get().id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/orders/{order_id}/')
+        self.assertEqual(CategoryStats.objects.get(category=self.category).in_stock_count, 2)
+
+
+class CheckoutTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cart', password='cart123')
+        self.category = Category.objects.create(name="Kitchen")
+        self.pan = Product.objects.create(name="Pan", price=25.00, stock_quantity=4, category=self.category)
+        self.pot = Product.objects.create(name="Pot", price=40.00, stock_quantity=1, category=self.category)
+        self.lid = Product.objects.create(name="Lid", price=5.50, stock_quantity=10, category=self.category)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def checkout(self, lines):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/orders/checkout/', {'lines': lines}, format='json')
+
+    def stocks(self):
+        return dict(Product.objects.values_list('name', 'stock_quantity'))
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_checkout_places_the_whole_cart(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.checkout([
+                {'product': self.pan.id, 'quantity': 2},
+                {'product': self.pot.id, 'quantity': 1},
+                {'product': self.pan.id, 'quantity': 1},
+            ])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['total'], '115.00')
+        self.assertEqual(
+            [(line['product'], line['quantity'], line['unit_price']) for line in response.data['lines']],
+            [(self.pan.id, 3, '25.00'), (self.pot.id, 1, '40.00')],
+        )
+        self.assertEqual(self.stocks(), {'Pan': 1, 'Pot': 0, 'Lid': 10})
+        # one UPDATE for every product
+        stock_updates = [q for q in queries if q['sql'].startswith('UPDATE "products_product"')]
+        self.assertEqual(len(stock_updates), 1)
+        self.assertIn('CASE', stock_updates[0]['sql'])
+
+        # the lines are orders of the checkout, listed in the single-product shape
+        checkout = Checkout.objects.get()
+        self.assertEqual(checkout.lines.count(), 2)
+        orders = self.client.get('/api/orders/').data['results']
+        self.assertEqual({order['checkout'] for order in orders}, {checkout.id})
+        self.assertEqual(CategoryStats.objects.get(category=self.category).in_stock_count, 2)
+
+    def test_short_line_fails_the_whole_cart(self):
+        response = self.checkout([
+            {'product': self.lid.id, 'quantity': 2},
+            {'product': self.pot.id, 'quantity': 2},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['lines'][0].code, 'out_of_stock')
+        self.assertIn(str(self.pot.id), response.data['lines'][0])
+        self.assertEqual(self.stocks(), {'Pan': 4, 'Pot': 1, 'Lid': 10})
+        self.assertFalse(Checkout.objects.exists())
+        self.assertFalse(Order.objects.exists())
+
+    def test_invalid_lines(self):
+        for lines in [[], [{'product': 0, 'quantity': 1}], [{'product': self.pan.id, 'quantity': 0}]]:
+            response = self.checkout(lines)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, lines)
+        self.assertEqual(self.stocks(), {'Pan': 4, 'Pot': 1, 'Lid': 10})
+
+
+@override_settings(QUERY_BUDGET_RAISE=True)
+class IdempotencyKeyTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='mobile', password='mobile123')
+        self.category = Category.objects.create(name="Retry")
+        self.product = Product.objects.create(name="Cable", price=9.00, stock_quantity=10, category=self.category)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def post(self, quantity=2, key='order-1', url='/api/orders/', data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                url, data or {"product": self.product.id, "quantity": quantity},
+                format='json', HTTP_IDEMPOTENCY_KEY=key,
+            )
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock_quantity
+
+    def test_retry_replays_the_first_response(self):
+        first = self.post()
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        with self.assertNumQueries(1):
+            retry = self.post()
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.stock(), 8)
+
+        # another key is another order
+        self.assertEqual(self.post(key='order-2').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.stock(), 6)
+
+    def test_key_is_bound_to_its_request(self):
+        self.post()
+        response = self.post(quantity=3)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(self.stock(), 8)
+
+    def test_failed_request_releases_the_key(self):
+        response = self.post(quantity=50)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.product.stock_quantity = 60
+        self.product.save()
+        self.assertEqual(self.post(quantity=50).status_code, status.HTTP_201_CREATED)
+
+    def test_running_request_conflicts(self):
+        # the key row is locked by the transaction of the first request
+        with patch.object(QuerySet, 'select_for_update', side_effect=OperationalError('lock not available')):
+            response = self.post()
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.stock(), 10)
+
+    def test_key_commits_with_the_write(self):
+        # a crash after the order is written rolls the order back with the claim
+        with patch.object(OrderViewSet, 'get_success_headers', side_effect=RuntimeError('crash')):
+            with self.assertRaises(RuntimeError):
+                self.post()
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.stock(), 10)
+        self.assertEqual(self.post().status_code, status.HTTP_201_CREATED)
+
+    def test_pending_key_without_a_live_request_is_reclaimed(self):
+        IdempotencyKey.objects.create(
+            user=self.user, key='order-1', fingerprint='', expires_at=timezone.now() + timedelta(hours=1)
+        )
+        self.assertEqual(self.post().status_code, status.HTTP_201_CREATED)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, status.HTTP_201_CREATED)
+
+    def test_checkout_is_idempotent(self):
+        data = {'lines': [{'product': self.product.id, 'quantity': 4}]}
+        first = self.post(url='/api/orders/checkout/', data=data)
+        retry = self.post(url='/api/orders/checkout/', data=data)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(Checkout.objects.count(), 1)
+        self.assertEqual(self.stock(), 6)
+
+    def test_purge_deletes_expired_keys(self):
+        self.post()
+        self.post(key='order-2')
+        IdempotencyKey.objects.filter(key='order-1').update(expires_at=timezone.now() - timedelta(seconds=1))
+        out = StringIO()
+        call_command('purge_idempotency_keys', '--batch-size', '1', stdout=out)
+        self.assertIn("1 expired", out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['order-2'])
+        # an expired key no longer replays
+        self.assertEqual(self.post().status_code, status.HTTP_201_CREATED)
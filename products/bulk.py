@@ -0,0 +1,158 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from categories.models import Category
+from products.models import Product
+from products.signals import products_bulk_changed
+
+# Columns a bulk row may set
+WRITABLE_FIELDS = ['sku', 'name', 'description', 'price', 'stock_quantity', 'category']
+
+# Columns required to create a product
+REQUIRED_ON_CREATE = ['sku', 'name', 'price', 'stock_quantity', 'category']
+
+
+class BulkProductRowSerializer(serializers.Serializer):
+    """
+    Field-level validation of one bulk row. Runs without touching the database;
+    keys and categories are resolved for the whole batch afterwards.
+    """
+    id = serializers.IntegerField(required=False, min_value=1)
+    sku = serializers.CharField(required=False, max_length=64)
+    name = serializers.CharField(required=False, max_length=255)
+    description = serializers.CharField(required=False, allow_blank=True)
+    price = serializers.DecimalField(required=False, max_digits=11, decimal_places=2, min_value=Decimal('0.01'))
+    # Zero is allowed: ERP feeds report sold-out items
+    stock_quantity = serializers.IntegerField(required=False, min_value=0)
+    category = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, data):
+        if 'id' not in data and 'sku' not in data:
+            raise serializers.ValidationError("Each row needs an 'id' or a 'sku'.")
+        return data
+
+
+def upsert_products(rows, can_create=True, can_update=True, chunk_size=None):
+    """
+    Create or update products in bulk.
+
+    Rows are matched by `id` (update only) or by `sku` (update, or create when unknown).
+    The whole batch is validated in one pass with three lookups (ids, skus, categories),
+    then written with bulk_create/bulk_update in chunks inside one transaction.
+    Invalid rows are reported and skipped; the others are written.
+
+    Returns one result dict per row: {'index', 'status', 'id', 'sku'} plus 'errors' for failures.
+    """
+    chunk_size = chunk_size or getattr(settings, 'PRODUCT_BULK_CHUNK_SIZE', 500)
+    results = [{'index': index, 'status': 'error', 'id': None, 'sku': None} for index in range(len(rows))]
+
+    # 1. Field validation, no queries
+    valid = {}
+    for index, row in enumerate(rows):
+        row_serializer = BulkProductRowSerializer(data=row)
+        if row_serializer.is_valid():
+            valid[index] = row_serializer.validated_data
+            results[index]['sku'] = valid[index].get('sku')
+        else:
+            results[index]['errors'] = row_serializer.errors
+
+    # 2. Resolve keys and categories for the whole batch
+    ids = {data['id'] for data in valid.values() if 'id' in data}
+    skus = {data['sku'] for data in valid.values() if 'sku' in data}
+    category_ids = {data['category'] for data in valid.values() if 'category' in data}
+    by_id = Product.objects.in_bulk(ids) if ids else {}
+    by_sku = Product.objects.in_bulk(skus, field_name='sku') if skus else {}
+    categories = Category.objects.in_bulk(category_ids) if category_ids else {}
+
+    to_create, to_update = [], {}
+    created_index, updated_index = {}, {}
+    changed_fields = set()
+    touched_categories = set()
+    seen_keys = set()
+    claimed_skus = set()
+
+    for index, data in valid.items():
+        errors = {}
+        product = by_id.get(data['id']) if 'id' in data else by_sku.get(data.get('sku'))
+
+        key = ('id', product.pk) if product else ('sku', data.get('sku'))
+        if key in seen_keys:
+            errors['non_field_errors'] = ["Duplicate row for the same product in this batch."]
+        seen_keys.add(key)
+
+        if 'id' in data and product is None:
+            errors['id'] = [f"Product {data['id']} does not exist."]
+        if 'category' in data and data['category'] not in categories:
+            errors['category'] = [f"Category {data['category']} does not exist."]
+        if 'sku' in data:
+            owner = by_sku.get(data['sku'])
+            if owner is not None and product is not None and owner.pk != product.pk:
+                errors['sku'] = ["Another product already uses this sku."]
+            elif data['sku'] in claimed_skus and 'non_field_errors' not in errors:
+                errors['sku'] = ["Another row of this batch already uses this sku."]
+            claimed_skus.add(data['sku'])
+
+        if product is None and not errors:
+            if not can_create:
+                errors['non_field_errors'] = ["You do not have permission to create products."]
+            missing = [field for field in REQUIRED_ON_CREATE if field not in data]
+            for field in missing:
+                errors[field] = ["This field is required to create a product."]
+        elif product is not None and not can_update:
+            errors['non_field_errors'] = ["You do not have permission to change products."]
+
+        if errors:
+            results[index]['errors'] = errors
+            continue
+
+        if product is None:
+            product = Product(description='')
+            created_index[index] = product
+            to_create.append(product)
+        else:
+            touched_categories.add(product.category_id)
+            updated_index[index] = product
+            to_update[product.pk] = product
+
+        for field in WRITABLE_FIELDS:
+            if field not in data:
+                continue
+            if field == 'category':
+                product.category = categories[data['category']]
+            else:
+                setattr(product, field, data[field])
+            changed_fields.add(field)
+        touched_categories.add(product.category_id)
+
+    # 3. Write in chunks inside one transaction, stamped right before writing: the changes
+    # feed only reads rows older than PRODUCT_CHANGES_SETTLE_SECONDS (see products.changes)
+    now = timezone.now()
+    for product in [*to_create, *to_update.values()]:
+        product.updated_at = now
+    with transaction.atomic():
+        if to_create:
+            Product.objects.bulk_create(to_create, batch_size=chunk_size)
+            if not connection.features.can_return_rows_from_bulk_insert:
+                # MySQL does not return ids from bulk inserts; created rows always carry a sku
+                pks = dict(Product.objects.filter(sku__in=[p.sku for p in to_create]).values_list('sku', 'pk'))
+                for product in to_create:
+                    product.pk = pks[product.sku]
+        if to_update:
+            Product.objects.bulk_update(
+                list(to_update.values()), sorted(changed_fields | {'updated_at'}), batch_size=chunk_size
+            )
+        product_ids = [p.pk for p in to_create] + list(to_update)
+        if product_ids:
+            transaction.on_commit(lambda: products_bulk_changed.send(
+                sender=Product, product_ids=product_ids, category_ids=touched_categories
+            ))
+
+    for index, product in created_index.items():
+        results[index].update(status='created', id=product.pk, sku=product.sku)
+    for index, product in updated_index.items():
+        results[index].update(status='updated', id=product.pk, sku=product.sku)
+    return results
@@ -0,0 +1,123 @@
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, Max, Min, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+
+from categories.models import Category, CategoryStats
+from products.models import Product
+from ECommerce.response_cache import bump_generation
+
+FIGURES = ('product_count', 'in_stock_count', 'min_price', 'max_price')
+EMPTY = {'product_count': 0, 'in_stock_count': 0, 'min_price': None, 'max_price': None}
+
+
+def category_extreme(function):
+    # MIN/MAX price of the outer category: a seek on product_category_price_idx
+    return Subquery(
+        Product.objects.filter(category=OuterRef('pk')).order_by()
+        .values('category').annotate(value=function('price')).values('value')
+    )
+
+
+def decrement(field, amount):
+    """
+    `field - amount` floored at 0. Drifted stats (until `reconcile_stats` repairs them) must
+    not fail the product write on the unsigned columns; CASE only subtracts when it fits.
+    """
+    return Case(When(**{f'{field}__gte': amount}, then=F(field) - amount), default=Value(0))
+
+
+def add_product(state):
+    """Count a product in its category: one UPDATE of F-expression deltas."""
+    category_id, price, in_stock = state
+    updated = CategoryStats.objects.filter(pk=category_id).update(
+        product_count=F('product_count') + 1,
+        in_stock_count=F('in_stock_count') + int(in_stock),
+        min_price=Coalesce(Least('min_price', Value(price)), Value(price)),
+        max_price=Coalesce(Greatest('max_price', Value(price)), Value(price)),
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        # no stats row yet (e.g. the category predates the table): build it from the products
+        reconcile_stats([category_id])
+
+
+def remove_product(state):
+    """
+    Uncount a product from its category. The counts are decremented in place; the price
+    range is only recomputed when the product held its minimum or maximum.
+    """
+    category_id, price, in_stock = state
+    stats = CategoryStats.objects.filter(pk=category_id)
+    stats.update(
+        product_count=decrement('product_count', 1),
+        in_stock_count=decrement('in_stock_count', int(in_stock)),
+        updated_at=timezone.now(),
+    )
+    stats.filter(Q(min_price__gte=price) | Q(max_price__lte=price)).update(
+        min_price=category_extreme(Min), max_price=category_extreme(Max),
+    )
+
+
+def apply_change(old, new):
+    """Move a product's contribution from state `old` to `new` (either may be None). Returns whether anything changed."""
+    if old == new:
+        return False
+    if old is not None:
+        remove_product(old)
+    if new is not None:
+        add_product(new)
+    transaction.on_commit(lambda: bump_generation(CategoryStats))
+    return True
+
+
+def reconcile_stats(category_ids=None, batch_size=1000):
+    """
+    Recompute the stats of `category_ids` (every category when None) from the products
+    with grouped aggregates, and rewrite the rows that drifted. Returns how many did.
+    """
+    categories = Category.objects.order_by('pk')
+    if category_ids is not None:
+        categories = categories.filter(pk__in=category_ids)
+    category_ids = list(categories.values_list('pk', flat=True))
+    upsert = {'update_conflicts': True, 'update_fields': [*FIGURES, 'updated_at']}
+    if connection.features.supports_update_conflicts_with_target:
+        upsert['unique_fields'] = ['category']
+
+    drifted = 0
+    for start in range(0, len(category_ids), batch_size):
+        chunk = category_ids[start:start + batch_size]
+        with transaction.atomic():
+            # locked so the incremental updates of the chunk wait for the rewrite
+            stored = {
+                row['category']: row
+                for row in CategoryStats.objects.select_for_update().filter(pk__in=chunk).values('category', *FIGURES)
+            }
+            actual = {
+                row.pop('category'): row
+                for row in Product.objects.filter(category_id__in=chunk).values('category').annotate(
+                    product_count=Count('pk'),
+                    in_stock_count=Count('pk', filter=Q(stock_quantity__gt=0)),
+                    min_price=Min('price'),
+                    max_price=Max('price'),
+                ).order_by()
+            }
+            now = timezone.now()
+            rows = []
+            for pk in chunk:
+                figures = actual.get(pk, EMPTY)
+                row = stored.get(pk)
+                if row is None or any(row[field] != figures[field] for field in FIGURES):
+                    rows.append(CategoryStats(category_id=pk, updated_at=now, **figures))
+            CategoryStats.objects.bulk_create(rows, **upsert)
+        drifted += len(rows)
+    if drifted:
+        transaction.on_commit(lambda: bump_generation(CategoryStats))
+    return drifted
+
+
+def adjust_in_stock(category_id, delta):
+    """Stock written directly (see orders.inventory) moved a product in or out of stock."""
+    in_stock_count = F('in_stock_count') + delta if delta >= 0 else decrement('in_stock_count', -delta)
+    CategoryStats.objects.filter(pk=category_id).update(in_stock_count=in_stock_count, updated_at=timezone.now())
+    transaction.on_commit(lambda: bump_generation(CategoryStats))
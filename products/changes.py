@@ -0,0 +1,95 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from products.models import ProductTombstone
+
+# Position of an empty feed: before every product and tombstone
+ORIGIN = {'updated': None, 'deleted': None}
+
+
+def get_settle_delay():
+    """
+    How long rows are held back before the feed reads them.
+
+    updated_at is stamped inside the writing transaction, so a row only becomes visible
+    when it commits, possibly after newer rows were already read past. The delay must
+    therefore exceed the longest transaction writing products. Writes through the API
+    are short. A bulk write stamps its rows right before writing them, and the importer
+    logs a warning when one of its chunks runs longer than the delay.
+    """
+    return datetime.timedelta(seconds=getattr(settings, 'PRODUCT_CHANGES_SETTLE_SECONDS', 5))
+
+
+def encode_watermark(position):
+    payload = {
+        stream: None if value is None else [value[0].isoformat(), value[1]]
+        for stream, value in position.items()
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_watermark(encoded):
+    """Return the position stored in a watermark; raises ValueError when it is malformed."""
+    if not encoded:
+        return dict(ORIGIN)
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+        position = {}
+        for stream in ORIGIN:
+            value = payload[stream]
+            if value is None:
+                position[stream] = None
+                continue
+            moment, pk = parse_datetime(value[0]), int(value[1])
+            if moment is None:
+                raise ValueError(value[0])
+            position[stream] = (moment, pk)
+    except (binascii.Error, KeyError, TypeError, IndexError) as error:
+        raise ValueError(str(error))
+    return position
+
+
+def after(position, time_field):
+    """Rows strictly after (time, id) in the (time_field, id) order."""
+    if position is None:
+        return Q()
+    moment, pk = position
+    return Q(**{f'{time_field}__gt': moment}) | Q(**{time_field: moment, 'pk__gt': pk})
+
+
+def changes_since(products, position, limit):
+    """
+    Walk the products updated and deleted after `position`, at most `limit` of each.
+
+    `products` is the queryset the changed products are read from. Returns
+    (changed product ids, deleted product ids, next position, has_more), ids in walk order.
+    Both streams are read in (time, id) order through their index, so a sync costs
+    O(changes) whatever the catalog size.
+    """
+    settled = timezone.now() - get_settle_delay()
+    changed = list(
+        products.filter(after(position['updated'], 'updated_at'), updated_at__lte=settled)
+        .order_by('updated_at', 'pk').values_list('updated_at', 'pk')[:limit + 1]
+    )
+    tombstones = list(
+        ProductTombstone.objects.filter(after(position['deleted'], 'deleted_at'), deleted_at__lte=settled)
+        .order_by('deleted_at', 'pk').values_list('deleted_at', 'pk', 'product_id')[:limit + 1]
+    )
+    has_more = len(changed) > limit or len(tombstones) > limit
+    changed, tombstones = changed[:limit], tombstones[:limit]
+
+    next_position = dict(position)
+    if changed:
+        next_position['updated'] = changed[-1]
+    if tombstones:
+        next_position['deleted'] = tombstones[-1][:2]
+    changed_ids = [pk for _, pk in changed]
+    return changed_ids, [product_id for _, _, product_id in tombstones], next_position, has_more
@@ -0,0 +1,177 @@
+import logging
+import os
+import threading
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from products.images import VARIANTS_DIR, get_executor
+from products.models import Image, PendingFileDeletion
+from products.storage import IMAGES_DIR, content_hash_from_name, content_path
+
+logger = logging.getLogger(__name__)
+
+
+def image_paths(image):
+    """Every stored file of an image: the original and its variants."""
+    paths = [image.image.name] if image.image else []
+    for variant in image.variants.values():
+        paths.extend(value for value in variant.values() if isinstance(value, str))
+    return paths
+
+
+def enqueue_deletions(paths):
+    """Queue files for the background cleanup, in the caller's transaction."""
+    PendingFileDeletion.objects.bulk_create(
+        [PendingFileDeletion(path=path) for path in set(paths) if path], ignore_conflicts=True
+    )
+
+
+def storage_for(path):
+    if path.startswith(VARIANTS_DIR + '/'):
+        return default_storage
+    return Image._meta.get_field('image').storage
+
+
+def variant_key(path):
+    """The directory key of a variant path (a content hash, or an image id for older variants)."""
+    parts = path.split('/')
+    if path.startswith(VARIANTS_DIR + '/') and len(parts) == len(VARIANTS_DIR.split('/')) + 2:
+        return parts[-2]
+    return None
+
+
+def referenced_paths(paths):
+    """
+    Return the subset of `paths` still used by an Image row, in at most three queries.
+
+    Originals are shared between rows with the same content, and so are the variants
+    keyed by content hash: a file only becomes garbage once no row references it.
+    """
+    paths = set(paths)
+    used = set(Image.objects.filter(image__in=paths).values_list('image', flat=True))
+
+    by_key = {}
+    for path in paths - used:
+        key = variant_key(path)
+        if key:
+            by_key.setdefault(key, []).append(path)
+
+    live_keys = set()
+    image_ids = [int(key) for key in by_key if key.isdigit()]
+    if image_ids:
+        live_keys.update(str(pk) for pk in Image.objects.filter(pk__in=image_ids).values_list('pk', flat=True))
+    digests = [key for key in by_key if not key.isdigit()]
+    if digests:
+        names = Image.objects.filter(
+            reduce(or_, (Q(image__startswith=content_path(digest)) for digest in digests))
+        ).values_list('image', flat=True)
+        live_keys.update(content_hash_from_name(name) for name in names)
+
+    for key in live_keys & by_key.keys():
+        used.update(by_key[key])
+    return used
+
+
+def collect_garbage(batch_size=None, max_attempts=None):
+    """
+    Delete one batch of queued files. Files still referenced are dropped from the queue,
+    failures are retried later with an exponential backoff.
+    Returns (processed, deleted, failed); nothing was due when `processed` is 0.
+    """
+    batch_size = batch_size or getattr(settings, 'PRODUCT_FILE_CLEANUP_BATCH_SIZE', 500)
+    max_attempts = max_attempts or getattr(settings, 'PRODUCT_FILE_CLEANUP_MAX_ATTEMPTS', 5)
+    now = timezone.now()
+    deleted, failed = 0, 0
+
+    with transaction.atomic():
+        # concurrent workers skip each other's rows where the database supports it
+        batch = list(
+            PendingFileDeletion.objects.select_for_update(skip_locked=True)
+            .filter(next_attempt_at__lte=now, attempts__lt=max_attempts).order_by('pk')[:batch_size]
+        )
+        if not batch:
+            return 0, 0, 0
+        used = referenced_paths(entry.path for entry in batch)
+
+        done = []
+        for entry in batch:
+            if entry.path in used:
+                done.append(entry.pk)
+                continue
+            try:
+                storage_for(entry.path).delete(entry.path)  # missing files are ignored
+            except OSError as error:
+                entry.attempts += 1
+                entry.last_error = str(error)
+                entry.next_attempt_at = now + timedelta(minutes=2 ** entry.attempts)
+                entry.save(update_fields=['attempts', 'last_error', 'next_attempt_at'])
+                failed += 1
+                logger.warning("Cannot delete %s (attempt %s): %s", entry.path, entry.attempts, error)
+            else:
+                done.append(entry.pk)
+                deleted += 1
+        PendingFileDeletion.objects.filter(pk__in=done).delete()
+    return len(batch), deleted, failed
+
+
+def collect_all(batch_size=None, max_attempts=None):
+    """Run batches until nothing is due. Returns the total (deleted, failed)."""
+    total_deleted, total_failed = 0, 0
+    while True:
+        # every processed row is either removed or postponed, so this terminates
+        processed, deleted, failed = collect_garbage(batch_size, max_attempts)
+        if not processed:
+            return total_deleted, total_failed
+        total_deleted += deleted
+        total_failed += failed
+
+
+_pending = threading.Lock()
+
+
+def schedule_cleanup():
+    """
+    Run the cleanup outside the request thread, on the image worker threads.
+    Many deletions committed together schedule a single run.
+    """
+    if getattr(settings, 'PRODUCT_IMAGE_PIPELINE', 'thread') == 'sync':
+        collect_all()
+        return
+    if _pending.acquire(blocking=False):
+        get_executor().submit(run_cleanup)
+
+
+def run_cleanup():
+    # files queued from now on schedule a new run
+    _pending.release()
+    try:
+        collect_all()
+    except Exception:
+        logger.exception("File cleanup failed")
+    finally:
+        connections.close_all()
+
+
+def iter_media_files(directory=IMAGES_DIR):
+    """Yield (path, size, modified) for every file under `directory`, walking the tree lazily."""
+    stack = [os.path.join(settings.MEDIA_ROOT, directory)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat()
+                    path = os.path.relpath(entry.path, settings.MEDIA_ROOT).replace(os.sep, '/')
+                    yield path, stat.st_size, stat.st_mtime
@@ -0,0 +1,83 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from products.models import Product
+
+EXPORT_FIELDS = [
+    'id', 'sku', 'name', 'description', 'price', 'stock_quantity',
+    'created_date', 'updated_at', 'category', 'category_name', 'images',
+]
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def iter_products(queryset=None, chunk_size=500):
+    """
+    Yield products chunk by chunk with their category and images loaded.
+
+    Chunks are read with keyset pagination on the primary key rather than a single
+    cursor, so memory stays flat on every backend (mysqlclient buffers whole result sets
+    client-side) and each chunk only costs two queries.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    queryset = queryset.select_related('category').prefetch_related('images').order_by('pk')
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return
+        yield from chunk
+        last_pk = chunk[-1].pk
+
+
+def product_row(product, build_url=None):
+    """Flatten a product into an export row. `build_url` turns media paths into absolute URLs."""
+    images = [image.image.url for image in product.images.all() if image.image]
+    if build_url:
+        images = [build_url(url) for url in images]
+    return {
+        'id': product.pk,
+        'sku': product.sku,
+        'name': product.name,
+        'description': product.description,
+        'price': product.price,
+        'stock_quantity': product.stock_quantity,
+        'created_date': product.created_date,
+        'updated_at': product.updated_at,
+        'category': product.category_id,
+        'category_name': product.category.name,
+        'images': images,
+    }
+
+
+class Echo:
+    """File-like object returning what is written, so csv.writer can feed a generator."""
+
+    def write(self, value):
+        return value
+
+
+def ndjson_lines(products, build_url=None):
+    for product in products:
+        yield json.dumps(product_row(product, build_url), cls=DjangoJSONEncoder) + '\n'
+
+
+def csv_lines(products, build_url=None):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for product in products:
+        row = product_row(product, build_url)
+        row['images'] = '|'.join(row['images'])
+        yield writer.writerow([row[field] for field in EXPORT_FIELDS])
+
+
+def export_lines(export_format, products, build_url=None):
+    if export_format == 'csv':
+        return csv_lines(products, build_url)
+    return ndjson_lines(products, build_url)
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Value, When
+
+# Filter parameters owned by each facet family. A family is counted without its own
+# filters so the sidebar keeps offering the alternatives to the current selection.
+FACET_PARAMS = {
+    'category': ('category', 'category_tree'),
+    'price': ('price_min', 'price_max'),
+    'availability': ('in_stock',),
+}
+
+
+def get_price_bounds():
+    return getattr(settings, 'PRODUCT_FACET_PRICE_BOUNDS', [25, 50, 100, 250, 500, 1000])
+
+
+def category_facet(queryset):
+    rows = (
+        queryset.values('category', 'category__name')
+        .annotate(count=Count('pk'))
+        .order_by('-count', 'category__name')
+    )
+    return [{'id': row['category'], 'name': row['category__name'], 'count': row['count']} for row in rows]
+
+
+def price_facet(queryset):
+    bounds = get_price_bounds()
+    bucket = Case(
+        *[When(price__lt=bound, then=Value(index)) for index, bound in enumerate(bounds)],
+        default=Value(len(bounds)),
+        output_field=IntegerField(),
+    )
+    counts = dict(
+        queryset.annotate(bucket=bucket).values('bucket')
+        .annotate(count=Count('pk')).order_by().values_list('bucket', 'count')
+    )
+    lows, highs = [0] + bounds, bounds + [None]
+    return [
+        {'min': low, 'max': high, 'count': counts.get(index, 0)}
+        for index, (low, high) in enumerate(zip(lows, highs))
+    ]
+
+
+def availability_facet(queryset):
+    in_stock = Case(When(stock_quantity__gt=0, then=Value(1)), default=Value(0), output_field=IntegerField())
+    counts = dict(
+        queryset.annotate(in_stock=in_stock).values('in_stock')
+        .annotate(count=Count('pk')).order_by().values_list('in_stock', 'count')
+    )
+    return {'in_stock': counts.get(1, 0), 'out_of_stock': counts.get(0, 0)}
+
+
+FACETS = {
+    'category': category_facet,
+    'price': price_facet,
+    'availability': availability_facet,
+}
+
+
+def compute_facets(filter_products, query_params):
+    """
+    Count every facet family with one grouped aggregate query each.
+
+    `filter_products(params)` must return the products matching `params` (filters and
+    search); it is called once per family with that family's own parameters removed.
+    """
+    facets = {}
+    for family, own_params in FACET_PARAMS.items():
+        params = query_params.copy()
+        for param in own_params:
+            params.pop(param, None)
+        facets[family] = FACETS[family](filter_products(params).order_by())
+    return facets
@@ -0,0 +1,180 @@
+import io
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import Image as PILImage, ImageOps
+
+from products.models import Image
+
+logger = logging.getLogger(__name__)
+
+# Longest side, in pixels, of each generated variant
+DEFAULT_VARIANTS = {'thumbnail': 150, 'card': 480, 'zoom': 1600}
+
+DEFAULT_FORMATS = ['webp', 'jpeg']
+
+# Pillow format name and save options per output format
+ENCODERS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+VARIANTS_DIR = 'product_images/variants'
+
+# Errors meaning the source file is missing or is not a usable image
+IMAGE_ERRORS = (OSError, ValueError, PILImage.DecompressionBombError)
+
+
+def get_variant_sizes():
+    return getattr(settings, 'PRODUCT_IMAGE_VARIANTS', DEFAULT_VARIANTS)
+
+
+def get_variant_formats():
+    return getattr(settings, 'PRODUCT_IMAGE_FORMATS', DEFAULT_FORMATS)
+
+
+def encode(image, output_format):
+    pil_format, options = ENCODERS[output_format]
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    if output_format == 'jpeg' and has_alpha:
+        # JPEG has no alpha channel: flatten on white instead of letting transparency turn black
+        background = PILImage.new('RGB', image.size, (255, 255, 255))
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def render_variants(data, sizes, formats):
+    """
+    Resize raw image bytes to every variant size and encode each one in every format.
+
+    Works on bytes only (no ORM, no storage) so it can run in a worker process.
+    Variants are produced from the largest to the smallest, each one downscaled from
+    the previous, and JPEG sources are decoded directly at a reduced scale.
+    Returns {name: {'width', 'height', 'files': {format: bytes}}}.
+    """
+    with PILImage.open(io.BytesIO(data)) as source:
+        largest = max(sizes.values())
+        source.draft(None, (largest, largest))
+        image = ImageOps.exif_transpose(source)
+        image.load()
+
+    rendered = {}
+    for name, size in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+        image.thumbnail((size, size), PILImage.LANCZOS)
+        rendered[name] = {
+            'width': image.width,
+            'height': image.height,
+            'files': {output_format: encode(image, output_format) for output_format in formats},
+        }
+    return rendered
+
+
+def read_image(image):
+    with image.image.storage.open(image.image.name, 'rb') as source:
+        return source.read()
+
+
+def variant_path(image, name, output_format):
+    # images sharing the same file share their variants
+    return f"{VARIANTS_DIR}/{image.content_hash or image.pk}/{name}.{output_format}"
+
+
+def shared_variants(image):
+    """Variants already generated for another image stored in the same file."""
+    if not image.content_hash:
+        return None
+    candidates = Image.objects.filter(image=image.image.name).exclude(pk=image.pk).values_list('variants', flat=True)
+    return next((variants for variants in candidates if variants), None)
+
+
+def store_variants(image, rendered):
+    """Write rendered variants (outside the content-addressed originals) and record their paths on the image."""
+    storage = default_storage
+    variants = {}
+    for name, variant in rendered.items():
+        entry = {'width': variant['width'], 'height': variant['height']}
+        for output_format, content in variant['files'].items():
+            path = variant_path(image, name, output_format)
+            if storage.exists(path):
+                storage.delete(path)
+            entry[output_format] = storage.save(path, ContentFile(content))
+        variants[name] = entry
+    image.variants = variants
+    # post_save touches the product and invalidates cached catalog responses
+    image.save(update_fields=['variants'])
+
+
+def generate_variants(image, render=render_variants):
+    """Generate and store the variants of one image. Returns False when the file cannot be processed."""
+    if not image.image:
+        return False
+    variants = shared_variants(image)
+    if variants:
+        image.variants = variants
+        image.save(update_fields=['variants'])
+        return True
+    try:
+        rendered = render(read_image(image), get_variant_sizes(), get_variant_formats())
+    except IMAGE_ERRORS as error:
+        logger.warning("Cannot generate variants for image %s (%s): %s", image.pk, image.image.name, error)
+        return False
+    store_variants(image, rendered)
+    return True
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    return ThreadPoolExecutor(
+        max_workers=getattr(settings, 'PRODUCT_IMAGE_WORKERS', 2), thread_name_prefix='image-variants'
+    )
+
+
+@lru_cache(maxsize=None)
+def get_render_pool():
+    return ProcessPoolExecutor(max_workers=getattr(settings, 'PRODUCT_IMAGE_WORKERS', 2))
+
+
+def render_in_process(data, sizes, formats):
+    return get_render_pool().submit(render_variants, data, sizes, formats).result()
+
+
+def process_image(image_id):
+    """Background job generating the variants of one image, run by a worker thread."""
+    render = render_in_process if getattr(settings, 'PRODUCT_IMAGE_PIPELINE', 'thread') == 'process' else render_variants
+    try:
+        image = Image.objects.filter(pk=image_id).first()
+        if image is not None:
+            generate_variants(image, render)
+    except Exception:
+        logger.exception("Variant generation failed for image %s", image_id)
+    finally:
+        # connections are per thread: release the one opened by this job
+        connections.close_all()
+
+
+def schedule_variants(image_ids):
+    """
+    Generate variants for the given images outside the request thread.
+
+    PRODUCT_IMAGE_PIPELINE selects how: 'thread' (worker threads; Pillow releases the GIL
+    while resizing and encoding), 'process' (worker threads delegating the rendering to
+    a process pool) or 'sync' (inline, for tests and scripts).
+    """
+    if getattr(settings, 'PRODUCT_IMAGE_PIPELINE', 'thread') == 'sync':
+        for image in Image.objects.filter(pk__in=image_ids):
+            generate_variants(image)
+        return
+    executor = get_executor()
+    for image_id in image_ids:
+        executor.submit(process_image, image_id)
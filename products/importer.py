@@ -0,0 +1,220 @@
+import csv
+import io
+import json
+import logging
+import time
+
+from django.db import transaction
+
+from categories.models import Category
+from products.bulk import upsert_products
+from products.changes import get_settle_delay
+from products.models import ImportCheckpoint
+
+logger = logging.getLogger(__name__)
+
+# Columns read from import files; anything else (id, images, timestamps...) is ignored
+IMPORT_FIELDS = ['sku', 'name', 'description', 'price', 'stock_quantity', 'category', 'category_name']
+
+FORMATS = ('csv', 'ndjson')
+
+
+def detect_format(filename, default='ndjson'):
+    if filename.lower().endswith('.csv'):
+        return 'csv'
+    if filename.lower().endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return default
+
+
+def read_rows(stream, file_format):
+    """
+    Parse a text stream lazily, one row at a time.
+    Malformed NDJSON lines are yielded as {'_error': ...} so they are reported, not fatal.
+    """
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            row = {'_error': f"Invalid JSON: {error}"}
+        yield row if isinstance(row, dict) else {'_error': "Each line must be a JSON object."}
+
+
+def text_stream(binary_file):
+    """Wrap an uploaded (binary) file so it can be parsed line by line without loading it."""
+    return io.TextIOWrapper(binary_file, encoding='utf-8', newline='')
+
+
+class ImportReport:
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.error_count = 0
+        self.skipped = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self, max_errors=100):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'errors': self.error_count,
+            'skipped': self.skipped,
+            'seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'error_details': self.errors[:max_errors],
+        }
+
+
+class CatalogImporter:
+    """
+    Chunked catalog import built on `upsert_products`.
+
+    Rows are matched by sku. Category names are resolved through an in-memory cache
+    (one query per chunk for unknown names) and created when missing. Each chunk is
+    validated and written in its own transaction together with the checkpoint, so a
+    resumed import starts right after the last committed chunk.
+    """
+
+    def __init__(self, chunk_size=1000, dry_run=False, create_categories=True,
+                 can_create=True, can_update=True, checkpoint=None, on_chunk=None, max_errors=1000):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.create_categories = create_categories
+        self.can_create = can_create
+        self.can_update = can_update
+        self.checkpoint = checkpoint
+        self.on_chunk = on_chunk
+        self.max_errors = max_errors
+        self.categories = {}
+
+    def run(self, rows, resume=False):
+        report = ImportReport()
+        started = time.monotonic()
+
+        start_at = 0
+        if resume and self.checkpoint:
+            start_at = ImportCheckpoint.objects.filter(name=self.checkpoint).values_list('rows_committed', flat=True).first() or 0
+
+        chunk, offset = [], 0
+        for position, row in enumerate(rows):
+            if position < start_at:
+                report.skipped += 1
+                continue
+            if not chunk:
+                offset = position
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                self.import_chunk(chunk, offset, report, started)
+                chunk = []
+        if chunk:
+            self.import_chunk(chunk, offset, report, started)
+
+        report.elapsed = time.monotonic() - started
+        return report
+
+    def import_chunk(self, rows, offset, report, started):
+        chunk_started = time.monotonic()
+        with transaction.atomic():
+            prepared = [self.prepare_row(row) for row in rows]
+            created_categories = self.resolve_categories(prepared)
+            # rows that failed to parse or resolve are reported, never written
+            valid = [index for index, (_, error) in enumerate(prepared) if not error]
+            written = upsert_products(
+                [prepared[index][0] for index in valid],
+                can_create=self.can_create,
+                can_update=self.can_update,
+                chunk_size=self.chunk_size,
+            )
+            results = [
+                {'index': index, 'status': 'error', 'id': None, 'sku': data.get('sku'),
+                 'errors': {'non_field_errors': [error]}}
+                for index, (data, error) in enumerate(prepared)
+            ]
+            for index, result in zip(valid, written):
+                results[index] = dict(result, index=index)
+            for result in results:
+                self.count(result, offset, report)
+
+            if self.dry_run:
+                transaction.set_rollback(True)
+                # categories created by this chunk are rolled back too
+                for name in created_categories:
+                    del self.categories[name]
+            elif self.checkpoint:
+                ImportCheckpoint.objects.update_or_create(
+                    name=self.checkpoint, defaults={'rows_committed': offset + len(rows)}
+                )
+
+        duration = time.monotonic() - chunk_started
+        if not self.dry_run and duration > get_settle_delay().total_seconds():
+            # rows stamped early in a chunk committing this late can be skipped by the changes feed
+            logger.warning(
+                "Import chunk at row %s took %.1fs, longer than PRODUCT_CHANGES_SETTLE_SECONDS: "
+                "lower the chunk size or raise the setting.", offset, duration,
+            )
+        report.rows += len(rows)
+        report.elapsed = time.monotonic() - started
+        if self.on_chunk:
+            self.on_chunk(report)
+
+    def count(self, result, offset, report):
+        if result['status'] == 'created':
+            report.created += 1
+        elif result['status'] == 'updated':
+            report.updated += 1
+        else:
+            report.error_count += 1
+            if len(report.errors) < self.max_errors:
+                report.errors.append({'row': offset + result['index'] + 1, 'sku': result['sku'], 'errors': result['errors']})
+
+    def prepare_row(self, row):
+        """Return [data, error]: keep known columns and drop blanks (CSV has no nulls)."""
+        if '_error' in row:
+            return [{}, row['_error']]
+        data = {key: value for key, value in row.items() if key in IMPORT_FIELDS and value not in ('', None)}
+        return [data, None]
+
+    def resolve_categories(self, prepared):
+        """
+        Replace category names by ids, loading unknown names with one query per chunk.
+        Returns the names of the categories created for this chunk.
+        """
+        names = {
+            data['category_name'] for data, _ in prepared
+            if 'category' not in data and 'category_name' in data
+        }
+        missing = names - self.categories.keys()
+        created = []
+        if missing:
+            # lowest id wins when several categories share a name
+            for pk, name in Category.objects.filter(name__in=missing).order_by('-pk').values_list('pk', 'name'):
+                self.categories[name] = pk
+            if self.create_categories:
+                for name in sorted(missing - self.categories.keys()):
+                    self.categories[name] = Category.objects.create(name=name).pk
+                    created.append(name)
+
+        for item in prepared:
+            data = item[0]
+            name = data.pop('category_name', None)
+            if 'category' in data or name is None:
+                continue
+            if name in self.categories:
+                data['category'] = self.categories[name]
+            else:
+                item[1] = f"Unknown category '{name}'."
+        return created
@@ -0,0 +1,144 @@
+import random
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+
+from categories.models import Category
+from products.models import Product
+from products.productAPI.views import ProductViewSet
+from products.search import get_search_backend
+
+SKU_PREFIX = 'BENCH-'
+CATEGORY_PREFIX = 'Benchmark '
+WORDS = ['product', 'phone', 'laptop', 'cable', 'chair', 'lamp', 'shoe', 'bag', 'watch', 'camera']
+
+# The example queries documented on ProductViewSet, plus the main filter paths.
+# {category} is replaced by the first benchmark category.
+QUERIES = [
+    '/api/products/?category={category}',
+    '/api/products/?search=product&category={category}&page=2&page_size=10',
+    '/api/products/?category={category}&price_min=10&price_max=100&in_stock=true&search=product&page=2&page_size=10',
+    '/api/products/?in_stock=true&price_min=10&price_max=100',
+    '/api/products/?cursor=&ordering=name',
+    '/api/products/facets/?category={category}',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the product list queries: seeds a reproducible catalog (1M products by default) "
+        "and reports p50/p99 latencies, optionally without the product indexes for comparison. "
+        "Run it against a dedicated database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1_000_000, help="Number of benchmark products to seed.")
+        parser.add_argument('--categories', type=int, default=50, help="Number of benchmark categories to seed.")
+        parser.add_argument('--repeat', type=int, default=50, help="Measured runs per query.")
+        parser.add_argument('--compare', action='store_true', help="Also measure with the Product indexes dropped.")
+        parser.add_argument('--cleanup', action='store_true', help="Delete the benchmark data and exit.")
+        parser.add_argument('--seed', type=int, default=42, help="Random seed of the generated catalog.")
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            deleted, _ = Category.objects.filter(name__startswith=CATEGORY_PREFIX).delete()
+            self.stdout.write(f"Deleted {deleted} benchmark rows.")
+            return
+        if options['repeat'] < 1:
+            raise CommandError("--repeat must be positive.")
+
+        categories = self.seed(options['products'], options['categories'], options['seed'])
+        queries = [query.format(category=categories[0]) for query in QUERIES]
+
+        results = {}
+        if options['compare']:
+            with self.indexes_dropped():
+                results['without indexes'] = self.measure(queries, options['repeat'])
+        results['with indexes'] = self.measure(queries, options['repeat'])
+        self.report(queries, results)
+
+    def seed(self, count, category_count, seed):
+        """Create the missing benchmark rows (idempotent, so reruns reuse the same catalog)."""
+        for number in range(Category.objects.filter(name__startswith=CATEGORY_PREFIX).count(), category_count):
+            Category.objects.create(name=f"{CATEGORY_PREFIX}{number}")
+        categories = list(
+            Category.objects.filter(name__startswith=CATEGORY_PREFIX).order_by('pk').values_list('pk', flat=True)
+        )
+
+        existing = Product.objects.filter(sku__startswith=SKU_PREFIX).count()
+        if existing >= count:
+            return categories
+        rng = random.Random(seed)
+        backend = get_search_backend()
+        started = time.monotonic()
+        for start in range(existing, count, 5000):
+            products = []
+            for number in range(start, min(start + 5000, count)):
+                products.append(Product(
+                    sku=f"{SKU_PREFIX}{number}",
+                    name=f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {number}",
+                    description=' '.join(rng.choice(WORDS) for _ in range(12)),
+                    price=round(rng.uniform(1, 2000), 2),
+                    stock_quantity=0 if rng.random() < 0.2 else rng.randint(1, 500),
+                    category_id=rng.choice(categories),
+                ))
+            # bulk writes skip the signals, so index for search explicitly
+            with transaction.atomic():
+                Product.objects.bulk_create(products)
+                backend.index_products(
+                    Product.objects.filter(sku__in=[p.sku for p in products]).select_related('category')
+                )
+            self.stdout.write(f"Seeded {min(start + 5000, count)} / {count} products ({time.monotonic() - started:.0f}s)")
+        return categories
+
+    @contextmanager
+    def indexes_dropped(self):
+        with connection.schema_editor() as editor:
+            for index in Product._meta.indexes:
+                editor.remove_index(Product, index)
+        self.stdout.write("Product indexes dropped.")
+        try:
+            yield
+        finally:
+            with connection.schema_editor() as editor:
+                for index in Product._meta.indexes:
+                    editor.add_index(Product, index)
+            self.stdout.write("Product indexes restored.")
+
+    def measure(self, queries, repeat):
+        """Run every query through ProductViewSet (cache disabled) and return its latencies in ms."""
+        factory = APIRequestFactory()
+        list_view = ProductViewSet.as_view({'get': 'list'})
+        facets_view = ProductViewSet.as_view({'get': 'facets'})
+        timings = {}
+        dummy_cache = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(CACHES=dummy_cache):
+            for query in queries:
+                view = facets_view if '/facets/' in query else list_view
+                samples = []
+                for run in range(repeat + 3):
+                    started = time.perf_counter()
+                    response = view(factory.get(query, HTTP_HOST='localhost'))
+                    response.render()
+                    if run >= 3:  # warm-up runs are not measured
+                        samples.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    # e.g. page 2 of a small catalog: still timed, but not comparable
+                    self.stderr.write(f"{query} answered {response.status_code}")
+                timings[query] = samples
+        return timings
+
+    def report(self, queries, results):
+        for query in queries:
+            self.stdout.write(query)
+            for label, timings in results.items():
+                samples = sorted(timings[query])
+                p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+                self.stdout.write(
+                    f"  {label:<16} p50 {statistics.median(samples):8.2f} ms   p99 {p99:8.2f} ms"
+                )
@@ -0,0 +1,70 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from products.models import Product
+from products.productAPI.serializers import ProductSerializer
+from products.representation import ProductReader
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the serialization throughput (rows/s, queries included) of ProductSerializer "
+        "and the compiled ProductReader on the first products of the catalog. "
+        "Seed a catalog first, e.g. with benchmark_product_queries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help="Products rendered per run (one list page).")
+        parser.add_argument('--repeat', type=int, default=50, help="Measured runs per serializer.")
+        parser.add_argument('--query', default='', help="Query string of the simulated request, e.g. 'expand=category'.")
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1 or options['repeat'] < 1:
+            raise CommandError("--rows and --repeat must be positive.")
+        request = Request(APIRequestFactory().get(f"/api/products/?{options['query']}", HTTP_HOST='localhost'))
+        context = {'request': request}
+        ids = list(Product.objects.order_by('pk').values_list('pk', flat=True)[:options['rows']])
+        if not ids:
+            raise CommandError("No products to serialize.")
+        queryset = Product.objects.filter(pk__in=ids).order_by('pk')
+
+        fields = ProductSerializer(context=context).fields
+        if 'rating' in fields:
+            raise CommandError("The rating expansion needs the view annotations; benchmark it through the API.")
+        reader = ProductReader.compile(ProductSerializer(context=context))
+        if reader is None:
+            raise CommandError("ProductReader does not support this serializer shape.")
+        # the relations ProductViewSet loads for the serializer
+        related = [name for name in ('images', 'discounts') if name in fields]
+
+        def serialize():
+            products = queryset.select_related('category').prefetch_related(*related)
+            return ProductSerializer(products, many=True, context=context).data
+
+        def render():
+            return reader.render(reader.values(queryset))
+
+        if [dict(row) for row in serialize()] != render():
+            self.stderr.write("Warning: ProductReader output differs from ProductSerializer.")
+
+        results = {'ProductSerializer': self.measure(serialize, options['repeat']),
+                   'ProductReader': self.measure(render, options['repeat'])}
+        rows = len(ids)
+        for label, samples in results.items():
+            median = statistics.median(samples)
+            self.stdout.write(f"{label:<18} {rows / median:12,.0f} rows/s   p50 {median * 1000:8.2f} ms per {rows} rows")
+        speedup = statistics.median(results['ProductSerializer']) / statistics.median(results['ProductReader'])
+        self.stdout.write(f"Speedup: {speedup:.1f}x")
+
+    def measure(self, function, repeat):
+        function()  # warm-up
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            samples.append(time.perf_counter() - started)
+        return samples
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.recommendations import RecommendationError, build_recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold the orders created since the last run into the product co-purchase matrix "
+        "and re-rank the \"frequently bought together\" products they touched (run periodically, "
+        "e.g. hourly from cron). Incremental runs are append-only: also run --full periodically, "
+        "e.g. nightly, to drop deleted or changed orders."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Rebuild the matrix from every order.")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Orders folded per transaction.")
+        parser.add_argument('--top-k', type=int, default=None, help="Recommendations kept per product.")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1 or (options['top_k'] is not None and options['top_k'] < 1):
+            raise CommandError("--chunk-size and --top-k must be positive.")
+        try:
+            read, ranked = build_recommendations(
+                full=options['full'], chunk_size=options['chunk_size'], top_k=options['top_k']
+            )
+        except RecommendationError as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(f"{read} orders folded, {ranked} products re-ranked."))
@@ -0,0 +1,81 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.models import Image, Product
+from products.storage import content_hash_from_name, content_path, file_hash
+from ECommerce.response_cache import bump_generation
+
+
+class Command(BaseCommand):
+    help = "Move product images stored before content addressing to their hashed path, sharing duplicate files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=200, help="Number of images loaded per batch.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be moved and freed.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        dry_run = options['dry_run']
+        queryset = Image.objects.exclude(image='').only('pk', 'image', 'product_id').order_by('pk')
+        storage = Image._meta.get_field('image').storage
+        moved = missing = sources = freed = 0
+        # hashed names written so far: one per distinct content, the only state kept across batches
+        stored = set()
+        last_pk = 0
+        while True:
+            # Keyset batches rather than one open cursor: the rows are rewritten as we go
+            chunk = list(queryset.filter(pk__gt=last_pk)[:options['chunk_size']])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            # old name -> new name, so a file referenced by several rows of the batch is hashed once
+            hashes = {}
+            changed, product_ids = [], set()
+            for image in chunk:
+                name = image.image.name
+                if content_hash_from_name(name):
+                    continue
+                if name not in hashes:
+                    if not storage.exists(name):
+                        missing += 1
+                        self.stderr.write(f"Image {image.pk}: file {name} is missing.")
+                        continue
+                    with storage.open(name, 'rb') as source:
+                        if dry_run:
+                            hashes[name] = content_path(file_hash(source), os.path.splitext(name)[1])
+                        else:
+                            # writes nothing when the same bytes are already stored
+                            hashes[name] = storage.save(name, source)
+                image.image.name = hashes[name]
+                changed.append(image)
+                product_ids.add(image.product_id)
+            moved += len(changed)
+            stored.update(hashes.values())
+            # An old file can go once the rows of later batches no longer reference it
+            later = set(queryset.filter(pk__gt=last_pk, image__in=list(hashes)).values_list('image', flat=True))
+            released = [name for name in hashes if name not in later]
+            sources += len(released)
+
+            if changed and not dry_run:
+                Image.objects.bulk_update(changed, ['image'])
+                for name in released:
+                    if storage.exists(name):
+                        freed += storage.size(name)
+                        storage.delete(name)
+                # image URLs changed without any save
+                Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now())
+            self.stdout.write(f"Processed images up to id {last_pk}...")
+
+        if moved and not dry_run:
+            bump_generation(Image, Product)
+
+        elapsed = time.monotonic() - started
+        distinct = len(stored)
+        prefix = "Dry run: " if dry_run else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{moved} images moved to {distinct} distinct files in {elapsed:.1f}s "
+            f"({sources - distinct} duplicate files, {freed} bytes freed, {missing} missing)."
+        ))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.export import CONTENT_TYPES, export_lines, iter_products
+
+
+class Command(BaseCommand):
+    help = "Export the whole product catalog as NDJSON or CSV with constant memory usage."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(CONTENT_TYPES), default='ndjson', help="Output format.")
+        parser.add_argument('--output', help="Destination file (defaults to stdout).")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Number of products read per query.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        lines = export_lines(options['format'], iter_products(chunk_size=options['chunk_size']))
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                count = self.write_lines(lines, output.write)
+        else:
+            count = self.write_lines(lines, lambda line: self.stdout.write(line, ending=''))
+
+        if options['format'] == 'csv':
+            count -= 1  # header line
+        elapsed = time.monotonic() - started
+        self.stderr.write(f"Exported {count} products in {elapsed:.1f}s.")
+
+    def write_lines(self, lines, write):
+        count = 0
+        for line in lines:
+            write(line)
+            count += 1
+        return count
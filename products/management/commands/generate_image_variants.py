@@ -0,0 +1,68 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from products.images import (
+    IMAGE_ERRORS, get_variant_formats, get_variant_sizes, read_image, render_variants, store_variants,
+)
+from products.models import Image
+
+
+class Command(BaseCommand):
+    help = "Generate the resized variants of existing product images (backfill)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate images that already have variants.")
+        parser.add_argument('--chunk-size', type=int, default=100, help="Number of images loaded per batch.")
+        parser.add_argument('--workers', type=int, default=2, help="Rendering processes (0 renders in this process).")
+
+    def handle(self, *args, **options):
+        sizes, formats = get_variant_sizes(), get_variant_formats()
+        started = time.monotonic()
+        pool = ProcessPoolExecutor(options['workers']) if options['workers'] > 0 else None
+        queryset = Image.objects.exclude(image='').order_by('pk')
+        generated = skipped = failed = 0
+        last_pk = 0
+        try:
+            while True:
+                # Keyset iteration keeps memory flat regardless of the number of images
+                chunk = list(queryset.filter(pk__gt=last_pk)[:options['chunk_size']])
+                if not chunk:
+                    break
+                last_pk = chunk[-1].pk
+
+                jobs = []
+                for image in chunk:
+                    if image.variants and not options['force']:
+                        skipped += 1
+                        continue
+                    try:
+                        data = read_image(image)
+                    except IMAGE_ERRORS as error:
+                        failed += 1
+                        self.stderr.write(f"Image {image.pk} ({image.image.name}): {error}")
+                        continue
+                    if pool:
+                        jobs.append((image, pool.submit(render_variants, data, sizes, formats)))
+                    else:
+                        jobs.append((image, data))
+
+                for image, job in jobs:
+                    try:
+                        rendered = job.result() if pool else render_variants(job, sizes, formats)
+                    except IMAGE_ERRORS as error:
+                        failed += 1
+                        self.stderr.write(f"Image {image.pk} ({image.image.name}): {error}")
+                        continue
+                    store_variants(image, rendered)
+                    generated += 1
+                self.stdout.write(f"Processed {generated + skipped + failed} images...")
+        finally:
+            if pool:
+                pool.shutdown()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Variants generated for {generated} images in {elapsed:.1f}s ({skipped} skipped, {failed} failed)."
+        ))
@@ -0,0 +1,49 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importer import FORMATS, CatalogImporter, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = "Import products from a CSV or NDJSON file in chunks, matching existing products by sku."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or NDJSON file to import.")
+        parser.add_argument('--format', choices=FORMATS, help="Input format (guessed from the file extension by default).")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Number of rows written per transaction.")
+        parser.add_argument('--dry-run', action='store_true', help="Validate every row and roll back all writes.")
+        parser.add_argument('--resume', action='store_true', help="Skip the rows committed by a previous run.")
+        parser.add_argument('--checkpoint', help="Checkpoint name used by --resume (defaults to the file name).")
+        parser.add_argument('--no-create-categories', action='store_true', help="Reject rows whose category name is unknown.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f"File not found: {path}")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive.")
+
+        file_format = options['format'] or detect_format(path)
+        importer = CatalogImporter(
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+            create_categories=not options['no_create_categories'],
+            checkpoint=None if options['dry_run'] else options['checkpoint'] or os.path.basename(path),
+            on_chunk=self.report_chunk,
+        )
+
+        with open(path, newline='', encoding='utf-8') as stream:
+            report = importer.run(read_rows(stream, file_format), resume=options['resume'])
+
+        for error in report.errors[:20]:
+            self.stderr.write(f"Row {error['row']} ({error['sku']}): {error['errors']}")
+        prefix = "Dry run: " if options['dry_run'] else ""
+        self.stdout.write(
+            f"{prefix}{report.rows} rows in {report.elapsed:.1f}s ({report.rows_per_second:.0f} rows/s): "
+            f"{report.created} created, {report.updated} updated, {report.error_count} errors, "
+            f"{report.skipped} skipped."
+        )
+
+    def report_chunk(self, report):
+        self.stderr.write(f"{report.rows} rows processed ({report.rows_per_second:.0f} rows/s)")
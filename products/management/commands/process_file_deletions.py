@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.cleanup import collect_all
+from products.models import PendingFileDeletion
+
+
+class Command(BaseCommand):
+    help = "Delete the files queued by image deletions, in batches (retrying failed ones with a backoff)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Number of files handled per transaction.")
+        parser.add_argument('--retry-failed', action='store_true', help="Reset the files that exhausted their attempts.")
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            reset = PendingFileDeletion.objects.filter(attempts__gt=0).update(attempts=0, next_attempt_at=timezone.now())
+            self.stdout.write(f"{reset} failed files queued again.")
+
+        deleted, failed = collect_all(batch_size=options['batch_size'])
+        remaining = PendingFileDeletion.objects.count()
+        self.stdout.write(self.style.SUCCESS(
+            f"{deleted} files deleted, {failed} failures, {remaining} files still queued."
+        ))
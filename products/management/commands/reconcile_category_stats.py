@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from products.category_stats import reconcile_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the product count, in-stock count and price range of every category "
+        "from the products and repair the stats that drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Categories recomputed per transaction.")
+
+    def handle(self, *args, **options):
+        drifted = reconcile_stats(batch_size=max(options['batch_size'], 1))
+        self.stdout.write(self.style.SUCCESS(f"{drifted} categories repaired."))
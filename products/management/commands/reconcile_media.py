@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.cleanup import collect_all, enqueue_deletions, iter_media_files, referenced_paths
+from products.models import PendingFileDeletion
+
+
+class Command(BaseCommand):
+    help = "Find product image files no Image row references any more and queue them for deletion."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Number of files checked per query batch.")
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help="Ignore files modified less than this many seconds ago (uploads in progress).")
+        parser.add_argument('--dry-run', action='store_true', help="Only report the orphaned files.")
+        parser.add_argument('--delete', action='store_true', help="Run the cleanup right after queueing.")
+
+    def handle(self, *args, **options):
+        started = time.time()
+        cutoff = started - options['min_age']
+        scanned = orphans = orphan_bytes = 0
+        batch = {}
+
+        def flush():
+            nonlocal orphans, orphan_bytes
+            used = referenced_paths(batch)
+            # files already queued are left to the cleanup
+            used.update(PendingFileDeletion.objects.filter(path__in=list(batch)).values_list('path', flat=True))
+            found = [path for path in batch if path not in used]
+            orphans += len(found)
+            orphan_bytes += sum(batch[path] for path in found)
+            if options['dry_run']:
+                for path in found:
+                    self.stdout.write(path)
+            else:
+                enqueue_deletions(found)
+            batch.clear()
+
+        # The tree is walked lazily and checked against the database batch by batch
+        for path, size, modified in iter_media_files():
+            scanned += 1
+            if modified > cutoff:
+                continue
+            batch[path] = size
+            if len(batch) >= options['batch_size']:
+                flush()
+        if batch:
+            flush()
+
+        verb = "found" if options['dry_run'] else "queued"
+        self.stdout.write(self.style.SUCCESS(
+            f"{scanned} files scanned, {orphans} orphaned files {verb} ({orphan_bytes} bytes) "
+            f"in {time.time() - started:.1f}s."
+        ))
+        if options['delete'] and not options['dry_run']:
+            deleted, failed = collect_all()
+            self.stdout.write(f"{deleted} files deleted, {failed} failures.")
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:41
+
+import products.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='image',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, max_length=255, storage=products.storage.get_image_storage, upload_to='product_images/'),
+        ),
+    ]
@@ -1,22 +1,66 @@
+from django.core.files.storage import default_storage
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 from django.core.validators import MinValueValidator
 from categories.models import Category
+from products.storage import content_hash_from_name, get_image_storage
 
 
 class Product(models.Model):
     name = models.CharField(max_length=255)
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)  # External (ERP) reference
     description = models.TextField()
     price = models.DecimalField(max_digits=11, decimal_places=2, validators=[MinValueValidator(0.01)])
     stock_quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     created_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="products")
 
+    class Meta:
+        indexes = [
+            # ?category=<id>&price_min=..&price_max=.. (and the category facet)
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+            # ?in_stock=true with a price range; partial indexes are skipped on MySQL
+            models.Index(fields=['price'], condition=Q(stock_quantity__gt=0), name='product_in_stock_price_idx'),
+            # default keyset ordering (created_date, id)
+            models.Index(fields=['created_date', 'id'], name='product_created_id_idx'),
+            # name prefix lookups and ?ordering=name
+            models.Index(fields=['name', 'id'], name='product_name_id_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remembered so a save only applies its difference to the category stats
+        if STATS_FIELDS.issubset(field_names):
+            instance._stats_state = instance.stats_state()
+        return instance
+
+    def stats_state(self):
+        """The part of the product its category stats depend on: (category id, price, in stock)."""
+        return self.category_id, self.price, self.stock_quantity > 0
+
+# Columns CategoryStats depends on (see products.category_stats)
+STATS_FIELDS = {'category_id', 'price', 'stock_quantity'}
+
+def variant_urls(variants):
+    """Turn the file paths of an Image.variants mapping into URLs."""
+    storage = default_storage
+    return {
+        name: {key: storage.url(value) if isinstance(value, str) else value for key, value in variant.items()}
+        for name, variant in variants.items()
+    }
+
 class Image(models.Model):
-    image = models.ImageField(upload_to='product_images/', blank=True)
+    # Stored once per distinct content under product_images/ab/cd/<sha256>.<ext>
+    image = models.ImageField(upload_to='product_images/', storage=get_image_storage, max_length=255, db_index=True, blank=True)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="images")
+    # Resized copies generated by products.images: {name: {'width', 'height', <format>: path}}
+    variants = models.JSONField(default=dict, blank=True)
 
     class Meta:
         permissions = [
@@ -24,4 +68,122 @@ class Image(models.Model):
         ]
 
     def __str__(self):
-        return f"Image for {self.product.name}"
\ No newline at end of file
+        return f"Image for {self.product.name}"
+
+    @property
+    def content_hash(self):
+        """SHA-256 of the file, or None for files stored before content addressing."""
+        return content_hash_from_name(self.image.name)
+
+    def get_variant_urls(self):
+        """Variants with their file paths turned into URLs (empty until they are generated)."""
+        return variant_urls(self.variants)
+
+class ProductSearchTerm(models.Model):
+    """
+    Inverted index entry used by the product search engine.
+    One row per (term, product) pair, weighted by where the term appears.
+    """
+    term = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="search_terms")
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'product'], name='unique_search_term_per_product')
+        ]
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id}"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Progress of a catalog import, committed together with each chunk
+    so an interrupted import can resume after the last committed row.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    rows_committed = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.rows_committed} rows"
+
+
+class PendingFileDeletion(models.Model):
+    """
+    Stored file waiting to be removed by the background cleanup (see products/cleanup.py).
+    Rows are queued in the transaction deleting their Image, so a rolled back delete keeps its files.
+    """
+    path = models.CharField(max_length=255, unique=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.path
+
+
+class ProductTombstone(models.Model):
+    """
+    Deleted product, recorded by a post_delete signal so the changes feed
+    (GET /api/products/changes/) can tell syncing clients to drop it.
+    """
+    product_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # keyset walk of the changes feed
+            models.Index(fields=['deleted_at', 'id'], name='product_tombstone_walk_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} deleted at {self.deleted_at}"
+
+
+class ProductCoPurchase(models.Model):
+    """
+    Sparse co-purchase matrix built from order history (see products/recommendations.py):
+    number of baskets (orders of one user in one time window) containing both products.
+    Each pair is stored in both directions.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related'], name='unique_copurchase_pair')
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.related_id}: {self.count}"
+
+
+class ProductRecommendation(models.Model):
+    """Top-K products most often bought together with a product, served by GET /api/products/<id>/related/."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    score = models.PositiveIntegerField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            # also the index of the (product, rank) lookup
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_recommendation_rank')
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} #{self.rank}: {self.related_id}"
+
+
+class RecommendationCheckpoint(models.Model):
+    """Last order folded into the co-purchase matrix, so the next run only reads newer orders."""
+    last_order_id = models.BigIntegerField(default=0)
+    window_days = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Orders up to {self.last_order_id} ({self.window_days} day baskets)"
@@ -1,22 +1,62 @@
 from rest_framework import serializers
 from products.models import Product,Image
 from django.core.validators import MinValueValidator
+from ECommerce.fieldsets import FieldsetSerializerMixin
+
+def absolute_variant_urls(variants, request):
+    """Make the URLs returned by Image.get_variant_urls() absolute for `request`."""
+    if request is not None:
+        for variant in variants.values():
+            for key, value in variant.items():
+                if isinstance(value, str):
+                    variant[key] = request.build_absolute_uri(value)
+    return variants
 
 class ProductImageSerializer(serializers.ModelSerializer):
+    variants = serializers.SerializerMethodField() # Resized copies, empty while they are being generated
+
     class Meta:
         model = Image
-        fields = ['id','image']
+        fields = ['id','image','variants']
         read_only_fields = ['id']
 
-class ProductSerializer(serializers.ModelSerializer):
+    def get_variants(self, obj):
+        return absolute_variant_urls(obj.get_variant_urls(), self.context.get('request'))
+
+class ProductSummarySerializer(serializers.ModelSerializer):
+    """Compact product representation used when other resources expand their product."""
+    class Meta:
+        model = Product
+        fields = ['id','name','price']
+
+def rating_summary(average, count):
+    return {'average': round(average, 2) if average is not None else None, 'count': count}
+
+class RatingSummaryField(serializers.Field):
+    """Average rating and review count, read from the `rating_average` / `rating_count` annotations."""
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, obj):
+        return rating_summary(obj.rating_average, obj.rating_count)
+
+class ProductSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Product resource.
     Handles validation and nested relationships with images.
+    Supports `?fields=` and `?expand=category,images,discounts,rating` on reads.
     """
     images = ProductImageSerializer(many=True, read_only = True) # Nested serializer for related images
     class Meta:
         model = Product
-        fields = ['id','name','description','price','stock_quantity','created_date','category', 'images']
+        fields = ['id','sku','name','description','price','stock_quantity','created_date','category', 'images']
+        expandable_fields = {
+            'category': ('categories.categoriesAPI.serializers.ProductCategorySerializer', {}),
+            'images': (ProductImageSerializer, {'many': True}),
+            'discounts': ('discounts.discountsAPI.serializers.DiscountSummarySerializer', {'many': True}),
+            'rating': (RatingSummaryField, {}),
+        }
         #validations 
         name = serializers.CharField(required=True, error_messages={'required': 'Name is required.'})
         price = serializers.DecimalField(
@@ -2,14 +2,33 @@ from rest_framework import viewsets, status, filters
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
-from products.models import Product, Image
-from products.productAPI.serializers import ProductSerializer
+from products.models import Product, Image, ProductRecommendation
+from categories.models import Category, CategoryStats
+from products.productAPI.serializers import ProductSerializer, ProductSummarySerializer
 from rest_framework import permissions
 from rest_framework.permissions import IsAuthenticated
-from django.shortcuts import get_object_or_404
+from rest_framework.generics import get_object_or_404
 from .pagination import CustomPagination
 from django_filters.rest_framework import FilterSet, NumberFilter, BooleanFilter
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
+from products.search import get_search_backend
+from products.facets import compute_facets
+from products.bulk import upsert_products
+from products.export import CONTENT_TYPES, export_lines, iter_products
+from products.importer import CatalogImporter, detect_format, read_rows, text_stream
+from products.uploads import BoundedTemporaryFileUploadHandler, save_product_images, upload_error, validate_image_header
+from django.http import StreamingHttpResponse
+from django.conf import settings
+from ECommerce.query_budget import QueryBudgetMixin
+from ECommerce.response_cache import CachedResponseMixin
+from ECommerce.conditional import ConditionalGetMixin
+from ECommerce.fieldsets import FieldsetViewMixin
+from ECommerce.compiled_read import CompiledReadMixin
+from products.representation import ProductReader
+from products.changes import changes_since, decode_watermark, encode_watermark
+from django.db.models import Avg, Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from reviews.models import Review
 
 
 class ModelPermissions(permissions.DjangoModelPermissions):
@@ -22,13 +41,19 @@ class ModelPermissions(permissions.DjangoModelPermissions):
         user = request.user
         if  request.method == 'GET':
             #all users can view products even if they are not authenticated
-                    return True
+            #except for the full catalog export, reserved to users allowed to view products
+            if getattr(view, 'action', None) == 'export':
+                return bool(user and user.is_authenticated and user.has_perm('products.view_product'))
+            return True
         elif user and user.is_authenticated: 
             #only SU and authenticated users having the right permissions can add, update and delete products
             if user.is_superuser:
                 return True
             
             match request.method :
+                case 'POST' if getattr(view, 'action', None) in ('bulk_upsert', 'import_catalog'):
+                    # rows are checked individually: creates need add, updates need change
+                    return user.has_perm('products.add_product') or user.has_perm('products.change_product')
                 case 'POST':
                     return user.has_perm('products.add_product')
                 case 'PUT' | 'PATCH':
@@ -42,32 +67,261 @@ class ProductFilter(FilterSet):
     FilterSet for filtering products based on category, price range, and stock availability.
     """
     category = NumberFilter(field_name='category', lookup_expr='exact')
+    category_tree = NumberFilter(method='filter_category_tree', label='Category or any of its subcategories')
     price_min = NumberFilter(field_name='price', lookup_expr='gte')
     price_max = NumberFilter(field_name='price', lookup_expr='lte')
     in_stock = BooleanFilter(field_name='stock_quantity', lookup_expr='gt', label='In stock')
 
     class Meta:
         model = Product
-        fields = ['category', 'price_min', 'price_max', 'in_stock']
+        fields = ['category', 'category_tree', 'price_min', 'price_max', 'in_stock']
 
-class ProductViewSet(viewsets.ModelViewSet):
+    def get_category_path(self, pk):
+        # memoized on the request: the list and its conditional GET validators filter the same way
+        paths = getattr(self.request, '_category_paths', None) if self.request is not None else None
+        if paths is None:
+            paths = {}
+            if self.request is not None:
+                self.request._category_paths = paths
+        if pk not in paths:
+            paths[pk] = Category.objects.filter(pk=pk).values_list('path', flat=True).first()
+        return paths[pk]
+
+    def filter_category_tree(self, queryset, name, value):
+        # one primary key lookup for the root's path, then a single indexed prefix range on Category.path
+        path = self.get_category_path(value)
+        if path is None:
+            return queryset.none()
+        return queryset.filter(category__in=Category.objects.filter(path__startswith=path).values('pk'))
+
+
+def filter_catalog(params, request=None):
+    """The products matching `params`, or a 400 for invalid filter values (as DjangoFilterBackend answers)."""
+    filterset = ProductFilter(params, queryset=Product.objects.all(), request=request)
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    return filterset.qs
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Full-text search over name, description and category name.
+    Delegates to the backend configured by PRODUCT_SEARCH_BACKEND and orders results by relevance.
+    """
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        return get_search_backend().search(queryset, query)
+
+def rating_annotations():
+    """Average rating and review count as correlated subqueries (no join, so search ordering is unaffected)."""
+    reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    return {
+        'rating_average': Subquery(reviews.annotate(value=Avg('rating')).values('value')),
+        'rating_count': Coalesce(
+            Subquery(reviews.annotate(value=Count('pk')).values('value'), output_field=IntegerField()), 0
+        ),
+    }
+
+class ProductViewSet(FieldsetViewMixin, ConditionalGetMixin, CachedResponseMixin, QueryBudgetMixin,
+                     CompiledReadMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing Product resources.
     Provides CRUD operations, filtering, searching, and pagination functionality.
+    Reads accept `?fields=` and `?expand=`; relations are only loaded when rendered.
+    list/retrieve render through ProductReader (same output as ProductSerializer, built from `.values()` rows).
     """
-    queryset = Product.objects.all()
+    queryset = Product.objects.order_by('pk')
     serializer_class = ProductSerializer
     permission_classes = [ModelPermissions]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter]
     filterset_class = ProductFilter
-    search_fields = ['name'] # Allows partial match on the `name` field
+    search_fields = ['name', 'description', 'category__name'] # Indexed fields, ranked by relevance
     pagination_class = CustomPagination  
+    # auth + validators + count + page + images prefetch (+ the root path of ?category_tree=)
+    query_budget = {'list': 6, 'retrieve': 4, 'facets': 5, 'changes': 5, 'related': 3}
+    # anonymous GET responses are cached until one of these models changes
+    cache_models = (Product, Image, Category, CategoryStats)
+    cached_actions = ('list', 'retrieve', 'facets')
+    # facet counts are the same for every user
+    shared_cached_actions = ('facets',)
+    fieldset_select_related = {'category': 'category__stats'}
+    fieldset_prefetch_related = {'images': 'images', 'discounts': 'discounts'}
+    fieldset_annotations = {'rating': rating_annotations}
+    # keyset pagination orders by these columns
+    fieldset_always_load = ('created_date', 'name')
+    # expansions built from models whose changes do not touch the product (no updated_at bump, no generation)
+    untracked_expansions = {'discounts', 'rating'}
+    # expansions whose changes do not touch the product's updated_at, so its validators cannot see them
+    unvalidated_expansions = {'category'}
+
+    def get_reader(self):
+        return ProductReader.compile(self.get_serializer(), always_load=self.fieldset_always_load)
+
+    def reads_untracked_data(self):
+        return bool(self.get_expanded_fields() & self.untracked_expansions)
+
+    def should_cache_response(self, request):
+        return super().should_cache_response(request) and not self.reads_untracked_data()
+
+    def should_validate_response(self, request):
+        return (
+            super().should_validate_response(request)
+            and not self.reads_untracked_data()
+            and not self.get_expanded_fields() & self.unvalidated_expansions
+        )
+
+    def initialize_request(self, request, *args, **kwargs):
+        request = super().initialize_request(request, *args, **kwargs)
+        if self.action == 'upload_images':
+            # must be set before the body is parsed: stream files to disk within the upload limits
+            request._request.upload_handlers = [BoundedTemporaryFileUploadHandler(request._request)]
+        return request
 
     #exemple :  GET /api/products/?category=1
+    #exemple :  GET /api/products/?category_tree=1  (category 1 and all its subcategories)
     #exemple :  GET /api/products/?search=product&category=1&page=2&page_size=10
     #/api/products/?category=1&price_min=10&price_max=100&in_stock=true&search=product&page=2&page_size=10
    
    
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_upsert(self, request):
+        """
+        Creates or updates many products in one request (ERP synchronization).
+        Expects a JSON array of rows keyed by `id` or `sku` and returns one result per row.
+        """
+        rows = request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({"detail": "Expected a non-empty list of products."}, status=status.HTTP_400_BAD_REQUEST)
+        max_rows = getattr(settings, 'PRODUCT_BULK_MAX_ROWS', 10000)
+        if len(rows) > max_rows:
+            return Response({"detail": f"At most {max_rows} products per request."}, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        results = upsert_products(
+            rows,
+            can_create=user.has_perm('products.add_product'),
+            can_update=user.has_perm('products.change_product'),
+        )
+        counts = {'created': 0, 'updated': 0, 'error': 0}
+        for result in results:
+            counts[result['status']] += 1
+        data = {'created': counts['created'], 'updated': counts['updated'], 'errors': counts['error'], 'results': results}
+        # 207 tells the client some rows were rejected while the others were written
+        response_status = status.HTTP_207_MULTI_STATUS if counts['error'] else status.HTTP_200_OK
+        return Response(data, status=response_status)
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_catalog(self, request):
+        """
+        Imports a CSV or NDJSON catalog file (multipart field `file`) in chunks, matching products by sku.
+        exemple : POST /api/products/import/?type=csv&dry_run=true
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"detail": "No file provided."}, status=status.HTTP_400_BAD_REQUEST)
+        import_format = request.query_params.get('type') or detect_format(upload.name)
+        if import_format not in CONTENT_TYPES:
+            return Response({"detail": "type must be 'ndjson' or 'csv'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        importer = CatalogImporter(
+            chunk_size=getattr(settings, 'PRODUCT_BULK_CHUNK_SIZE', 500),
+            dry_run=request.query_params.get('dry_run', '').lower() in ('1', 'true', 'yes'),
+            can_create=user.has_perm('products.add_product'),
+            can_update=user.has_perm('products.change_product'),
+        )
+        report = importer.run(read_rows(text_stream(upload.file), import_format))
+        response_status = status.HTTP_207_MULTI_STATUS if report.error_count else status.HTTP_200_OK
+        return Response(report.as_dict(), status=response_status)
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """
+        Products frequently bought together with this one, best first (precomputed by build_recommendations).
+        exemple : GET /api/products/1/related/
+        """
+        # a malformed or unknown id is a 404 before the matrix is read
+        product_id = get_object_or_404(Product.objects.values_list('pk', flat=True), pk=pk)
+        recommendations = list(
+            ProductRecommendation.objects.filter(product_id=product_id).order_by('rank').select_related('related')
+        )
+        context = self.get_serializer_context()
+        return Response([
+            {**ProductSummarySerializer(recommendation.related, context=context).data, 'score': recommendation.score}
+            for recommendation in recommendations
+        ])
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Products created or updated, and ids of products deleted, after a watermark (delta sync).
+        Start without `since`, then always send back the returned `watermark`; keep calling while
+        `has_more` is true. Payloads follow `?fields=` / `?expand=` like the list.
+        exemple : GET /api/products/changes/?since=<watermark>&page_size=100
+        """
+        try:
+            position = decode_watermark(request.query_params.get('since', ''))
+        except ValueError:
+            return Response({"detail": "Invalid watermark."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = self.paginator.get_page_size(request)
+        changed_ids, deleted_ids, position, has_more = changes_since(Product.objects.all(), position, limit)
+
+        products = self.get_queryset().filter(pk__in=changed_ids)
+        walk_order = {pk: index for index, pk in enumerate(changed_ids)}
+        reader = self.get_reader() if self.compiled_reads else None
+        if reader is not None:
+            rows = sorted(reader.values(products), key=lambda row: walk_order[row['id']])
+            changed = reader.render(rows)
+        else:
+            products = sorted(products, key=lambda product: walk_order[product.pk])
+            changed = self.get_serializer(products, many=True).data
+        return Response({
+            'changed': changed,
+            'deleted': deleted_ids,
+            'watermark': encode_watermark(position),
+            'has_more': has_more,
+        })
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Counts per category, price bucket and availability for the current filters and search,
+        one grouped query per facet family.
+        exemple : GET /api/products/facets/?search=phone&category=1
+        """
+        return self.cached_response(self.get_facets, request)
+
+    def get_facets(self, request):
+        def filter_products(params):
+            queryset = filter_catalog(params, request)
+            query = params.get(ProductSearchFilter.search_param, '')
+            if query.strip():
+                # the search annotates a join: count the matching products, not the joined rows
+                queryset = Product.objects.filter(pk__in=get_search_backend().search(queryset, query).values('pk'))
+            return queryset
+
+        return Response(compute_facets(filter_products, request.query_params))
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Streams the whole catalog (optionally narrowed by the product filters) as NDJSON or CSV.
+        exemple : GET /api/products/export/?type=csv&category=1
+        """
+        export_format = request.query_params.get('type', 'ndjson')
+        if export_format not in CONTENT_TYPES:
+            return Response({"detail": "type must be 'ndjson' or 'csv'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # validated before the response starts streaming, while a 400 can still be sent
+        queryset = filter_catalog(request.query_params, request)
+        chunk_size = getattr(settings, 'PRODUCT_EXPORT_CHUNK_SIZE', 500)
+        lines = export_lines(export_format, iter_products(queryset, chunk_size), request.build_absolute_uri)
+
+        response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="products.{export_format}"'
+        return response
+
     @action(detail=True, methods=['post'])
     def upload_images(self, request, pk=None):
         try:
@@ -78,12 +332,19 @@ class ProductViewSet(viewsets.ModelViewSet):
 
         # Check if images are provided in the request
         files = request.FILES.getlist('images')
+        error = upload_error(request)
+        if error:
+            return Response({"detail": error}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
         if not files:
             return Response({"detail": "No images provided."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Create an image instance for each file
-        for file in files:
-            Image.objects.create(product=product, image=file)
+        # Reject the whole upload if one file is not an accepted image (headers only, nothing is decoded)
+        errors = {file.name: message for file in files if (message := validate_image_header(file))}
+        if errors:
+            return Response({"detail": "Invalid images.", "errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Create all image instances with a single INSERT
+        save_product_images(product, files)
 
         return Response({"message": "Images uploaded successfully"}, status=status.HTTP_201_CREATED)
     @action(detail=True, methods=['delete'], url_path='delete-all-images')
@@ -0,0 +1,178 @@
+import datetime
+from collections import Counter, defaultdict
+from itertools import combinations
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from orders.models import Order
+from products.models import ProductCoPurchase, ProductRecommendation, RecommendationCheckpoint
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class RecommendationError(Exception):
+    pass
+
+
+def get_window_days():
+    return getattr(settings, 'PRODUCT_RECOMMENDATION_WINDOW_DAYS', 30)
+
+
+def get_top_k():
+    return getattr(settings, 'PRODUCT_RECOMMENDATION_TOP_K', 10)
+
+
+def basket_window(moment, window_days):
+    """Index of the fixed time window of `moment`: a basket is (user, window)."""
+    return int((moment - EPOCH).total_seconds() // (window_days * 86400))
+
+
+def window_start(index, window_days):
+    return EPOCH + datetime.timedelta(days=index * window_days)
+
+
+def count_pairs(baskets, existing):
+    """
+    Co-purchase increments for the products added to each basket: pairs among the new
+    products, and pairs between a new product and one the basket already contained.
+    Returns a Counter {(product, related): n} holding both directions of every pair.
+    """
+    counts = Counter()
+    for key, products in baskets.items():
+        old = existing.get(key, set())
+        new = products - old
+        for first, second in combinations(sorted(new), 2):
+            counts[first, second] += 1
+            counts[second, first] += 1
+        for first in new:
+            for second in old:
+                counts[first, second] += 1
+                counts[second, first] += 1
+    return counts
+
+
+def load_existing(baskets, last_order_id, window_days):
+    """Products already folded into the touched baskets (orders up to `last_order_id`), in one query."""
+    if not last_order_id or not baskets:
+        return {}
+    windows = [window for _, window in baskets]
+    rows = Order.objects.filter(
+        pk__lte=last_order_id,
+        user_id__in={user for user, _ in baskets},
+        order_date__gte=window_start(min(windows), window_days),
+        order_date__lt=window_start(max(windows) + 1, window_days),
+    ).values_list('user_id', 'product_id', 'order_date')
+    existing = defaultdict(set)
+    for user, product, moment in rows:
+        key = (user, basket_window(moment, window_days))
+        if key in baskets:
+            existing[key].add(product)
+    return existing
+
+
+def apply_counts(counts, batch_size=1000):
+    """Add the increments to the stored matrix: existing cells are updated, new ones created."""
+    pairs = list(counts)
+    for start in range(0, len(pairs), batch_size):
+        chunk = pairs[start:start + batch_size]
+        products = {product for product, _ in chunk}
+        rows = {
+            (row.product_id, row.related_id): row
+            for row in ProductCoPurchase.objects.filter(
+                product_id__in=products, related_id__in={related for _, related in chunk}
+            )
+        }
+        updated, created = [], []
+        for pair in chunk:
+            row = rows.get(pair)
+            if row is None:
+                created.append(ProductCoPurchase(product_id=pair[0], related_id=pair[1], count=counts[pair]))
+            else:
+                row.count += counts[pair]
+                updated.append(row)
+        ProductCoPurchase.objects.bulk_update(updated, ['count'], batch_size=batch_size)
+        ProductCoPurchase.objects.bulk_create(created, batch_size=batch_size)
+
+
+def fold_new_orders(chunk_size=5000, full=False):
+    """
+    Fold the orders created since the last run into the co-purchase matrix.
+
+    Orders are read by primary key in chunks; each chunk commits together with the
+    checkpoint, so an interrupted run resumes where it stopped and a run costs
+    O(new orders). `full` clears the matrix and starts over from the first order.
+    Returns (orders read, ids of the products whose co-purchases changed).
+
+    Incremental runs only ever add: an order folded once stays counted after it is
+    deleted or moved to another product, and an order committing after a higher primary
+    key was folded is skipped. The matrix drifts from the order history until the next
+    `full` rebuild, which must therefore be scheduled periodically (e.g. nightly).
+    """
+    window_days = get_window_days()
+    with transaction.atomic():
+        checkpoint, _ = RecommendationCheckpoint.objects.select_for_update().get_or_create(
+            pk=1, defaults={'window_days': window_days}
+        )
+        if full:
+            ProductCoPurchase.objects.all().delete()
+            checkpoint.last_order_id = 0
+            checkpoint.window_days = window_days
+            checkpoint.save()
+        elif checkpoint.window_days != window_days:
+            raise RecommendationError(
+                f"The matrix was built with {checkpoint.window_days} day baskets; run a full rebuild."
+            )
+
+    read, touched = 0, set()
+    while True:
+        with transaction.atomic():
+            checkpoint = RecommendationCheckpoint.objects.select_for_update().get(pk=1)
+            orders = list(
+                Order.objects.filter(pk__gt=checkpoint.last_order_id).order_by('pk')
+                .values_list('pk', 'user_id', 'product_id', 'order_date')[:chunk_size]
+            )
+            if not orders:
+                return read, touched
+            baskets = defaultdict(set)
+            for _, user, product, moment in orders:
+                baskets[user, basket_window(moment, window_days)].add(product)
+            counts = count_pairs(baskets, load_existing(baskets, checkpoint.last_order_id, window_days))
+            apply_counts(counts)
+            touched.update(product for product, _ in counts)
+            checkpoint.last_order_id = orders[-1][0]
+            checkpoint.save(update_fields=['last_order_id', 'updated_at'])
+        read += len(orders)
+
+
+def refresh_recommendations(product_ids, top_k=None, batch_size=500):
+    """Rebuild the top-K rows of `product_ids` from the matrix (ranked in the database)."""
+    top_k = top_k or get_top_k()
+    product_ids = sorted(product_ids)
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        ranked = (
+            ProductCoPurchase.objects.filter(product_id__in=batch)
+            .annotate(rank=Window(RowNumber(), partition_by=F('product'), order_by=[F('count').desc(), F('related')]))
+            .filter(rank__lte=top_k)
+            .values_list('product_id', 'related_id', 'count', 'rank')
+        )
+        recommendations = [
+            ProductRecommendation(product_id=product, related_id=related, score=count, rank=rank)
+            for product, related, count, rank in ranked
+        ]
+        with transaction.atomic():
+            ProductRecommendation.objects.filter(product_id__in=batch).delete()
+            ProductRecommendation.objects.bulk_create(recommendations)
+
+
+def build_recommendations(full=False, chunk_size=5000, top_k=None):
+    """Fold new orders, then re-rank the products they touched. Returns (orders read, products re-ranked)."""
+    read, touched = fold_new_orders(chunk_size=chunk_size, full=full)
+    if full:
+        # products without co-purchases anymore must lose their old recommendations
+        touched.update(ProductRecommendation.objects.values_list('product_id', flat=True).distinct())
+    refresh_recommendations(touched, top_k=top_k)
+    return read, len(touched)
@@ -0,0 +1,204 @@
+from collections import defaultdict
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+from products.models import Image, Product, variant_urls
+from products.productAPI.serializers import (
+    ProductImageSerializer, RatingSummaryField, absolute_variant_urls, rating_summary,
+)
+
+
+def column_reader(field, model, prefix=''):
+    """
+    Return (column, to_representation) reading `field` from one `.values()` column,
+    or None when the field needs the model instance.
+    """
+    try:
+        model_field = model._meta.get_field(field.source)
+    except FieldDoesNotExist:
+        return None
+    if model_field.many_to_one and isinstance(field, serializers.PrimaryKeyRelatedField):
+        # .values('<fk>') already yields the primary key the field would render
+        return prefix + field.source, None
+    if model_field.is_relation or isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField)):
+        return None
+    return prefix + field.source, field.to_representation
+
+
+def compile_relation(field, model, prefix=''):
+    """
+    Return (key column, nested columns) reading the nested serializer `field` through a
+    join, or None unless it follows a single-valued relation (foreign key or one-to-one).
+    """
+    try:
+        model_field = model._meta.get_field(field.source)
+    except FieldDoesNotExist:
+        return None
+    if not (model_field.many_to_one or model_field.one_to_one):
+        return None
+    path = f'{prefix}{field.source}__'
+    nested = compile_columns(field, path)
+    if nested is None:
+        return None
+    # NULL when there is no related row, which the serializer renders as None
+    return path + field.Meta.model._meta.pk.name, nested
+
+
+def compile_columns(serializer, prefix=''):
+    """
+    [(name, column, to_representation)] for every readable field of `serializer`, or None.
+    Nested serializers are [(name, key column, nested columns)].
+    """
+    columns = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.ModelSerializer):
+            reader = compile_relation(field, serializer.Meta.model, prefix)
+        else:
+            reader = column_reader(field, serializer.Meta.model, prefix)
+        if reader is None:
+            return None
+        columns.append((name, *reader))
+    return columns
+
+
+def column_names(columns):
+    for _, column, convert in columns:
+        yield column
+        if isinstance(convert, list):
+            yield from column_names(convert)
+
+
+def build(row, columns):
+    item = {}
+    for name, column, convert in columns:
+        value = row[column]
+        if value is None or convert is None:
+            item[name] = value
+        elif isinstance(convert, list):
+            item[name] = build(row, convert)
+        else:
+            item[name] = convert(value)
+    return item
+
+
+class ProductReader:
+    """
+    Compiled read path producing the output of ProductSerializer without instantiating
+    models or serializers per row.
+
+    Products are fetched with `.values()`, images and discounts with one `.values()`
+    query each for the whole page, and every field is rendered through an accessor
+    prepared once per request (the serializer field's own `to_representation`, so the
+    formatting stays identical). `compile()` returns None for serializer shapes it does
+    not know, and the caller falls back to the serializer.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.columns = {'id'}
+        self.plan = []  # (name, builder(row, batches))
+        self.image_storage = Image._meta.get_field('image').storage
+        self.loads_images = False
+        self.discount_columns = None
+
+    @classmethod
+    def compile(cls, serializer, always_load=()):
+        reader = cls(serializer.context.get('request'))
+        reader.columns.update(always_load)
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            builder = reader.compile_field(name, field)
+            if builder is None:
+                return None
+            reader.plan.append((name, builder))
+        return reader
+
+    def compile_field(self, name, field):
+        if isinstance(field, RatingSummaryField):
+            self.columns.update(('rating_average', 'rating_count'))
+            return lambda row, batches: rating_summary(row['rating_average'], row['rating_count'])
+
+        if isinstance(field, serializers.ListSerializer):
+            if isinstance(field.child, ProductImageSerializer) and field.source == 'images':
+                self.loads_images = True
+                return lambda row, batches: batches['images'].get(row['id'], [])
+            if field.source == 'discounts':
+                # read through the join table: one query for the discounts of the whole page
+                relation = Product.discounts.rel.field
+                self.discount_model = Product.discounts.through
+                self.discount_product = relation.m2m_reverse_field_name()
+                self.discount_columns = compile_columns(field.child, relation.m2m_field_name() + '__')
+                if self.discount_columns is None:
+                    return None
+                return lambda row, batches: batches['discounts'].get(row['id'], [])
+            return None
+
+        if isinstance(field, serializers.ModelSerializer):
+            # expanded foreign key, e.g. the category (with its stats): joined in the same query
+            relation = compile_relation(field, Product)
+            if relation is None:
+                return None
+            key, nested = relation
+            self.columns.add(key)
+            self.columns.update(column_names(nested))
+            return lambda row, batches: None if row[key] is None else build(row, nested)
+
+        reader = column_reader(field, Product)
+        if reader is None:
+            return None
+        column, convert = reader
+        self.columns.add(column)
+        if convert is None:
+            return lambda row, batches: row[column]
+        return lambda row, batches: None if row[column] is None else convert(row[column])
+
+    def values(self, queryset):
+        """The product rows needed to render the response, one query."""
+        return queryset.prefetch_related(None).values(*self.columns)
+
+    def load_images(self, product_ids):
+        storage, request = self.image_storage, self.request
+        images = defaultdict(list)
+        rows = (
+            Image.objects.filter(product_id__in=product_ids).order_by('pk')
+            .values_list('product_id', 'id', 'image', 'variants')
+        )
+        for product_id, image_id, name, variants in rows:
+            url = None
+            if name:
+                url = storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+            images[product_id].append({
+                'id': image_id,
+                'image': url,
+                'variants': absolute_variant_urls(variant_urls(variants), request),
+            })
+        return images
+
+    def load_discounts(self, product_ids):
+        discounts = defaultdict(list)
+        columns = list(column_names(self.discount_columns))
+        rows = (
+            self.discount_model.objects.filter(**{f'{self.discount_product}__in': product_ids})
+            .order_by('pk').values(self.discount_product, *columns)
+        )
+        for row in rows:
+            discounts[row[self.discount_product]].append(build(row, self.discount_columns))
+        return discounts
+
+    def render(self, rows):
+        """Build the response dicts of `rows` (as returned by values()), batching related data."""
+        rows = list(rows)
+        product_ids = [row['id'] for row in rows]
+        batches = {}
+        if self.loads_images:
+            batches['images'] = self.load_images(product_ids) if product_ids else {}
+        if self.discount_columns is not None:
+            batches['discounts'] = self.load_discounts(product_ids) if product_ids else {}
+        plan = self.plan
+        return [{name: builder(row, batches) for name, builder in plan} for row in rows]
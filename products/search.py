@@ -0,0 +1,165 @@
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.utils.module_loading import import_string
+
+from products.models import Product, ProductSearchTerm
+
+DEFAULT_BACKEND = 'products.search.InvertedIndexBackend'
+
+# Weight given to a term for each field it appears in (name matches rank first)
+FIELD_WEIGHTS = {
+    'name': 10,
+    'category': 5,
+    'description': 1,
+}
+
+# Repeated words only count up to this many times per field
+MAX_OCCURRENCES = 3
+
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 64
+
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is',
+    'it', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'with',
+])
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """
+    Split text into normalized search terms (lowercase, no stop words).
+    """
+    if not text:
+        return []
+    terms = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if len(token) < MIN_TERM_LENGTH or token in STOP_WORDS:
+            continue
+        terms.append(token[:MAX_TERM_LENGTH])
+    return terms
+
+
+def build_terms(product):
+    """
+    Return a {term: weight} mapping for a product.
+    Expects `product.category` to be loaded (use select_related in bulk paths).
+    """
+    weights = Counter()
+    fields = {
+        'name': product.name,
+        'category': product.category.name if product.category_id else '',
+        'description': product.description,
+    }
+    for field, text in fields.items():
+        for term, occurrences in Counter(tokenize(text)).items():
+            weights[term] += FIELD_WEIGHTS[field] * min(occurrences, MAX_OCCURRENCES)
+    return weights
+
+
+class InvertedIndexBackend:
+    """
+    Search backend storing a tokenized inverted index in `ProductSearchTerm`.
+    Lookups hit the (term, product) unique index, so latency depends on the
+    number of matching rows rather than on the size of the catalog.
+    """
+
+    def index_products(self, products):
+        """Replace the index entries of the given products."""
+        products = list(products)
+        if not products:
+            return
+        ProductSearchTerm.objects.filter(product__in=[p.pk for p in products]).delete()
+        entries = [
+            ProductSearchTerm(term=term, product_id=product.pk, weight=weight)
+            for product in products
+            for term, weight in build_terms(product).items()
+        ]
+        ProductSearchTerm.objects.bulk_create(entries, batch_size=1000)
+
+    def remove_products(self, product_ids):
+        ProductSearchTerm.objects.filter(product__in=list(product_ids)).delete()
+
+    def clear(self):
+        ProductSearchTerm.objects.all().delete()
+
+    def search(self, queryset, query):
+        """
+        Filter `queryset` to products matching every term of `query`, ordered by relevance.
+        The last term is matched as a prefix so partially typed words still match.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return queryset
+        last = terms.pop()
+        exact = [term for term in terms if term != last]
+
+        prefix_match = Q(search_terms__term__startswith=last)
+        annotations = {
+            'search_rank': Sum('search_terms__weight'),
+            'prefix_hits': Count('search_terms', filter=prefix_match),
+        }
+        conditions = {'prefix_hits__gte': 1}
+        term_filter = prefix_match
+        if exact:
+            exact_match = Q(search_terms__term__in=exact)
+            annotations['exact_hits'] = Count('search_terms', filter=exact_match)
+            conditions['exact_hits'] = len(exact)
+            term_filter |= exact_match
+
+        return (
+            queryset.filter(term_filter)
+            .annotate(**annotations)
+            .filter(**conditions)
+            .order_by('-search_rank', 'pk')
+        )
+
+
+class SimpleBackend:
+    """
+    Index-free backend using LIKE lookups. Only suitable for small catalogs or debugging.
+    """
+
+    def index_products(self, products):
+        pass
+
+    def remove_products(self, product_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def search(self, queryset, query):
+        for term in tokenize(query):
+            queryset = queryset.filter(
+                Q(name__icontains=term) | Q(description__icontains=term) | Q(category__name__icontains=term)
+            )
+        return queryset
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_search_backend():
+    """Return the backend configured by the PRODUCT_SEARCH_BACKEND setting."""
+    return _load_backend(getattr(settings, 'PRODUCT_SEARCH_BACKEND', DEFAULT_BACKEND))
+
+
+def reindex_category(category_id, chunk_size=1000):
+    """Re-index every product of a category, e.g. after the category was renamed."""
+    backend = get_search_backend()
+    queryset = Product.objects.filter(category_id=category_id).select_related('category').order_by('pk')
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            break
+        backend.index_products(chunk)
+        last_pk = chunk[-1].pk
@@ -0,0 +1,141 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.db import transaction
+from django.dispatch import receiver, Signal
+from django.utils import timezone
+from categories.models import Category, CategoryStats
+from products.models import Product, Image, ProductTombstone, STATS_FIELDS
+from products.category_stats import apply_change, reconcile_stats
+from products.search import get_search_backend, reindex_category
+from products.images import schedule_variants
+from products.cleanup import enqueue_deletions, image_paths, schedule_cleanup
+from ECommerce.response_cache import bump_generation
+
+# Sent after products were written in bulk (bulk_create/bulk_update/queryset.update),
+# which bypasses post_save. Arguments: product_ids, category_ids (including previous categories).
+products_bulk_changed = Signal()
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    """
+    Keep the search index in sync when a product is created or updated.
+    Deleted products lose their entries through the CASCADE on ProductSearchTerm.product.
+    """
+    if raw:
+        return
+    get_search_backend().index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def record_product_tombstone(sender, instance, **kwargs):
+    """Deleted products are kept as tombstones so the changes feed can report them."""
+    ProductTombstone.objects.create(product_id=instance.pk)
+
+
+@receiver(pre_save, sender=Product)
+def load_stats_state(sender, instance, raw=False, **kwargs):
+    """Products saved without being loaded whole (e.g. deferred fields) read their stored state once."""
+    if raw or instance.pk is None or hasattr(instance, '_stats_state'):
+        return
+    row = Product.objects.filter(pk=instance.pk).values(*STATS_FIELDS).first()
+    if row is not None:
+        instance._stats_state = (row['category_id'], row['price'], row['stock_quantity'] > 0)
+
+
+@receiver(post_save, sender=Product)
+def update_category_stats(sender, instance, raw=False, **kwargs):
+    """Apply the product's difference to the stats of its old and new category."""
+    if raw:
+        return
+    state = instance.stats_state()
+    apply_change(getattr(instance, '_stats_state', None), state)
+    instance._stats_state = state
+
+
+@receiver(post_delete, sender=Product)
+def uncount_deleted_product(sender, instance, **kwargs):
+    apply_change(getattr(instance, '_stats_state', instance.stats_state()), None)
+
+
+@receiver(post_save, sender=Category)
+def create_category_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        CategoryStats.objects.get_or_create(category=instance)
+
+
+@receiver(pre_save, sender=Category)
+def load_category_name(sender, instance, raw=False, **kwargs):
+    """Categories saved without being loaded (e.g. deferred name) read their stored name once."""
+    if raw or instance.pk is None or hasattr(instance, '_loaded_name'):
+        return
+    instance._loaded_name = Category.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, raw=False, **kwargs):
+    """
+    Category names are indexed with their products, so a rename must re-index them,
+    once committed. Other saves (moves, path rewrites) leave the index alone.
+    """
+    renamed = not (raw or created) and instance.name != getattr(instance, '_loaded_name', instance.name)
+    instance._loaded_name = instance.name
+    if renamed:
+        category_id = instance.pk
+        transaction.on_commit(lambda: reindex_category(category_id))
+
+
+@receiver(post_save, sender=Image)
+def generate_image_variants(sender, instance, created, raw=False, **kwargs):
+    """New images get their resized variants generated in the background once committed."""
+    if raw or not created or not instance.image:
+        return
+    transaction.on_commit(lambda: schedule_variants([instance.pk]))
+
+
+@receiver(post_delete, sender=Image)
+def delete_image_files(sender, instance, **kwargs):
+    """
+    Queue the files of deleted images (direct deletes and the CASCADE from Product alike)
+    and let the background cleanup remove them once the deletion is committed.
+    """
+    paths = image_paths(instance)
+    if paths:
+        enqueue_deletions(paths)
+        transaction.on_commit(schedule_cleanup)
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def touch_image_product(sender, instance, raw=False, **kwargs):
+    """Images are part of the product representation, so they advance its updated_at."""
+    if raw:
+        return
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    """
+    Bump the model's generation so cached catalog responses are never served stale.
+    Deferred to the commit: a bump inside the transaction would let a concurrent request
+    re-cache the old rows under the new generation.
+    """
+    transaction.on_commit(lambda: bump_generation(sender))
+
+
+@receiver(products_bulk_changed)
+def handle_products_bulk_changed(sender, product_ids, category_ids=None, **kwargs):
+    """Re-index bulk written products, recompute their categories' stats and invalidate cached catalog responses."""
+    backend = get_search_backend()
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), 1000):
+        chunk = product_ids[start:start + 1000]
+        backend.index_products(Product.objects.filter(pk__in=chunk).select_related('category'))
+    transaction.on_commit(lambda: bump_generation(Product))
+    if category_ids:
+        reconcile_stats(category_ids)
@@ -0,0 +1,79 @@
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.db.models import Count, Q
+
+IMAGES_DIR = 'product_images'
+
+# product_images/ab/cd/<sha256>.<ext>
+CONTENT_PATH_RE = re.compile(r'^%s/[0-9a-f]{2}/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(\.\w+)?$' % IMAGES_DIR)
+
+
+def file_hash(content):
+    """SHA-256 of a Django File, read chunk by chunk."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def content_path(digest, extension=''):
+    """Sharded location of a content hash, so no directory holds more than a few hundred files."""
+    return f"{IMAGES_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{extension.lower()}"
+
+
+def content_hash_from_name(name):
+    match = CONTENT_PATH_RE.match(name or '')
+    return match.group('digest') if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage naming files after the hash of their content.
+
+    Whatever name is requested, the file is stored under `content_path(sha256)`, keeping
+    the extension. Saving bytes that are already stored writes nothing and returns the
+    existing name, so identical uploads share one file; the Image rows pointing at a
+    name are its references (see `reference_counts`).
+    """
+
+    def save(self, name, content, max_length=None):
+        digest = file_hash(content)
+        name = content_path(digest, os.path.splitext(name)[1])
+        # Taken off the cleanup queue before checking it exists: a cleanup batch holds the
+        # lock on its rows, so this waits for it and writes the file again if it was removed.
+        cancel_deletions(digest)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+image_storage = ContentAddressedStorage()
+
+
+def get_image_storage():
+    return image_storage
+
+
+def cancel_deletions(digest):
+    """Dequeue the pending deletions of a content hash's files (the original and its shared variants)."""
+    from products.images import VARIANTS_DIR
+    from products.models import PendingFileDeletion
+
+    PendingFileDeletion.objects.filter(
+        Q(path__startswith=content_path(digest)) | Q(path__startswith=f"{VARIANTS_DIR}/{digest}/")
+    ).delete()
+
+
+def reference_counts(names):
+    """Number of Image rows using each stored file name."""
+    from products.models import Image
+
+    counts = dict(
+        Image.objects.filter(image__in=list(names)).order_by()
+        .values('image').annotate(references=Count('pk')).values_list('image', 'references')
+    )
+    return {name: counts.get(name, 0) for name in names}
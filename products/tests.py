@@ -1,10 +1,38 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 from django.contrib.auth.models import User, Permission
-from .models import Product, Category
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.test import override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from .models import (
+    Product, Category, Image, ProductSearchTerm, ImportCheckpoint, PendingFileDeletion, ProductTombstone,
+    ProductCoPurchase, ProductRecommendation,
+)
+from categories.models import CategoryStats
+from .productAPI.views import ProductViewSet
+from ECommerce.query_budget import QueryBudgetExceeded
 from decimal import Decimal
+from io import StringIO
+import base64
+import csv
+import io
+import json
+import os
+import tempfile
+from PIL import Image as PILImage
+from unittest.mock import patch
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from .uploads import save_product_images
+from .storage import reference_counts
+from reviews.models import Review
+from discounts.models import Discount
+from orders.models import Order
+from datetime import timedelta
+from django.utils import timezone
 
 
 class ProductAPITestCase(TestCase):
@@ -124,4 +152,1437 @@ class ProductAPITestCase(TestCase):
         self.authenticate(permissions=['delete_product'])
         response = self.client.delete(self.detail_url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertEqual(Product.objects.count(), 0)
\ No newline at end of file
+        self.assertEqual(Product.objects.count(), 0)
+
+class ProductSearchTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.list_url = reverse('product-list')
+        self.phones = Category.objects.create(name="Phones")
+        self.audio = Category.objects.create(name="Audio")
+
+        self.smartphone = Product.objects.create(
+            name="Smartphone X", description="Waterproof phone with a great camera",
+            price=Decimal("599.00"), stock_quantity=10, category=self.phones
+        )
+        self.headphones = Product.objects.create(
+            name="Wireless headphones", description="Pairs with any smartphone",
+            price=Decimal("99.00"), stock_quantity=5, category=self.audio
+        )
+
+    def search(self, query):
+        response = self.client.get(self.list_url, {'search': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['results']]
+
+    def test_search_matches_description_and_category(self):
+        """Terms found only in the description or the category name still match."""
+        self.assertEqual(self.search("waterproof"), [self.smartphone.id])
+        self.assertEqual(self.search("audio"), [self.headphones.id])
+
+    def test_search_ranks_name_matches_first(self):
+        """A product named after the term outranks one that only mentions it."""
+        self.assertEqual(self.search("smartphone"), [self.smartphone.id, self.headphones.id])
+
+    def test_search_requires_all_terms_and_matches_prefix(self):
+        """Every term must match; the last one may be partially typed."""
+        self.assertEqual(self.search("wireless head"), [self.headphones.id])
+        self.assertEqual(self.search("wireless camera"), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        """Saving or deleting a product updates the index incrementally."""
+        self.smartphone.name = "Rugged handset"
+        self.smartphone.save()
+        self.assertEqual(self.search("rugged"), [self.smartphone.id])
+
+        self.phones.name = "Mobiles"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.phones.save()
+        self.assertEqual(self.search("mobiles"), [self.smartphone.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.smartphone.delete()
+        self.assertEqual(self.search("rugged"), [])
+
+    def test_only_a_rename_reindexes_the_category(self):
+        parent = Category.objects.create(name="Devices")
+        with patch('products.signals.reindex_category') as reindex, self.captureOnCommitCallbacks(execute=True):
+            self.phones.parent = parent
+            self.phones.save()
+            Category.objects.get(pk=self.audio.pk).save()
+        reindex.assert_not_called()
+
+        with patch('products.signals.reindex_category') as reindex, self.captureOnCommitCallbacks(execute=True):
+            category = Category.objects.only('pk').get(pk=self.audio.pk)
+            category.name = "Sound"
+            category.save()
+        reindex.assert_called_once_with(self.audio.pk)
+
+    def test_rebuild_search_index_command(self):
+        """The management command rebuilds the index from the product table."""
+        ProductSearchTerm.objects.all().delete()
+        self.assertEqual(self.search("headphones"), [])
+        call_command('rebuild_search_index', chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.search("headphones"), [self.headphones.id])
+
+
+class ProductPaginationTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.list_url = reverse('product-list')
+        category = Category.objects.create(name="Books")
+        self.products = [
+            Product.objects.create(
+                name=f"Book {i:02d}", description="Paperback", price=Decimal("10.00"),
+                stock_quantity=3, category=category
+            )
+            for i in range(25)
+        ]
+
+    def walk(self, url, params=None):
+        """Follow `next` links and return every page's ids."""
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            pages.append([item['id'] for item in response.data['results']])
+            if not response.data['next']:
+                return pages, response
+            response = self.client.get(response.data['next'])
+
+    def test_cursor_walk_covers_every_product_once(self):
+        """Keyset mode returns each product exactly once in (created_date, id) order."""
+        pages, _ = self.walk(self.list_url, {'cursor': ''})
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), [p.id for p in self.products])
+
+    def test_cursor_previous_link(self):
+        """The previous cursor of the second page leads back to the first page."""
+        first = self.client.get(self.list_url, {'cursor': ''})
+        self.assertIsNone(first.data['previous'])
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+
+    def test_cursor_client_ordering(self):
+        """Clients can order the keyset walk by an allowed indexed field."""
+        pages, _ = self.walk(self.list_url, {'cursor': '', 'ordering': '-name', 'page_size': 7})
+        self.assertEqual(sum(pages, []), [p.id for p in reversed(self.products)])
+
+        response = self.client.get(self.list_url, {'cursor': '', 'ordering': 'description'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.list_url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_forged_cursor(self):
+        """Well-formed JSON of the wrong shape or types is rejected like any unknown cursor."""
+        for payload in [
+            [1, 2],
+            {'o': 'id', 'v': [1], 'r': False},
+            {'o': [7], 'v': [1], 'r': False},
+            {'o': ['created_date', 'id'], 'v': [1], 'r': False},
+            {'o': ['id'], 'v': [[1]], 'r': False},
+            {'o': ['id'], 'v': ['abc'], 'r': False},
+            {'o': ['created_date', 'id'], 'v': [None, 1], 'r': False},
+            {'o': ['created_date', 'id'], 'v': ['yesterday', 1], 'r': False},
+        ]:
+            cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+            response = self.client.get(self.list_url, {'cursor': cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, payload)
+
+    def test_page_number_without_count(self):
+        """count=false drops the total and still links to the next page."""
+        response = self.client.get(self.list_url, {'count': 'false', 'page': 3})
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertIsNone(response.data['next'])
+        self.assertIsNotNone(response.data['previous'])
+
+
+@override_settings(QUERY_BUDGET_RAISE=True)
+class ProductQueryBudgetTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.list_url = reverse('product-list')
+        category = Category.objects.create(name="Garden")
+        for i in range(12):
+            product = Product.objects.create(
+                name=f"Tool {i}", description="Steel", price=Decimal("5.00"),
+                stock_quantity=2, category=category
+            )
+            Image.objects.create(product=product, image=f"product_images/tool_{i}_a.jpg")
+            Image.objects.create(product=product, image=f"product_images/tool_{i}_b.jpg")
+
+    def test_list_query_count_is_constant(self):
+        """Images are prefetched, so the page costs the same number of queries at any size."""
+        # validators + count + page + images
+        with self.assertNumQueries(4):
+            response = self.client.get(self.list_url, {'page_size': 12})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results'][0]['images']), 2)
+
+    def test_storefront_within_budget(self):
+        response = self.client.get(reverse('product_list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_budget_exceeded_raises(self):
+        with patch.object(ProductViewSet, 'query_budget', {'list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(self.list_url)
+
+    @override_settings(QUERY_BUDGET_RAISE=False)
+    def test_budget_exceeded_logs(self):
+        with patch.object(ProductViewSet, 'query_budget', {'list': 1}):
+            with self.assertLogs('ECommerce.query_budget', level='WARNING') as logs:
+                response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('ProductViewSet.list', logs.output[0])
+
+
+class ProductResponseCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.list_url = reverse('product-list')
+        self.category = Category.objects.create(name="Kitchen")
+        self.product = Product.objects.create(
+            name="Kettle", description="Electric kettle", price=Decimal("30.00"),
+            stock_quantity=8, category=self.category
+        )
+        self.detail_url = reverse('product-detail', args=[self.product.id])
+
+    def test_anonymous_list_is_served_from_cache(self):
+        self.client.get(self.list_url)
+        # only the conditional GET validators are computed
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+
+    def test_query_string_is_normalized(self):
+        self.client.get(self.list_url + '?in_stock=true&page_size=5')
+        with self.assertNumQueries(1):
+            self.client.get(self.list_url + '?page_size=5&in_stock=true')
+
+    def test_save_invalidates_cached_responses(self):
+        """Stock and price changes are visible on the very next request."""
+        self.client.get(self.detail_url)
+        self.product.price = Decimal("25.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.data['price'], "25.00")
+
+    def test_invalidation_waits_for_commit(self):
+        """A response read before the write commits cannot be cached under the new generation."""
+        self.client.get(self.detail_url)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.product.price = Decimal("25.00")
+            self.product.save()
+            self.assertEqual(self.client.get(self.detail_url).data['price'], "30.00")
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get(self.detail_url).data['price'], "25.00")
+
+    def test_image_change_invalidates_cached_list(self):
+        self.client.get(self.list_url)
+        # the file does not exist: its variants fail, inline, without touching the response
+        with self.assertLogs('products.images', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            Image.objects.create(product=self.product, image="product_images/kettle.jpg")
+        response = self.client.get(self.list_url)
+        self.assertEqual(len(response.data['results'][0]['images']), 1)
+
+    def test_authenticated_requests_bypass_cache(self):
+        user = User.objects.create_user(username='shopper', password='shopperpass')
+        self.client.force_authenticate(user=user)
+        self.client.get(self.list_url)
+        with self.assertNumQueries(4):
+            self.client.get(self.list_url)
+
+
+class ProductConditionalGetTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.list_url = reverse('product-list')
+        self.category = Category.objects.create(name="Outdoor")
+        self.product = Product.objects.create(
+            name="Tent", description="Two person tent", price=Decimal("120.00"),
+            stock_quantity=4, category=self.category
+        )
+        self.detail_url = reverse('product-detail', args=[self.product.id])
+
+    def test_detail_etag_revalidation(self):
+        """A matching If-None-Match gets a 304 without serializing the product."""
+        response = self.client.get(self.detail_url)
+        etag = response.headers['ETag']
+        self.assertIn('Last-Modified', response.headers)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.headers['ETag'], etag)
+
+    def test_list_etag_changes_with_data(self):
+        """Updating a product, adding an image or deleting a row changes the list ETag."""
+        etag = self.client.get(self.list_url).headers['ETag']
+        self.assertEqual(
+            self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+
+        Image.objects.create(product=self.product, image="product_images/tent.jpg")
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+        etag = response.headers['ETag']
+        Product.objects.create(name="Stove", description="Gas", price=Decimal("40.00"),
+                               stock_quantity=2, category=self.category).delete()
+        self.assertEqual(
+            self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+
+    def test_etag_depends_on_query_string(self):
+        etag = self.client.get(self.list_url).headers['ETag']
+        response = self.client.get(self.list_url, {'page_size': 5}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get(self.detail_url).headers['Last-Modified']
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_missing_product_is_not_validated(self):
+        response = self.client.get(reverse('product-detail', args=[self.product.id + 100]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('ETag', response.headers)
+
+
+class ProductBulkUpsertTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.bulk_url = reverse('product-bulk-upsert')
+        self.user = User.objects.create_user(username='erp', password='erppass')
+        self.category = Category.objects.create(name="Hardware")
+        self.product = Product.objects.create(
+            name="Hammer", sku="HW-1", description="Claw hammer", price=Decimal("15.00"),
+            stock_quantity=10, category=self.category
+        )
+
+    def authenticate(self, *codenames):
+        for codename in codenames:
+            self.user.user_permissions.add(Permission.objects.get(codename=codename))
+        # reload the user so Django's permission cache is not reused
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+
+    def post(self, rows):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.bulk_url, rows, format='json')
+
+    def test_bulk_create_and_update(self):
+        """Rows are matched by id or sku, unknown skus are created."""
+        self.authenticate('add_product', 'change_product')
+        rows = [
+            {"id": self.product.id, "price": "12.50"},
+            {"sku": "HW-2", "name": "Saw", "description": "Hand saw", "price": "22.00",
+             "stock_quantity": 5, "category": self.category.id},
+            {"sku": "HW-1", "stock_quantity": 0},
+        ]
+        response = self.post(rows[:2])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        self.assertEqual([r['status'] for r in response.data['results']], ['updated', 'created'])
+
+        saw = Product.objects.get(sku="HW-2")
+        self.assertEqual(response.data['results'][1]['id'], saw.id)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price, Decimal("12.50"))
+
+        response = self.post(rows[2:])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 0)
+        self.assertEqual(self.product.name, "Hammer")
+
+    def test_bulk_write_updates_search_index(self):
+        self.authenticate('add_product', 'change_product')
+        self.post([{"sku": "HW-1", "name": "Mallet"}])
+        response = self.client.get(reverse('product-list'), {'search': 'mallet'})
+        self.assertEqual([item['id'] for item in response.data['results']], [self.product.id])
+
+    def test_invalid_rows_are_reported_per_row(self):
+        self.authenticate('add_product', 'change_product')
+        rows = [
+            {"sku": "HW-3", "name": "Drill"},  # missing required fields
+            {"id": 9999, "price": "1.00"},  # unknown id
+            {"sku": "HW-4", "name": "Level", "price": "-3", "stock_quantity": 1, "category": self.category.id},
+            {"sku": "HW-5", "name": "Pliers", "price": "8.00", "stock_quantity": 3, "category": 9999},
+            {"sku": "HW-6", "name": "Tape", "price": "3.00", "stock_quantity": 3, "category": self.category.id},
+            {"sku": "HW-6", "name": "Tape again", "price": "3.00", "stock_quantity": 3, "category": self.category.id},
+        ]
+        response = self.post(rows)
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(
+            [r['status'] for r in response.data['results']],
+            ['error', 'error', 'error', 'error', 'created', 'error']
+        )
+        self.assertIn('price', response.data['results'][0]['errors'])
+        self.assertIn('id', response.data['results'][1]['errors'])
+        self.assertIn('category', response.data['results'][3]['errors'])
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_bulk_permissions(self):
+        """Updates need change_product and creates need add_product."""
+        response = self.client.post(self.bulk_url, [{"id": self.product.id, "price": "1.00"}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.authenticate()
+        response = self.client.post(self.bulk_url, [{"id": self.product.id, "price": "1.00"}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.authenticate('change_product')
+        response = self.post([
+            {"id": self.product.id, "price": "9.00"},
+            {"sku": "HW-7", "name": "Vise", "price": "30.00", "stock_quantity": 1, "category": self.category.id},
+        ])
+        self.assertEqual([r['status'] for r in response.data['results']], ['updated', 'error'])
+
+    def test_bulk_rejects_non_list_payload(self):
+        self.authenticate('add_product')
+        response = self.client.post(self.bulk_url, {"sku": "HW-8"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductExportTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.export_url = reverse('product-export')
+        self.user = User.objects.create_user(username='analyst', password='analystpass')
+        self.user.user_permissions.add(Permission.objects.get(codename='view_product'))
+        self.category = Category.objects.create(name="Stationery")
+        self.products = [
+            Product.objects.create(
+                name=f"Pen {i}", sku=f"PEN-{i}", description="Blue, ballpoint", price=Decimal("1.50"),
+                stock_quantity=100, category=self.category
+            )
+            for i in range(5)
+        ]
+        Image.objects.create(product=self.products[0], image="product_images/pen.jpg")
+
+    def test_export_requires_view_permission(self):
+        response = self.client.get(self.export_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_export_ndjson(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.export_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [p.id for p in self.products])
+        self.assertEqual(rows[0]['price'], "1.50")
+        self.assertEqual(rows[0]['category_name'], "Stationery")
+        self.assertEqual(rows[0]['images'], ["http://testserver/media/product_images/pen.jpg"])
+
+    @override_settings(PRODUCT_EXPORT_CHUNK_SIZE=2)
+    def test_export_csv_with_filters(self):
+        self.client.force_authenticate(user=self.user)
+        Product.objects.create(name="Eraser", description="White", price=Decimal("0.90"),
+                               stock_quantity=10, category=Category.objects.create(name="Other"))
+        response = self.client.get(self.export_url, {'type': 'csv', 'category': self.category.id})
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[1]['description'], "Blue, ballpoint")
+
+    def test_export_rejects_invalid_filters(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.export_url, {'category': 'pens'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(response.streaming)
+        self.assertIn('category', response.data)
+
+    def test_export_products_command(self):
+        out = StringIO()
+        call_command('export_products', chunk_size=2, stdout=out, stderr=StringIO())
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row['sku'] for row in rows], [p.sku for p in self.products])
+        self.assertEqual(rows[0]['images'], ["/media/product_images/pen.jpg"])
+
+
+class ProductImportTestCase(TestCase):
+
+    CSV = (
+        "sku,name,description,price,stock_quantity,category_name\n"
+        "MUG-1,Mug,Ceramic,8.00,10,Kitchen\n"
+        "MUG-2,Big mug,,9.50,5,Kitchen\n"
+        "TEA-1,Green tea,,4.20,0,Groceries\n"
+        "BAD-1,Broken,,-1,3,Kitchen\n"
+        "MUG-3,Tiny mug,,6.00,12,Kitchen\n"
+    )
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write_file(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write(content)
+        return path
+
+    def import_file(self, path, **options):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_products', path, stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_import_csv_creates_products_and_categories(self):
+        path = self.write_file('catalog.csv', self.CSV)
+        output = self.import_file(path, chunk_size=2)
+
+        self.assertIn("4 created, 0 updated, 1 errors", output)
+        self.assertEqual(Category.objects.filter(name="Kitchen").count(), 1)
+        mug = Product.objects.get(sku="MUG-2")
+        self.assertEqual(mug.category.name, "Kitchen")
+        self.assertEqual(mug.price, Decimal("9.50"))
+        self.assertFalse(Product.objects.filter(sku="BAD-1").exists())
+        # imported products are searchable
+        self.assertTrue(ProductSearchTerm.objects.filter(product=mug, term="mug").exists())
+        self.assertEqual(ImportCheckpoint.objects.get(name='catalog.csv').rows_committed, 5)
+
+    @override_settings(PRODUCT_CHANGES_SETTLE_SECONDS=0)
+    def test_chunk_longer_than_settle_delay_is_reported(self):
+        """A chunk outlasting the changes feed delay could be skipped by clients syncing from it."""
+        path = self.write_file('catalog.csv', self.CSV)
+        with self.assertLogs('products.importer', 'WARNING') as logs:
+            self.import_file(path, chunk_size=5)
+        self.assertIn("PRODUCT_CHANGES_SETTLE_SECONDS", logs.output[0])
+
+    def test_import_ndjson_updates_by_sku(self):
+        category = Category.objects.create(name="Kitchen")
+        Product.objects.create(name="Old mug", sku="MUG-1", description="", price=Decimal("1.00"),
+                               stock_quantity=1, category=category)
+        path = self.write_file('catalog.ndjson', "\n".join([
+            json.dumps({"sku": "MUG-1", "price": "8.00"}),
+            "not json",
+            json.dumps({"sku": "MUG-2", "name": "Big mug", "price": "9.50", "stock_quantity": 5,
+                        "category_name": "Unknown"}),
+        ]))
+        output = self.import_file(path, no_create_categories=True)
+
+        self.assertIn("0 created, 1 updated, 2 errors", output)
+        self.assertEqual(Product.objects.get(sku="MUG-1").price, Decimal("8.00"))
+        self.assertFalse(Category.objects.filter(name="Unknown").exists())
+
+    def test_row_with_resolve_error_is_not_written(self):
+        category = Category.objects.create(name="Kitchen")
+        Product.objects.create(name="Old mug", sku="MUG-1", description="", price=Decimal("1.00"),
+                               stock_quantity=1, category=category)
+        path = self.write_file('catalog.ndjson', json.dumps(
+            {"sku": "MUG-1", "name": "New name", "price": "99.00", "category_name": "Unknown"}
+        ))
+        output = self.import_file(path, no_create_categories=True)
+
+        self.assertIn("0 created, 0 updated, 1 errors", output)
+        mug = Product.objects.get(sku="MUG-1")
+        self.assertEqual((mug.name, mug.price), ("Old mug", Decimal("1.00")))
+
+    def test_dry_run_writes_nothing(self):
+        path = self.write_file('catalog.csv', self.CSV)
+        output = self.import_file(path, dry_run=True, chunk_size=2)
+
+        self.assertIn("Dry run: 5 rows", output)
+        self.assertIn("4 created", output)
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Category.objects.exists())
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_resume_skips_committed_rows(self):
+        path = self.write_file('catalog.csv', self.CSV)
+        ImportCheckpoint.objects.create(name='catalog.csv', rows_committed=3)
+        output = self.import_file(path, resume=True)
+
+        self.assertIn("2 rows", output)
+        self.assertIn("3 skipped", output)
+        self.assertEqual(list(Product.objects.values_list('sku', flat=True)), ["MUG-3"])
+
+    def test_import_endpoint(self):
+        user = User.objects.create_user(username='erp', password='erppass')
+        user.user_permissions.add(Permission.objects.get(codename='add_product'))
+        client = APIClient()
+        client.force_authenticate(user=User.objects.get(pk=user.pk))
+        upload = SimpleUploadedFile('catalog.csv', self.CSV.encode(), content_type='text/csv')
+
+        response = client.post(reverse('product-import-catalog'), {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created'], 4)
+        self.assertEqual(response.data['error_details'][0]['row'], 4)
+        self.assertEqual(Product.objects.count(), 4)
+
+    def test_import_endpoint_requires_permission(self):
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username='guest', password='guestpass'))
+        upload = SimpleUploadedFile('catalog.csv', self.CSV.encode(), content_type='text/csv')
+        response = client.post(reverse('product-import-catalog'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ProductImageVariantsTestCase(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.client = APIClient()
+        self.user = User.objects.create_superuser(username='admin', password='adminpass')
+        self.category = Category.objects.create(name="Furniture")
+        self.product = Product.objects.create(name="Chair", description="Wooden", price=Decimal("49.00"),
+                                              stock_quantity=3, category=self.category)
+
+    def make_upload(self, name='chair.png', size=(800, 400), mode='RGBA'):
+        buffer = io.BytesIO()
+        PILImage.new(mode, size, (200, 100, 50, 128) if mode == 'RGBA' else (200, 100, 50)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_upload_generates_variants(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse('product-upload-images', kwargs={'pk': self.product.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'images': [self.make_upload()]}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        image = self.product.images.get()
+        self.assertEqual(set(image.variants), {'thumbnail', 'card', 'zoom'})
+        self.assertEqual((image.variants['thumbnail']['width'], image.variants['thumbnail']['height']), (150, 75))
+        # never upscaled
+        self.assertEqual(image.variants['zoom']['width'], 800)
+        storage = image.image.storage
+        with storage.open(image.variants['card']['webp']) as variant:
+            self.assertEqual(PILImage.open(variant).format, 'WEBP')
+        with storage.open(image.variants['card']['jpeg']) as variant:
+            self.assertEqual(PILImage.open(variant).size, (480, 240))
+
+        response = self.client.get(reverse('product-detail', kwargs={'pk': self.product.pk}))
+        variants = response.data['images'][0]['variants']
+        self.assertTrue(variants['thumbnail']['webp'].startswith('http://testserver/media/product_images/variants/'))
+
+    def test_unreadable_image_is_skipped(self):
+        with self.assertLogs('products.images', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            image = Image.objects.create(
+                product=self.product, image=SimpleUploadedFile('broken.jpg', b'not an image', content_type='image/jpeg')
+            )
+        image.refresh_from_db()
+        self.assertEqual(image.variants, {})
+
+    def test_backfill_command(self):
+        # created outside captureOnCommitCallbacks: no variants scheduled
+        pending = Image.objects.create(product=self.product, image=self.make_upload(mode='RGB'))
+        done = Image.objects.create(product=self.product, image=self.make_upload(), variants={'card': {}})
+        out = StringIO()
+        call_command('generate_image_variants', workers=1, stdout=out, stderr=StringIO())
+
+        pending.refresh_from_db()
+        done.refresh_from_db()
+        self.assertEqual(set(pending.variants), {'thumbnail', 'card', 'zoom'})
+        self.assertEqual(done.variants, {'card': {}})
+        self.assertIn("Variants generated for 1 images", out.getvalue())
+
+
+class ProductImageUploadTestCase(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_superuser(username='admin', password='adminpass'))
+        self.product = Product.objects.create(name="Lamp", description="Desk lamp", price=Decimal("25.00"),
+                                              stock_quantity=8, category=Category.objects.create(name="Lighting"))
+        self.url = reverse('product-upload-images', kwargs={'pk': self.product.pk})
+
+    def make_upload(self, name, image_format='PNG', size=(64, 48)):
+        buffer = io.BytesIO()
+        PILImage.new('RGB', size, (10, 20, 30)).save(buffer, image_format)
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def test_files_are_streamed_to_disk_and_inserted_at_once(self):
+        files = [self.make_upload(f"lamp-{i}.png") for i in range(3)]
+        updated_at = self.product.updated_at
+        with patch('products.productAPI.views.save_product_images', wraps=save_product_images) as save, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'images': files}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        uploaded = save.call_args.args[1]
+        self.assertTrue(all(hasattr(file, 'temporary_file_path') for file in uploaded))
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "products_image"')]
+        self.assertEqual(len(inserts), 1)
+
+        images = list(self.product.images.all())
+        self.assertEqual(len(images), 3)
+        self.assertTrue(all(image.image.storage.exists(image.image.name) for image in images))
+        self.product.refresh_from_db()
+        self.assertGreater(self.product.updated_at, updated_at)
+
+    @override_settings(PRODUCT_UPLOAD_MAX_FILES=2)
+    def test_too_many_files(self):
+        files = [self.make_upload(f"lamp-{i}.png") for i in range(3)]
+        response = self.client.post(self.url, {'images': files}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(self.product.images.exists())
+
+    @override_settings(PRODUCT_UPLOAD_MAX_FILE_SIZE=2000, PRODUCT_UPLOAD_CHUNK_SIZE=1024)
+    def test_file_too_large(self):
+        large = SimpleUploadedFile('large.png', os.urandom(5000))
+        response = self.client.post(self.url, {'images': [large]}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertIn("large.png", response.data['detail'])
+
+    def test_invalid_images_reject_the_upload(self):
+        files = [
+            self.make_upload('lamp.png'),
+            SimpleUploadedFile('notes.png', b'plain text'),
+            self.make_upload('lamp.bmp', image_format='BMP'),
+        ]
+        response = self.client.post(self.url, {'images': files}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data['errors']), {'notes.png', 'lamp.bmp'})
+        self.assertFalse(self.product.images.exists())
+
+    @override_settings(PRODUCT_UPLOAD_MAX_PIXELS=1000)
+    def test_oversized_dimensions_rejected_from_header(self):
+        response = self.client.post(self.url, {'images': [self.make_upload('lamp.png')]}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("64x48", response.data['errors']['lamp.png'])
+
+
+class ProductImageStorageTestCase(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_superuser(username='admin', password='adminpass'))
+        category = Category.objects.create(name="Shoes")
+        self.products = [
+            Product.objects.create(name=f"Sneaker {size}", description="Running shoe", price=Decimal("80.00"),
+                                   stock_quantity=4, category=category)
+            for size in (41, 42)
+        ]
+
+    def png_bytes(self, color=(0, 120, 255)):
+        buffer = io.BytesIO()
+        PILImage.new('RGB', (32, 32), color).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def test_identical_uploads_share_one_file(self):
+        data = self.png_bytes()
+        for product in self.products:
+            url = reverse('product-upload-images', kwargs={'pk': product.pk})
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(url, {'images': [SimpleUploadedFile('sneaker.PNG', data)]}, format='multipart')
+
+        first, second = Image.objects.order_by('pk')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^product_images/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual(first.content_hash, first.image.name.split('/')[-1][:-4])
+        self.assertEqual(len(os.listdir(os.path.dirname(first.image.path))), 1)
+        self.assertEqual(reference_counts([first.image.name]), {first.image.name: 2})
+        # variants are generated once and shared
+        self.assertEqual(first.variants, second.variants)
+
+    def test_dedupe_command_moves_legacy_files(self):
+        os.makedirs(os.path.join(self.media_root, 'product_images'))
+        files = {'front.png': self.png_bytes(), 'front-copy.png': self.png_bytes(), 'back.png': self.png_bytes((9, 9, 9))}
+        for name, data in files.items():
+            with open(os.path.join(self.media_root, 'product_images', name), 'wb') as output:
+                output.write(data)
+        images = [
+            Image.objects.create(product=self.products[0], image='product_images/front.png'),
+            Image.objects.create(product=self.products[1], image='product_images/front-copy.png'),
+            Image.objects.create(product=self.products[1], image='product_images/back.png'),
+            Image.objects.create(product=self.products[1], image='product_images/gone.png'),
+        ]
+        out = StringIO()
+        call_command('dedupe_product_images', stdout=out, stderr=StringIO())
+
+        for image in images:
+            image.refresh_from_db()
+        self.assertEqual(images[0].image.name, images[1].image.name)
+        self.assertIsNotNone(images[2].content_hash)
+        self.assertEqual(images[3].image.name, 'product_images/gone.png')
+        self.assertEqual(sorted(os.listdir(os.path.join(self.media_root, 'product_images'))), sorted(
+            {images[0].content_hash[:2], images[2].content_hash[:2]}
+        ))
+        self.assertIn("3 images moved to 2 distinct files", out.getvalue())
+        self.assertIn("1 missing", out.getvalue())
+
+    def test_dedupe_command_file_shared_across_batches(self):
+        """A legacy file referenced from several batches is removed once its last row is moved."""
+        os.makedirs(os.path.join(self.media_root, 'product_images'))
+        with open(os.path.join(self.media_root, 'product_images', 'side.png'), 'wb') as output:
+            output.write(self.png_bytes())
+        images = [Image.objects.create(product=product, image='product_images/side.png') for product in self.products]
+        out = StringIO()
+        call_command('dedupe_product_images', chunk_size=1, stdout=out, stderr=StringIO())
+
+        for image in images:
+            image.refresh_from_db()
+        self.assertEqual(images[0].image.name, images[1].image.name)
+        self.assertTrue(os.path.exists(images[0].image.path))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'product_images', 'side.png')))
+        self.assertIn("2 images moved to 1 distinct files", out.getvalue())
+        self.assertIn("0 duplicate files", out.getvalue())
+
+
+class ProductImageCleanupTestCase(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_superuser(username='admin', password='adminpass'))
+        category = Category.objects.create(name="Bags")
+        self.products = [
+            Product.objects.create(name=f"Bag {i}", description="Leather", price=Decimal("120.00"),
+                                   stock_quantity=2, category=category)
+            for i in range(2)
+        ]
+
+    def upload(self, product, color=(90, 60, 30)):
+        buffer = io.BytesIO()
+        PILImage.new('RGB', (40, 40), color).save(buffer, 'PNG')
+        url = reverse('product-upload-images', kwargs={'pk': product.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'images': [SimpleUploadedFile('bag.png', buffer.getvalue())]}, format='multipart')
+        return product.images.latest('pk')
+
+    def exists(self, path):
+        return os.path.exists(os.path.join(self.media_root, path))
+
+    def test_deleted_image_files_are_removed(self):
+        image = self.upload(self.products[0])
+        paths = [image.image.name, image.variants['card']['webp']]
+        self.assertTrue(all(self.exists(path) for path in paths))
+
+        url = reverse('product-delete-specific-images', kwargs={'pk': self.products[0].pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(url, {'image_ids': [image.pk]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any(self.exists(path) for path in paths))
+        self.assertFalse(PendingFileDeletion.objects.exists())
+
+    def test_reupload_cancels_queued_deletion(self):
+        """A file queued for deletion and uploaded again before the cleanup runs is kept."""
+        image = self.upload(self.products[0])
+        paths = [image.image.name, image.variants['card']['webp']]
+        image.delete()
+        self.assertTrue(PendingFileDeletion.objects.filter(path__in=paths).exists())
+
+        self.assertEqual(self.upload(self.products[1]).image.name, paths[0])
+        self.assertFalse(PendingFileDeletion.objects.exists())
+        call_command('process_file_deletions', stdout=StringIO())
+        self.assertTrue(all(self.exists(path) for path in paths))
+
+    def test_shared_file_is_kept_until_last_reference(self):
+        first = self.upload(self.products[0])
+        second = self.upload(self.products[1])
+        self.assertEqual(first.image.name, second.image.name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(self.exists(second.image.name))
+        self.assertTrue(self.exists(second.variants['thumbnail']['jpeg']))
+
+        # the CASCADE from Product queues the files too
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[1].delete()
+        self.assertFalse(self.exists(second.image.name))
+        self.assertFalse(self.exists(second.variants['thumbnail']['jpeg']))
+
+    def test_failed_deletions_are_retried_later(self):
+        image = self.upload(self.products[0])
+        with patch('django.core.files.storage.FileSystemStorage.delete', side_effect=PermissionError("denied")), \
+                self.assertLogs('products.cleanup', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+
+        entry = PendingFileDeletion.objects.get(path=image.image.name)
+        self.assertEqual(entry.attempts, 1)
+        self.assertIn("denied", entry.last_error)
+        out = StringIO()
+        call_command('process_file_deletions', stdout=out)
+        self.assertIn("0 files deleted", out.getvalue())
+
+        call_command('process_file_deletions', retry_failed=True, stdout=out)
+        self.assertFalse(self.exists(image.image.name))
+        self.assertFalse(PendingFileDeletion.objects.exists())
+
+    def test_reconcile_media_queues_orphans(self):
+        image = self.upload(self.products[0])
+        orphans = ['product_images/old-upload.jpg', 'product_images/variants/999/card.webp']
+        for path in orphans:
+            os.makedirs(os.path.dirname(os.path.join(self.media_root, path)), exist_ok=True)
+            with open(os.path.join(self.media_root, path), 'wb') as output:
+                output.write(b'orphan')
+
+        out = StringIO()
+        call_command('reconcile_media', min_age=0, dry_run=True, stdout=out)
+        self.assertIn("2 orphaned files found", out.getvalue())
+        self.assertFalse(PendingFileDeletion.objects.exists())
+
+        call_command('reconcile_media', min_age=0, delete=True, batch_size=2, stdout=out)
+        self.assertFalse(any(self.exists(path) for path in orphans))
+        self.assertTrue(self.exists(image.image.name))
+        self.assertTrue(self.exists(image.variants['zoom']['webp']))
+
+
+class ProductFacetTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = reverse('product-facets')
+        self.phones = Category.objects.create(name="Phones")
+        self.cases = Category.objects.create(name="Cases")
+        for name, price, stock, category in [
+            ("Budget phone", "99.00", 5, self.phones),
+            ("Flagship phone", "999.00", 0, self.phones),
+            ("Ultra phone", "1299.00", 2, self.phones),
+            ("Phone case", "15.00", 40, self.cases),
+            ("Leather case", "45.00", 0, self.cases),
+        ]:
+            Product.objects.create(name=name, description="", price=Decimal(price), stock_quantity=stock, category=category)
+
+    def price_counts(self, data):
+        return {bucket['min']: bucket['count'] for bucket in data['price'] if bucket['count']}
+
+    def test_facets_without_filters(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['category'], [
+            {'id': self.phones.id, 'name': "Phones", 'count': 3},
+            {'id': self.cases.id, 'name': "Cases", 'count': 2},
+        ])
+        self.assertEqual(self.price_counts(response.data), {0: 1, 25: 1, 50: 1, 500: 1, 1000: 1})
+        self.assertEqual(response.data['price'][-1], {'min': 1000, 'max': None, 'count': 1})
+        self.assertEqual(response.data['availability'], {'in_stock': 3, 'out_of_stock': 2})
+
+    def test_family_ignores_its_own_filter(self):
+        response = self.client.get(self.url, {'category': self.cases.id, 'in_stock': 'true'})
+        # every category stays selectable, counted with the other filters (in stock)
+        self.assertEqual({row['name']: row['count'] for row in response.data['category']}, {"Phones": 2, "Cases": 1})
+        self.assertEqual(self.price_counts(response.data), {0: 1})
+        self.assertEqual(response.data['availability'], {'in_stock': 1, 'out_of_stock': 1})
+
+    def test_facets_follow_search(self):
+        response = self.client.get(self.url, {'search': 'phone', 'price_max': 500})
+        self.assertEqual({row['name']: row['count'] for row in response.data['category']}, {"Phones": 1, "Cases": 1})
+        self.assertEqual(self.price_counts(response.data), {0: 1, 50: 1, 500: 1, 1000: 1})
+
+    def test_invalid_filter_is_rejected(self):
+        response = self.client.get(self.url, {'price_min': 'cheap'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('price_min', response.data)
+
+    def test_facets_are_cached_for_everyone_until_products_change(self):
+        self.client.force_authenticate(user=User.objects.create_user(username='shopper', password='shopperpass'))
+        self.client.get(self.url, {'category': self.phones.id})
+        with self.assertNumQueries(0):
+            self.client.get(self.url, {'category': self.phones.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Mini phone", description="", price=Decimal("199.00"),
+                                   stock_quantity=1, category=self.phones)
+        response = self.client.get(self.url, {'category': self.phones.id})
+        self.assertEqual(response.data['availability'], {'in_stock': 3, 'out_of_stock': 1})
+
+
+@override_settings(QUERY_BUDGET_RAISE=True)
+class ProductFieldsetTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.list_url = reverse('product-list')
+        self.category = Category.objects.create(name="Audio")
+        self.product = Product.objects.create(
+            name="Speaker", description="Loud", price=Decimal("80.00"), stock_quantity=3, category=self.category
+        )
+        Image.objects.create(product=self.product, image="product_images/speaker.jpg")
+        self.reviewer = User.objects.create_user(username='listener', password='listenerpass')
+
+    def test_sparse_fields_skip_unrendered_relations(self):
+        # validators + count + page, no images prefetch
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.list_url, {'fields': 'id,name,price'})
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(response.data['results'], [{'id': self.product.id, 'name': "Speaker", 'price': "80.00"}])
+        self.assertNotIn('description', queries[-1]['sql'])
+
+    def test_expand_category_images_and_rating(self):
+        Review.objects.create(user=self.reviewer, product=self.product, rating=4, comment="Good")
+        Review.objects.create(user=self.reviewer, product=self.product, rating=5, comment="Great")
+        response = self.client.get(self.list_url, {'fields': 'id', 'expand': 'category,images,rating'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        row = response.data['results'][0]
+        self.assertEqual(set(row), {'id', 'category', 'images', 'rating'})
+        self.assertEqual(row['category'], {
+            'id': self.category.id, 'name': "Audio", 'parent': None, 'depth': 0,
+            'stats': {'product_count': 1, 'in_stock_count': 1, 'min_price': '80.00', 'max_price': '80.00'},
+        })
+        self.assertEqual(len(row['images']), 1)
+        self.assertEqual(row['rating'], {'average': 4.5, 'count': 2})
+
+    def test_expand_discounts(self):
+        discount = Discount.objects.create(name="Summer", amount=Decimal("10.00"),
+                                           start_date="2024-06-01", end_date="2024-08-31")
+        discount.products.add(self.product)
+        response = self.client.get(reverse('product-detail', args=[self.product.id]), {'expand': 'discounts'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['discounts'][0]['name'], "Summer")
+        self.assertIn('description', response.data)
+
+    def test_rating_expansion_is_not_served_stale(self):
+        url = reverse('product-detail', args=[self.product.id])
+        self.assertEqual(self.client.get(url, {'expand': 'rating'}).data['rating'], {'average': None, 'count': 0})
+        Review.objects.create(user=self.reviewer, product=self.product, rating=3, comment="Fine")
+        response = self.client.get(url, {'expand': 'rating'})
+        self.assertEqual(response.data['rating'], {'average': 3, 'count': 1})
+        self.assertNotIn('ETag', response.headers)
+
+    def test_writes_ignore_fieldsets(self):
+        user = User.objects.create_superuser(username='root', password='rootpass', email='root@example.com')
+        self.client.force_authenticate(user=user)
+        response = self.client.patch(
+            f"{reverse('product-detail', args=[self.product.id])}?fields=name&expand=category",
+            {'price': '90.00'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['category'], self.category.id)
+        self.assertEqual(response.data['price'], "90.00")
+
+
+class ProductCompiledReadTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Kitchen")
+        reviewer = User.objects.create_user(username='cook', password='cookpass')
+        discount = Discount.objects.create(name="Spring", amount=Decimal("5.00"),
+                                           start_date="2024-03-01", end_date="2024-05-31")
+        for i in range(6):
+            product = Product.objects.create(
+                name=f"Pan {i}", sku=f"PAN-{i}" if i % 2 else None, description="Cast iron",
+                price=Decimal("19.90") + i, stock_quantity=i + 1, category=self.category
+            )
+            Image.objects.create(
+                product=product, image=f"product_images/pan_{i}.jpg",
+                variants={'card': {'width': 480, 'height': 320, 'webp': f"product_images/variants/pan_{i}.webp"}},
+            )
+            Image.objects.create(product=product, image="")
+            if i % 3 == 0:
+                discount.products.add(product)
+                Review.objects.create(user=reviewer, product=product, rating=4, comment="Heavy")
+
+    def get_both(self, url, params):
+        cache.clear()
+        compiled = self.client.get(url, params)
+        cache.clear()
+        with patch.object(ProductViewSet, 'compiled_reads', False):
+            serialized = self.client.get(url, params)
+        return compiled, serialized
+
+    def test_list_output_matches_serializer(self):
+        for params in [
+            {},
+            {'page_size': 4, 'page': 2},
+            {'cursor': '', 'ordering': 'name'},
+            {'fields': 'id,price,created_date'},
+            {'expand': 'category,discounts,rating'},
+            {'fields': 'name', 'expand': 'images', 'search': 'pan'},
+        ]:
+            compiled, serialized = self.get_both(reverse('product-list'), params)
+            self.assertEqual(compiled.status_code, status.HTTP_200_OK)
+            self.assertEqual(json.loads(compiled.content), json.loads(serialized.content), params)
+
+    def test_retrieve_output_matches_serializer(self):
+        product = Product.objects.first()
+        url = reverse('product-detail', args=[product.id])
+        compiled, serialized = self.get_both(url, {'expand': 'category,rating'})
+        self.assertEqual(json.loads(compiled.content), json.loads(serialized.content))
+        self.assertEqual(self.client.get(reverse('product-detail', args=[0])).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(reverse('product-detail', args=['abc'])).status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_list_query_count(self):
+        # validators + count + product rows + images of the page
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('product-list'), {'page_size': 6})
+        self.assertEqual(len(response.data['results'][0]['images']), 2)
+
+    def test_benchmark_command_reports_throughput(self):
+        out = StringIO()
+        call_command('benchmark_product_serialization', '--rows', '6', '--repeat', '2', stdout=out)
+        output = out.getvalue()
+        self.assertIn('ProductSerializer', output)
+        self.assertIn('ProductReader', output)
+        self.assertIn('rows/s', output)
+
+
+@override_settings(PRODUCT_CHANGES_SETTLE_SECONDS=0)
+class ProductChangesTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('product-changes')
+        self.category = Category.objects.create(name="Tools")
+        self.products = [
+            Product.objects.create(name=f"Hammer {i}", description="", price=Decimal("12.00"),
+                                   stock_quantity=3, category=self.category)
+            for i in range(5)
+        ]
+
+    def sync(self, watermark='', **params):
+        response = self.client.get(self.url, {'since': watermark, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_initial_sync_then_only_changes(self):
+        data = self.sync()
+        self.assertEqual([row['id'] for row in data['changed']], [p.id for p in self.products])
+        self.assertEqual(data['changed'][0]['name'], "Hammer 0")
+        self.assertFalse(data['has_more'])
+
+        empty = self.sync(data['watermark'])
+        self.assertEqual((empty['changed'], empty['deleted']), ([], []))
+        self.assertEqual(empty['watermark'], data['watermark'])
+
+        updated, deleted_id = self.products[1], self.products[3].id
+        updated.price = Decimal("15.00")
+        updated.save()
+        self.products[3].delete()
+        data = self.sync(data['watermark'], fields='id,price')
+        self.assertEqual(data['changed'], [{'id': updated.id, 'price': "15.00"}])
+        self.assertEqual(data['deleted'], [deleted_id])
+        self.assertEqual(ProductTombstone.objects.get().product_id, deleted_id)
+
+    def test_walks_in_pages(self):
+        Product.objects.filter(pk=self.products[4].pk).delete()
+        seen, deleted, watermark, calls = [], [], '', 0
+        while True:
+            data = self.sync(watermark, page_size=2)
+            seen += [row['id'] for row in data['changed']]
+            deleted += data['deleted']
+            watermark, calls = data['watermark'], calls + 1
+            if not data['has_more']:
+                break
+        self.assertEqual(seen, [p.id for p in self.products[:4]])
+        self.assertEqual(deleted, [self.products[4].id])
+        self.assertEqual(calls, 2)
+
+    def test_recent_changes_wait_for_the_settle_delay(self):
+        with self.settings(PRODUCT_CHANGES_SETTLE_SECONDS=60):
+            self.assertEqual(self.sync()['changed'], [])
+
+    def test_invalid_watermark(self):
+        response = self.client.get(self.url, {'since': 'not-a-watermark'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(STOREFRONT_PAGE_SIZE=4)
+class ProductStorefrontTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('product_list')
+        self.lamps = Category.objects.create(name="Lamps")
+        self.rugs = Category.objects.create(name="Rugs")
+        for i in range(6):
+            product = Product.objects.create(name=f"Lamp {i}", description="Brass", price=Decimal("30.00"),
+                                             stock_quantity=1, category=self.lamps)
+            Image.objects.create(product=product, image=f"product_images/lamp_{i}.jpg")
+        Product.objects.create(name="Wool rug", description="", price=Decimal("90.00"),
+                               stock_quantity=1, category=self.rugs)
+
+    def test_paginates_newest_first(self):
+        response = self.client.get(self.url)
+        page = response.context['products']
+        self.assertEqual([p.name for p in page], ["Wool rug", "Lamp 5", "Lamp 4", "Lamp 3"])
+        self.assertEqual(page.paginator.num_pages, 2)
+        response = self.client.get(self.url, {'page': 2})
+        self.assertEqual([p.name for p in response.context['products']], ["Lamp 2", "Lamp 1", "Lamp 0"])
+
+    def test_category_filter_is_kept_by_pagination_links(self):
+        response = self.client.get(self.url, {'category': self.lamps.id})
+        self.assertNotIn("Wool rug", [p.name for p in response.context['products']])
+        self.assertContains(response, f"?page=2&category={self.lamps.id}")
+        self.assertContains(response, f'value="{self.lamps.id}" onchange="this.form.submit()" checked')
+
+    def test_cached_cards_skip_images_until_the_product_changes(self):
+        self.client.get(self.url)
+        # categories + count + page, images are only loaded for cards missing from the cache
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertContains(response, "lamp_5.jpg")
+
+        product = Product.objects.get(name="Lamp 5")
+        product.name = "Desk lamp"
+        product.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, "Desk lamp")
+        self.assertNotContains(response, "Lamp 5")
+
+
+class ProductRecommendationTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        category = Category.objects.create(name="Camping")
+        self.tent, self.stove, self.lamp, self.mat = [
+            Product.objects.create(name=name, description="", price=Decimal("20.00"), stock_quantity=100, category=category)
+            for name in ("Tent", "Stove", "Lamp", "Mat")
+        ]
+        self.users = [User.objects.create_user(username=f"camper{i}", password='camperpass') for i in range(3)]
+        self.now = timezone.now()
+        self.order(0, self.tent)
+        self.order(0, self.stove)
+        self.order(0, self.lamp)
+        self.order(1, self.tent)
+        self.order(1, self.stove)
+        self.order(2, self.tent)
+        self.order(2, self.mat)
+        # an older basket of the first user: not bought together with the tent
+        self.order(0, self.mat, days_ago=90)
+
+    def order(self, user, product, days_ago=0):
+        order = Order.objects.create(user=self.users[user], product=product, quantity=1)
+        Order.objects.filter(pk=order.pk).update(order_date=self.now - timedelta(days=days_ago))
+
+    def related(self, product):
+        return [(row['name'], row['score']) for row in self.client.get(reverse('product-related', args=[product.id])).data]
+
+    def test_top_k_from_baskets(self):
+        out = StringIO()
+        call_command('build_recommendations', stdout=out)
+        self.assertIn("8 orders folded", out.getvalue())
+        # product lookup + recommendations
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('product-related', args=[self.tent.id]))
+        self.assertEqual([(row['name'], row['score']) for row in response.data],
+                         [("Stove", 2), ("Lamp", 1), ("Mat", 1)])
+        self.assertEqual(set(response.data[0]), {'id', 'name', 'price', 'score'})
+        self.assertEqual(self.related(self.mat), [("Tent", 1)])
+
+    def test_incremental_run_folds_only_new_orders(self):
+        call_command('build_recommendations', '--top-k', '2', stdout=StringIO())
+        self.order(2, self.stove)
+        self.order(2, self.tent)  # already in that basket: counted once
+        out = StringIO()
+        call_command('build_recommendations', '--top-k', '2', stdout=out)
+        self.assertIn("2 orders folded", out.getvalue())
+        self.assertEqual(self.related(self.tent), [("Stove", 3), ("Lamp", 1)])
+        self.assertEqual(self.related(self.mat), [("Tent", 1), ("Stove", 1)])
+
+        call_command('build_recommendations', '--full', '--top-k', '2', stdout=StringIO())
+        self.assertEqual(self.related(self.tent), [("Stove", 3), ("Lamp", 1)])
+        self.assertEqual(ProductCoPurchase.objects.get(product=self.tent, related=self.stove).count, 3)
+
+    def test_window_change_requires_full_rebuild(self):
+        call_command('build_recommendations', stdout=StringIO())
+        with self.settings(PRODUCT_RECOMMENDATION_WINDOW_DAYS=7):
+            with self.assertRaises(CommandError):
+                call_command('build_recommendations', stdout=StringIO())
+            call_command('build_recommendations', '--full', stdout=StringIO())
+        self.assertEqual(ProductRecommendation.objects.filter(product=self.tent).count(), 3)
+
+    def test_unknown_product(self):
+        response = self.client.get(reverse('product-related', args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('product-related', args=['abc']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ProductCategoryTreeFilterTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.outdoor = Category.objects.create(name="Outdoor")
+        self.bikes = Category.objects.create(name="Bikes", parent=self.outdoor)
+        self.helmets = Category.objects.create(name="Helmets", parent=self.bikes)
+        self.books = Category.objects.create(name="Books")
+        for name, category in [("Tarp", self.outdoor), ("Gravel bike", self.bikes),
+                               ("Helmet", self.helmets), ("Atlas", self.books)]:
+            Product.objects.create(name=name, description="", price=Decimal("10.00"), stock_quantity=1, category=category)
+
+    def names(self, response):
+        return sorted(row['name'] for row in response.data['results'])
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_filters_the_whole_subtree(self):
+        response = self.client.get(reverse('product-list'), {'category_tree': self.outdoor.id})
+        self.assertEqual(self.names(response), ["Gravel bike", "Helmet", "Tarp"])
+        response = self.client.get(reverse('product-list'), {'category_tree': self.bikes.id})
+        self.assertEqual(self.names(response), ["Gravel bike", "Helmet"])
+        response = self.client.get(reverse('product-list'), {'category_tree': 0})
+        self.assertEqual(response.data['results'], [])
+
+    def test_subtree_is_a_prefix_range(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('product-list'), {'category_tree': self.bikes.id})
+        page_sql = queries[-2]['sql']
+        self.assertIn(f"LIKE '{self.outdoor.id}/{self.bikes.id}/%'", page_sql)
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_category_facet_ignores_the_tree_filter(self):
+        response = self.client.get(reverse('product-facets'), {'category_tree': self.bikes.id})
+        self.assertEqual(len(response.data['category']), 4)
+        self.assertEqual(response.data['availability'], {'in_stock': 2, 'out_of_stock': 0})
+
+
+class ProductCategoryStatsTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.tools = Category.objects.create(name="Tools")
+        self.garden = Category.objects.create(name="Garden")
+        self.saw = Product.objects.create(name="Saw", description="", price=Decimal("20.00"),
+                                          stock_quantity=3, category=self.tools)
+        self.drill = Product.objects.create(name="Drill", description="", price=Decimal("80.00"),
+                                            stock_quantity=1, category=self.tools)
+
+    def stats(self, category):
+        row = CategoryStats.objects.get(category=category)
+        return row.product_count, row.in_stock_count, row.min_price, row.max_price
+
+    def test_saves_apply_deltas(self):
+        self.assertEqual(self.stats(self.tools), (2, 2, Decimal("20.00"), Decimal("80.00")))
+        self.assertEqual(self.stats(self.garden), (0, 0, None, None))
+
+        self.drill.stock_quantity = 0
+        self.drill.save()
+        self.assertEqual(self.stats(self.tools), (2, 1, Decimal("20.00"), Decimal("80.00")))
+
+        # the maximum leaves: the range is recomputed from the remaining products
+        drill = Product.objects.get(pk=self.drill.pk)
+        drill.category = self.garden
+        drill.save()
+        self.assertEqual(self.stats(self.tools), (1, 1, Decimal("20.00"), Decimal("20.00")))
+        self.assertEqual(self.stats(self.garden), (1, 0, Decimal("80.00"), Decimal("80.00")))
+
+        self.saw.delete()
+        self.assertEqual(self.stats(self.tools), (0, 0, None, None))
+
+    def test_drifted_counts_do_not_fail_the_write(self):
+        CategoryStats.objects.filter(category=self.tools).update(product_count=0, in_stock_count=0)
+        self.saw.delete()
+        self.assertEqual(self.stats(self.tools)[:2], (0, 0))
+
+    def test_unchanged_save_writes_nothing(self):
+        saw = Product.objects.get(pk=self.saw.pk)
+        saw.name = "Hand saw"
+        with CaptureQueriesContext(connection) as queries:
+            saw.save()
+        self.assertFalse([q for q in queries if 'categories_categorystats' in q['sql']])
+
+    def test_bulk_writes_reconcile_their_categories(self):
+        user = User.objects.create_user(username='erp', password='erppass')
+        for codename in ('add_product', 'change_product'):
+            user.user_permissions.add(Permission.objects.get(codename=codename))
+        self.client.force_authenticate(user=User.objects.get(pk=user.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('product-bulk-upsert'), [
+                {"id": self.saw.id, "category": self.garden.id, "price": "5.00"},
+            ], format='json')
+        self.assertEqual(self.stats(self.tools), (1, 1, Decimal("80.00"), Decimal("80.00")))
+        self.assertEqual(self.stats(self.garden), (1, 1, Decimal("5.00"), Decimal("5.00")))
+
+    def test_reconcile_command_repairs_drift(self):
+        CategoryStats.objects.filter(category=self.tools).update(product_count=7, min_price=None)
+        CategoryStats.objects.filter(category=self.garden).delete()
+        out = StringIO()
+        call_command('reconcile_category_stats', stdout=out)
+        self.assertIn("2 categories", out.getvalue())
+        self.assertEqual(self.stats(self.tools), (2, 2, Decimal("20.00"), Decimal("80.00")))
+        self.assertEqual(self.stats(self.garden), (0, 0, None, None))
+
+    def test_category_endpoints_read_stats_without_extra_queries(self):
+        # validators + categories joined with their stats
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('category-list'))
+        etag = response['ETag']
+        tools = next(row for row in response.data if row['id'] == self.tools.id)
+        self.assertEqual(tools['stats'], {
+            'product_count': 2, 'in_stock_count': 2, 'min_price': '20.00', 'max_price': '80.00'
+        })
+        self.saw.delete()
+        response = self.client.get(reverse('category-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        Product.objects.create(name="Saw", description="", price=Decimal("20.00"), stock_quantity=3, category=self.tools)
+
+        response = self.client.get(reverse('category-tree'))
+        self.assertEqual({node['name']: node['product_count'] for node in response.data}, {"Tools": 2, "Garden": 0})
+
+        # the product cache follows the stats
+        url = reverse('product-detail', args=[self.drill.id])
+        first = self.client.get(url, {'expand': 'category'})
+        self.assertNotIn('ETag', first)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Plane", description="", price=Decimal("30.00"), stock_quantity=2, category=self.tools)
+        second = self.client.get(url, {'expand': 'category'})
+        self.assertEqual(first.data['category']['stats']['product_count'], 2)
+        self.assertEqual(second.data['category']['stats']['product_count'], 3)
+
+
+class ProductIndexBenchmarkTestCase(TransactionTestCase):
+    # the benchmark alters indexes, which SQLite refuses inside the TestCase transaction
+
+    def test_benchmark_command_restores_indexes(self):
+        out = StringIO()
+        call_command('benchmark_product_queries', products=30, categories=3, repeat=2, compare=True,
+                     stdout=out, stderr=StringIO())
+        output = out.getvalue()
+        self.assertIn("without indexes", output)
+        self.assertIn("p99", output)
+        self.assertEqual(Product.objects.filter(sku__startswith='BENCH-').count(), 30)
+
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Product._meta.db_table)
+        self.assertIn('product_category_price_idx', constraints)
+
+        call_command('benchmark_product_queries', cleanup=True, stdout=out)
+        self.assertFalse(Product.objects.exists())
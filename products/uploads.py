@@ -0,0 +1,126 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image as PILImage
+
+from products.images import schedule_variants
+from products.models import Image, Product
+from ECommerce.response_cache import bump_generation
+
+MB = 1024 * 1024
+
+
+class BoundedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Stream every uploaded file straight to a temporary file, `chunk_size` bytes at a time,
+    so the memory used by a request does not depend on the size or the number of files.
+
+    The upload is stopped as soon as it goes over PRODUCT_UPLOAD_MAX_FILES,
+    PRODUCT_UPLOAD_MAX_FILE_SIZE or PRODUCT_UPLOAD_MAX_REQUEST_SIZE; `error` then tells why.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.chunk_size = getattr(settings, 'PRODUCT_UPLOAD_CHUNK_SIZE', 64 * 1024)
+        self.max_files = getattr(settings, 'PRODUCT_UPLOAD_MAX_FILES', 50)
+        self.max_file_size = getattr(settings, 'PRODUCT_UPLOAD_MAX_FILE_SIZE', 10 * MB)
+        self.max_request_size = getattr(settings, 'PRODUCT_UPLOAD_MAX_REQUEST_SIZE', 200 * MB)
+        self.request_size = 0
+        self.files = 0
+        self.received = 0
+        self.error = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.request_size = content_length or 0
+
+    def abort(self, error):
+        self.error = error
+        raise StopUpload(connection_reset=False)
+
+    def new_file(self, *args, **kwargs):
+        if self.request_size > self.max_request_size:
+            self.abort(f"The upload is larger than {self.max_request_size // MB} MB.")
+        self.files += 1
+        if self.files > self.max_files:
+            self.abort(f"At most {self.max_files} files per upload.")
+        self.file_size = 0
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.file_size += len(raw_data)
+        self.received += len(raw_data)
+        if self.file_size > self.max_file_size:
+            self.abort(f"'{self.file_name}' is larger than {self.max_file_size // MB} MB.")
+        if self.received > self.max_request_size:
+            self.abort(f"The upload is larger than {self.max_request_size // MB} MB.")
+        return super().receive_data_chunk(raw_data, start)
+
+
+def upload_error(request):
+    """Return why the upload handlers stopped reading the request, if they did."""
+    for handler in request.upload_handlers:
+        if getattr(handler, 'error', None):
+            return handler.error
+    return None
+
+
+def validate_image_header(file):
+    """
+    Check an uploaded file is an accepted image from its header only.
+    PIL reads the format and dimensions lazily, without decoding any pixel.
+    Returns an error message, or None when the file is acceptable.
+    """
+    allowed = getattr(settings, 'PRODUCT_UPLOAD_FORMATS', ['JPEG', 'PNG', 'WEBP', 'GIF'])
+    max_pixels = getattr(settings, 'PRODUCT_UPLOAD_MAX_PIXELS', 40_000_000)
+    try:
+        with PILImage.open(file) as image:
+            image_format, (width, height) = image.format, image.size
+    except (OSError, ValueError, PILImage.DecompressionBombError):
+        return "Not a valid image."
+    finally:
+        file.seek(0)
+    if image_format not in allowed:
+        return f"Unsupported image format {image_format}."
+    if width * height > max_pixels:
+        return f"Image is too large ({width}x{height} pixels)."
+    return None
+
+
+def save_product_images(product, files):
+    """
+    Store the files and create all their Image rows with a single bulk INSERT.
+
+    Files are content addressed: a file already stored is not written again, and new
+    temporary uploads are moved (not copied) into storage by the file system backend.
+    bulk_create skips post_save, so the product is touched, cached responses invalidated
+    and variant generation scheduled here.
+    """
+    images = []
+    for file in files:
+        image = Image(product=product)
+        image.image.save(file.name, file, save=False)
+        images.append(image)
+
+    with transaction.atomic():
+        last_pk = Image.objects.aggregate(last_pk=Max('pk'))['last_pk'] or 0
+        Image.objects.bulk_create(images)
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # MySQL does not return ids from bulk inserts but assigns them in row order;
+            # names are not unique (identical files share one), so match them in order
+            pks = defaultdict(list)
+            created = Image.objects.filter(
+                product=product, pk__gt=last_pk, image__in={image.image.name for image in images}
+            ).order_by('pk').values_list('image', 'pk')
+            for name, pk in created:
+                pks[name].append(pk)
+            for image in images:
+                image.pk = pks[image.image.name].pop(0)
+        Product.objects.filter(pk=product.pk).update(updated_at=timezone.now())
+        transaction.on_commit(lambda: bump_generation(Image, Product))
+        image_ids = [image.pk for image in images]
+        transaction.on_commit(lambda: schedule_variants(image_ids))
+    return images
@@ -1,11 +1,53 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache.utils import make_template_fragment_key
+from django.core.paginator import Paginator
+from django.db.models import prefetch_related_objects
 from django.shortcuts import render
 from rest_framework import generics
 from .models import Product, Category
 from .serializers import ProductSerializer
 from django.db.models import Q
+from ECommerce.query_budget import query_budget
+from ECommerce.response_cache import get_cache
+
+# Name of the cached product card fragment in product_list.html
+CARD_FRAGMENT = 'product_card'
+
+
+def card_cache_key(product):
+    # Same key as {% cache ... product_card product.id product.updated_at %}: any change to
+    # the product (images included, see touch_image_product) moves it to a new entry
+    return make_template_fragment_key(CARD_FRAGMENT, [product.id, product.updated_at])
 
 
+@query_budget(4)
 def product_list(request):
+    """
+    Storefront home page: newest products first, paginated, optionally filtered by ?category=<id> (repeatable).
+    Product cards are fragment cached per product version, so images are only loaded for cards not cached yet.
+    """
     categories = Category.objects.all()
-    products = Product.objects.all()
-    return render(request, 'product_list.html', {'categories': categories, 'products': products})
\ No newline at end of file
+    selected = [value for value in request.GET.getlist('category') if value.isdigit()]
+    products = Product.objects.order_by('-created_date', '-id')
+    if selected:
+        products = products.filter(category_id__in=selected)
+
+    page_size = getattr(settings, 'STOREFRONT_PAGE_SIZE', 24)
+    page = Paginator(products, page_size).get_page(request.GET.get('page'))
+
+    cache = get_cache()
+    cached = cache.get_many([card_cache_key(product) for product in page])
+    missing = [product for product in page if card_cache_key(product) not in cached]
+    prefetch_related_objects(missing, 'images')
+
+    return render(request, 'product_list.html', {
+        'categories': categories,
+        'selected_categories': selected,
+        'products': page,
+        # keeps the category filter on the pagination links
+        'filter_query': urlencode([('category', value) for value in selected]),
+        'card_cache_alias': getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default'),
+        'card_cache_timeout': getattr(settings, 'STOREFRONT_CARD_CACHE_TIMEOUT', 3600),
+    })
@@ -1,14 +1,6 @@
-from rest_framework.pagination import PageNumberPagination
+from ECommerce.pagination import CustomPagination as BasePagination
 
-class CustomPagination(PageNumberPagination):
-    # default number of items per page
-    page_size = 10
-    
-    # Allow the client to set the page size with a query parameter
-    page_size_query_param = 'page_size'
-    
-    # maximum number of items per page to avoid overload
-    max_page_size = 100
-    
-    # query parameter for navigating to a specific page
-    page_query_param = 'page'
\ No newline at end of file
+class CustomPagination(BasePagination):
+    # keyset mode walks reviews from newest to oldest
+    keyset_ordering = ('-created_date', '-id')
+    keyset_orderings = ('created_date',)
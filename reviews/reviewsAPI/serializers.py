@@ -1,11 +1,16 @@
 from rest_framework import serializers
 from reviews.models import Review
+from ECommerce.fieldsets import FieldsetSerializerMixin
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Review
         fields = ['id', 'user', 'product', 'rating', 'comment', 'created_date']
         read_only_fields = ['id', 'user', 'created_date']
+        expandable_fields = {
+            'user': ('users.usersAPI.serializers.UserSummarySerializer', {}),
+            'product': ('products.productAPI.serializers.ProductSummarySerializer', {}),
+        }
 
     def validate_rating(self, value):
         if value < 1 or value > 5:
@@ -2,6 +2,8 @@ from rest_framework import viewsets, permissions
 from reviews.models import Review
 from .serializers import ReviewSerializer
 from rest_framework.permissions import IsAuthenticated
+from ECommerce.fieldsets import FieldsetViewMixin
+from ECommerce.idempotency import IdempotencyMixin
 
 class ReviewPermission(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -14,13 +16,12 @@ class ReviewPermission(permissions.BasePermission):
             return True
         return obj.user == request.user
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(IdempotencyMixin, FieldsetViewMixin, viewsets.ModelViewSet):
+    """Reads accept `?fields=` and `?expand=user,product`."""
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticated, ReviewPermission]
-
-    def get_queryset(self):
-        return self.queryset       
+    fieldset_select_related = {'user': 'user', 'product': 'product'}
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
\ No newline at end of file
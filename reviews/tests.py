@@ -50,4 +50,15 @@ class ReviewTests(TestCase):
             'comment': 'Unauthorized review'
         }
         response = self.client.post('/api/reviews/', data)
-        self.assertEqual(response.status_code, 401)
\ No newline at end of file
+        self.assertEqual(response.status_code, 401)
+
+    def test_expand_user_and_product(self):
+        Review.objects.create(user=self.user, product=self.product, rating=5, comment='Nice')
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/reviews/', {'fields': 'rating', 'expand': 'user,product'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [{
+            'rating': 5,
+            'user': {'id': self.user.id, 'username': 'testuser'},
+            'product': {'id': self.product.id, 'name': 'Test Product', 'price': '10.00'},
+        }])
@@ -2,6 +2,12 @@ from rest_framework import serializers
 from django.contrib.auth.models import User 
 from django.core.validators import MinValueValidator
 
+class UserSummarySerializer(serializers.ModelSerializer):
+    """Public user representation nested in expanded resources (e.g. review authors)."""
+    class Meta:
+        model = User
+        fields = ['id', 'username']
+
 class UserSerializer(serializers.ModelSerializer):
     """
     Serializer for the User model.
@@ -1,6 +1,7 @@
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.contrib.auth.models import User
+from django.test import override_settings
 from wishlist.models import Wishlist
 from products.models import Product
 from categories.models import Category
@@ -131,3 +132,25 @@ class WishlistViewSetTest(APITestCase):
         response = self.client.get('/api/wishlists/')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_list_wishlists_query_budget(self):
+        """Test that wishlist products are prefetched instead of loaded per wishlist."""
+        for i in range(5):
+            wishlist = Wishlist.objects.create(name=f"Extra {i}", user=self.user)
+            wishlist.products.set([self.product1, self.product2])
+        self.authenticate(self.user_token)
+        response = self.client.get('/api/wishlists/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 6)
+        self.assertEqual(response.data[0]['products'], [self.product1.id, self.product2.id])
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_wishlist_fieldsets(self):
+        """Test that products are only loaded when rendered, and expanded from the same prefetch."""
+        self.authenticate(self.user_token)
+        response = self.client.get('/api/wishlists/', {'fields': 'id,name'})
+        self.assertEqual(response.data, [{'id': self.wishlist1.id, 'name': "User Wishlist"}])
+
+        response = self.client.get(f'/api/wishlists/{self.wishlist1.id}/', {'expand': 'products'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([product['name'] for product in response.data['products']], ["Product 1", "Product 2"])
@@ -1,11 +1,13 @@
 from rest_framework import serializers
 from wishlist.models import Wishlist
 from products.models import Product
+from ECommerce.fieldsets import FieldsetSerializerMixin
 
-class WishlistSerializer(serializers.ModelSerializer):
+class WishlistSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Wishlist model.
     Transforms Wishlist data into JSON and validates incoming data.
+    Supports `?fields=` and `?expand=products` on reads.
     """
 
     # We don't want to include the created_date in updates, so it's read-only.
@@ -15,6 +17,9 @@ class WishlistSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'user','products', 'created_date']
         read_only_fields = ['created_date']
         extra_kwargs = {'user': {'required': False}}  # Make user field optional
+        expandable_fields = {
+            'products': ('products.productAPI.serializers.ProductSummarySerializer', {'many': True}),
+        }
         
     def validate(self, data):
         """
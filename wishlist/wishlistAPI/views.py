@@ -2,6 +2,9 @@ from rest_framework import viewsets, permissions
 from wishlist.models import Wishlist
 from .serializers import WishlistSerializer
 from rest_framework.permissions import BasePermission
+from ECommerce.query_budget import QueryBudgetMixin
+from ECommerce.fieldsets import FieldsetViewMixin
+from ECommerce.idempotency import IdempotencyMixin
 
 
 class ModelPermissions(permissions.BasePermission):
@@ -30,33 +33,40 @@ class ModelPermissions(permissions.BasePermission):
         """
         # Allow staff and superusers to read any object
         if request.method in permissions.SAFE_METHODS:
-            return request.user.is_staff or request.user.is_superuser or obj.user.id == request.user.id
+            return request.user.is_staff or request.user.is_superuser or obj.user_id == request.user.id
         # Only the owner can modify or delete their object
-        return obj.user.id == request.user.id
+        return obj.user_id == request.user.id
 
     
-class WishlistViewSet(viewsets.ModelViewSet):
+class WishlistViewSet(IdempotencyMixin, FieldsetViewMixin, QueryBudgetMixin, viewsets.ModelViewSet):
     """
     A viewset for viewing and editing Wishlist instances.
+    Reads accept `?fields=` and `?expand=products`.
     """
 
     queryset = Wishlist.objects.all()
     serializer_class = WishlistSerializer
     permission_classes = [ModelPermissions]
+    # auth + wishlists + products prefetch
+    query_budget = {'list': 3, 'retrieve': 3}
+    fieldset_prefetch_related = {'products': 'products'}
+    # read by the object permission check
+    fieldset_always_load = ('user',)
 
     def get_queryset(self):
         """
         Override the get_queryset method to filter wishlists based on the user.
         """
+        queryset = super().get_queryset()
         # If the user is a staff or superuser, return all Objects
         if self.request.user.is_staff or self.request.user.is_superuser:
-            return self.queryset
+            return queryset
         # Check if the request is a GET and the view action is 'list'
         if self.request.method == 'GET' and self.action == 'list':
-            return self.queryset.filter(user=self.request.user)
+            return queryset.filter(user=self.request.user)
 
         # Default behavior for other cases
-        return self.queryset
+        return queryset
         
     
     def perform_create(self, serializer):